@@ -12,7 +12,8 @@ async def get_current_exchange_rate(refresh: bool = False):
     """
     try:
         # 1. Obtém o valor da cotação
-        rate = CurrencyService.get_usd_to_brl()
+        # Cotação em cache na hora; vencida, é atualizada em segundo plano
+        rate = await CurrencyService.get_usd_to_brl_async(force_refresh=refresh)
         
         # 2. Obtém a hora real da última atualização do cache
         last_update = CurrencyService.get_last_update_timestamp()
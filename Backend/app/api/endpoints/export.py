@@ -0,0 +1,66 @@
+from datetime import datetime
+from typing import Callable, Iterator, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.api.endpoints.auth import get_db
+from app.db.session import SessionLocal
+from app.services.history_export import build_export_query, stream_csv, stream_ndjson
+from app.services.product_resolver import ProductResolver
+
+router = APIRouter()
+
+_FORMATS = {
+    "ndjson": (stream_ndjson, "application/x-ndjson"),
+    "csv": (stream_csv, "text/csv; charset=utf-8"),
+}
+
+
+def get_export_sessions() -> Callable[[], Session]:
+    """
+    Fábrica da sessão do stream. A sessão não pode vir de uma dependência
+    com 'yield' (ela terminaria antes do stream): é aberta dentro do próprio
+    gerador, só quando a primeira linha é pedida, e fechada no seu 'finally'.
+    Se o cliente desconectar antes disso, nenhuma conexão chega a ser aberta.
+    """
+    return SessionLocal
+
+
+def _stream_with_session(sessions: Callable[[], Session], stream, stmt) -> Iterator[str]:
+    db = sessions()
+    try:
+        yield from stream(db, stmt)
+    finally:
+        db.close()
+
+
+@router.get("/history")
+def export_price_history(
+    product_name: Optional[str] = Query(None, description="Termo de busca do produto (todos, se omitido)"),
+    source: Optional[str] = Query(None, description="Fonte, ex.: 'eBay' ou 'Amazon'"),
+    start: Optional[datetime] = Query(None, description="Início do período (inclusivo), ISO 8601"),
+    end: Optional[datetime] = Query(None, description="Fim do período (exclusivo), ISO 8601"),
+    format: Literal["ndjson", "csv"] = Query("ndjson", description="Formato da exportação"),
+    db: Session = Depends(get_db),
+    sessions: Callable[[], Session] = Depends(get_export_sessions),
+):
+    """
+    Exporta o histórico bruto de preços em streaming (NDJSON ou CSV), lendo
+    'price_history' com cursor do lado do servidor: a memória usada é a
+    mesma para mil ou dez milhões de linhas. A sessão da requisição só
+    resolve o produto; o stream usa uma sessão própria.
+    """
+    product_id = None
+    if product_name:
+        found = ProductResolver.resolve(db, product_name)
+        if found is None:
+            raise HTTPException(status_code=404, detail="Produto não encontrado")
+        product_id = found[0]
+
+    stream, media_type = _FORMATS[format]
+    stmt = build_export_query(product_id, source, start, end)
+    return StreamingResponse(
+        _stream_with_session(sessions, stream, stmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="price_history.{format}"'},
+    )
@@ -1,30 +1,110 @@
-from fastapi import APIRouter, Query, Depends
+from fastapi import APIRouter, Query, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-import math
+from sqlalchemy import desc, func, select
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Any
+from typing import List, Literal, Optional
 from app.api.endpoints.auth import get_db
-from app.models.product import Product, PriceHistory
-from app.services.product_updater import update_all_products
+from app.db.session import get_async_db, run_db
+from app.models.product import PriceHistory
+from app.core.config import settings
+from app.services.product_updater import refresh_product
 from app.services.currency_service import CurrencyService
+from app.services.product_catalog import ProductCatalog
+from app.services.product_resolver import ProductResolver
+from app.services.response_cache import ResponseCache
+from app.services.history_service import get_history_points, get_history_points_batch
+from app.services.offers_service import (
+    build_offers,
+    get_latest_offers,
+    OFFER_COLUMNS,
+    pick_best_deal,
+    reprice_offers,
+)
 from app.schemas.product import ComparisonResponse 
-from app.models.product import Product, PriceHistory
-from app.schemas.product import PriceHistoryResponse, PriceHistoryPoint
+from app.schemas.product import PriceHistoryResponse, BatchPriceHistoryResponse
+from app.schemas.product import PriceAnalyticsResponse
+from app.services.analytics_service import build_analytics
+from app.services.downsampling import downsample_points
 
 router = APIRouter()
 
+# Limite de produtos por chamada do histórico em lote
+MAX_BATCH_PRODUCTS = 20
+
+# Sessão das rotas de produtos: assíncrona quando habilitada, síncrona (testes) caso contrário
+get_products_db = get_async_db if settings.ASYNC_DB_ENABLED else get_db
+
+def _json_response(body: bytes) -> Response:
+    # Resposta já serializada: o FastAPI não revalida o response_model
+    return Response(content=body, media_type="application/json")
+
+def _get_latest_batch(db: Session, product_id: int):
+    """
+    Registros do último lote de scraping do produto: as linhas do maior run_id
+    (busca pelo índice (product_id, run_id)). Só as colunas das ofertas, como
+    linhas Core (sem hidratar objetos PriceHistory).
+    """
+    latest_run_id = select(func.max(PriceHistory.run_id))\
+        .where(PriceHistory.product_id == product_id)\
+        .scalar_subquery()
+
+    latest_history = db.execute(
+        select(*OFFER_COLUMNS)
+        .where(PriceHistory.product_id == product_id, PriceHistory.run_id == latest_run_id)
+    ).mappings().all()
+    if latest_history:
+        return latest_history
+
+    # Legado: registros anteriores à tabela 'scrape_runs' (sem run_id)
+    last_entry = db.query(PriceHistory.timestamp)\
+        .filter(PriceHistory.product_id == product_id)\
+        .order_by(desc(PriceHistory.timestamp))\
+        .first()
+    if not last_entry:
+        return []
+
+    # Janela de tempo de 2 minutos para pegar itens da mesma "batelada" de scraping
+    time_window = last_entry[0] - timedelta(minutes=2)
+
+    return db.execute(
+        select(*OFFER_COLUMNS)
+        .where(PriceHistory.product_id == product_id, PriceHistory.timestamp >= time_window)
+        .order_by(desc(PriceHistory.timestamp))
+    ).mappings().all()
+
+def _load_offers(db: Session, product_id: int, fallback_name: str, usd_rate: float):
+    """
+    Ofertas mais recentes do produto, vindas do snapshot 'latest_offers'.
+    Sem snapshot (dados anteriores a ele), monta a partir do último lote bruto.
+    """
+    offers = get_latest_offers(db, product_id)
+    if offers is not None:
+        return offers
+
+    latest_history = _get_latest_batch(db, product_id)
+    if not latest_history:
+        return None
+    product_name = ProductCatalog.get_name(product_id) or fallback_name
+    return build_offers(latest_history, product_name, usd_rate)
+
+async def _resolve_product_id(db: Session, term: str):
+    """Id do produto pela chave normalizada exata (memória primeiro, banco em caso de miss)."""
+    found = ProductResolver.lookup(term)
+    if found is None:
+        found = await run_db(db, ProductResolver.resolve, term)
+    return found[0] if found else None
+
 @router.get("/comparison", response_model=ComparisonResponse)
 async def get_product_comparison(
     q: str = Query(..., description="O termo de busca para o produto, ex: 'NVIDIA RTX 5090 32GB'"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_products_db)
 ):
     print(f"\n--- Usuário buscou: '{q}' ---")
 
     # 1. OBTER COTAÇÃO ATUAL E TIMESTAMP
     try:
         # Pega apenas a taxa (float)
-        usd_rate = CurrencyService.get_usd_to_brl()
+        usd_rate = await CurrencyService.get_usd_to_brl_async()
         
         # Pega a data separadamente usando o novo método
         rate_dt = CurrencyService.get_last_update_timestamp()
@@ -37,173 +117,184 @@ async def get_product_comparison(
         usd_rate = 0.0
         rate_timestamp = None
 
-    # 2. TENTA BUSCAR NO BANCO
-    product = db.query(Product).filter(Product.search_term == q).first()
-    
-    if not product or not product.history:
-        print("--- Produto novo ou sem dados. Atualizando... ---")
-        await update_all_products()
-        product = db.query(Product).filter(Product.search_term == q).first()
-
-    # 3. RECUPERA APENAS O ÚLTIMO LOTE DE DADOS
-    latest_history = []
-    if product:
-        last_entry = db.query(PriceHistory.timestamp)\
-            .filter(PriceHistory.product_id == product.id)\
-            .order_by(desc(PriceHistory.timestamp))\
-            .first()
-
-        if last_entry:
-            last_ts = last_entry[0]
-            # Janela de tempo de 2 minutos para pegar itens da mesma "batelada" de scraping
-            time_window = last_ts - timedelta(minutes=2)
-
-            latest_history = db.query(PriceHistory)\
-                .filter(PriceHistory.product_id == product.id)\
-                .filter(PriceHistory.timestamp >= time_window)\
-                .order_by(desc(PriceHistory.timestamp))\
-                .all()
-
-    # 4. FORMATA A RESPOSTA
-    results_by_source = {
-        "ebay": [],
-        "amazon": [],
-    }
-    
-    for h in latest_history:
-        # Se h.price_usd não existir no model ainda, usamos lógica de fallback
-        price_usd_val = getattr(h, 'price_usd', None)
-        
-        # Se o preço original for em USD e não tivermos o campo price_usd salvo
-        if h.currency == "USD" and price_usd_val is None:
-            price_usd_val = h.price
+    # Cache de respostas: mesma busca, mesma cotação e mesma versão dos dados
+    cache_key = ("comparison", q, usd_rate, rate_timestamp)
+    cached = ResponseCache.get(cache_key)
+    if cached is not None:
+        return _json_response(cached)
+    data_version = ResponseCache.data_version()
 
-        calculated_brl = 0.0
+    # 2. RESOLVE O PRODUTO PELA CHAVE NORMALIZADA (banco só em caso de miss) E
+    # 3. LÊ O SNAPSHOT DAS ÚLTIMAS OFERTAS (uma busca pela chave)
+    product_id = await _resolve_product_id(db, q)
+    offers = await run_db(db, _load_offers, product_id, q, usd_rate) if product_id else None
     
-        # Lógica de conversão
-        if h.currency == "BRL":
-            # Amazon BR / ML: O preço real é o próprio
-            calculated_brl = h.price
-        elif price_usd_val and usd_rate > 0:
-            # eBay USD: Converte usando a cotação DE AGORA
-            calculated_brl = math.ceil((price_usd_val * usd_rate) * 100) / 100
-
-        item = {
-            "title": h.original_title if h.original_title else product.name,
-            "seller": h.seller_name,
-            "seller_username": h.seller_name,
-            "rating": h.seller_rating,
-            "price_original": h.price,
-            "currency_original": h.currency,
-            "price_usd": price_usd_val,
-            "price_brl": calculated_brl,
-            "source": h.source,
-            "link": getattr(h, "link", "#"), 
-            "timestamp": h.timestamp
-        }
-
-        source_key = h.source.lower().replace(" ", "")
-        if "amazon" in source_key: 
-            results_by_source["amazon"].append(item)
-        elif "ebay" in source_key:
-            results_by_source["ebay"].append(item)
-        # Adiciona suporte caso apareçam outros sources
-        elif source_key not in results_by_source:
-             results_by_source[source_key] = [item]
-        else:
-             results_by_source[source_key].append(item)
-
-    # --- Ordenação baseada em REAIS (BRL) ---
-    def sort_by_price(item):
-        return item['price_brl'] if item['price_brl'] else float('inf')
-
-    # Ordena todas as listas
-    for source in results_by_source:
-        results_by_source[source].sort(key=sort_by_price)
+    if not offers:
+        print("--- Produto novo ou sem dados. Atualizando apenas este produto... ---")
+        await refresh_product(q, timeout=settings.COMPARISON_REFRESH_TIMEOUT)
+        product_id = await _resolve_product_id(db, q)
+        offers = await run_db(db, _load_offers, product_id, q, usd_rate) if product_id else None
+
+    # 4. FORMATA A RESPOSTA (ofertas em moeda estrangeira com a cotação DE AGORA)
+    results_by_source = reprice_offers(offers, usd_rate) if offers else {"ebay": [], "amazon": []}
 
     # 5. MELHOR OFERTA GERAL
-    overall_best_deal = None
-    all_items = []
-    for items in results_by_source.values():
-        all_items.extend(items)
-        
-    if all_items:
-        best_item = min(all_items, key=sort_by_price)
-        overall_best_deal = best_item
+    overall_best_deal = pick_best_deal(results_by_source)
+
+    response = ComparisonResponse(
+        results_by_source=results_by_source,
+        overall_best_deal=overall_best_deal,
+        current_exchange_rate=usd_rate,
+        exchange_rate_timestamp=rate_timestamp,
+    )
+    body = response.model_dump_json().encode()
 
-    return {
-        "results_by_source": results_by_source,
-        "overall_best_deal": overall_best_deal,
-        "current_exchange_rate": usd_rate,
-        "exchange_rate_timestamp": rate_timestamp 
-    }
+    # Só guarda respostas com ofertas (sem dados, a próxima busca tenta atualizar de novo)
+    if offers:
+        ResponseCache.set(cache_key, body, data_version)
+    return _json_response(body)
 
 @router.get("/history", response_model=PriceHistoryResponse)
-def get_product_history(
+async def get_product_history(
     product_name: str = Query(..., description="Nome exato ou termo de busca do produto"),
     period_days: int = Query(30, description="Quantos dias de histórico buscar"),
-    db: Session = Depends(get_db)
+    granularity: Literal["run", "minute", "hour", "day"] = Query(
+        "run", description="Tamanho do bucket: uma execução do updater, minuto, hora ou dia"
+    ),
+    max_points: Optional[int] = Query(
+        None, ge=3, le=5000, description="Máximo de pontos por fonte (downsampling LTTB que preserva a forma do gráfico)"
+    ),
+    db: Session = Depends(get_products_db)
 ):
-    # 1. Busca o Produto
-    product = db.query(Product).filter(Product.name.ilike(f"%{product_name}%")).first()
-    if not product:
-        product = db.query(Product).filter(Product.search_term.ilike(f"%{product_name}%")).first()
-    
-    if not product:
-        return PriceHistoryResponse(product_name=product_name, history=[])
+    cache_key = ("history", product_name, period_days, granularity, max_points)
+    cached = ResponseCache.get(cache_key)
+    if cached is not None:
+        return _json_response(cached)
+    data_version = ResponseCache.data_version()
+
+    # 1. Busca o Produto (chave normalizada exata ou parcial, memória primeiro)
+    found = ProductResolver.lookup(product_name, partial=True)
+    if found is None:
+        found = await run_db(db, ProductResolver.resolve, product_name, True)
+
+    if not found:
+        body = PriceHistoryResponse(product_name=product_name, history=[]).model_dump_json().encode()
+        ResponseCache.set(cache_key, body, data_version)
+        return _json_response(body)
+
+    product_id, resolved_name = found
 
     # 2. Define Data Limite
     limit_date = datetime.now(timezone.utc) - timedelta(days=period_days)
 
-    # 3. Busca Todos os Dados Brutos
-    raw_data = (
-        db.query(PriceHistory)
-        .filter(PriceHistory.product_id == product.id)
-        .filter(PriceHistory.timestamp >= limit_date)
-        .order_by(PriceHistory.timestamp.asc()) 
-        .all()
-    )
+    # 3. Agrupamento no banco: um ponto por bucket e fonte (min/média/máx)
+    points = await run_db(db, get_history_points, product_id, limit_date, granularity)
+    if max_points:
+        points = downsample_points(points, max_points)
 
-    # 4. Agrupamento Inteligente
-    grouped_points: Dict[str, Dict[str, Any]] = {}
+    # Os pontos (dicts simples) são validados e serializados numa chamada só ao pydantic-core
+    body = PriceHistoryResponse.model_validate(
+        {"product_name": resolved_name, "history": points}
+    ).model_dump_json().encode()
+    ResponseCache.set(cache_key, body, data_version)
+    return _json_response(body)
 
-    for entry in raw_data:
-        time_key = entry.timestamp.strftime("%Y-%m-%d %H:%M")
-        group_key = f"{time_key}_{entry.source}"
+def _load_batch_history(db: Session, found: dict, limit_date: datetime, granularity: str):
+    """Resolve no banco os nomes que a memória não conhecia e lê todas as séries numa consulta só."""
+    for name, resolution in found.items():
+        if resolution is None:
+            found[name] = ProductResolver.resolve(db, name, True)
+    product_ids = list(dict.fromkeys(resolution[0] for resolution in found.values() if resolution))
+    return get_history_points_batch(db, product_ids, limit_date, granularity)
 
-        val_usd = entry.price_usd
-        val_brl = entry.price
-        
-        # Recupera a taxa salva naquele registro
-        val_rate = getattr(entry, "exchange_rate", None)
-
-        if group_key not in grouped_points:
-            grouped_points[group_key] = {
-                "date": entry.timestamp.isoformat(),
-                "source": entry.source if entry.source else "Desconhecido",
-                "price_usd": val_usd,
-                "price_brl": val_brl,
-                "exchange_rate": val_rate 
-            }
-        else:
-            current = grouped_points[group_key]
-            
-            # Mantemos a lógica de pegar o MENOR preço do lote
-            if val_usd is not None:
-                if current["price_usd"] is None or val_usd < current["price_usd"]:
-                    current["price_usd"] = val_usd
-            
-            if val_brl is not None:
-                if current["price_brl"] is None or val_brl < current["price_brl"]:
-                    current["price_brl"] = val_brl
-
-    final_history = [
-        PriceHistoryPoint(**data) for data in grouped_points.values()
-    ]
-
-    final_history.sort(key=lambda x: x.date)
-
-    return PriceHistoryResponse(
-        product_name=product.name,
-        history=final_history
-    )
\ No newline at end of file
+@router.get("/history/batch", response_model=BatchPriceHistoryResponse)
+async def get_products_history_batch(
+    product_names: List[str] = Query(..., description="Nomes ou termos de busca (repita o parâmetro para cada produto)"),
+    period_days: int = Query(30, description="Quantos dias de histórico buscar"),
+    granularity: Literal["run", "minute", "hour", "day"] = Query(
+        "run", description="Tamanho do bucket: uma execução do updater, minuto, hora ou dia"
+    ),
+    max_points: Optional[int] = Query(
+        None, ge=3, le=5000, description="Máximo de pontos por fonte em cada produto (downsampling LTTB)"
+    ),
+    db: Session = Depends(get_products_db)
+):
+    """
+    Histórico de vários produtos lado a lado (dashboard de comparação): uma
+    resolução de nomes e uma única consulta com WHERE product_id IN (...),
+    em vez de uma chamada a /history por produto.
+    """
+    names = list(dict.fromkeys(product_names))
+    if len(names) > MAX_BATCH_PRODUCTS:
+        raise HTTPException(status_code=422, detail=f"Máximo de {MAX_BATCH_PRODUCTS} produtos por consulta")
+
+    cache_key = ("history_batch", tuple(names), period_days, granularity, max_points)
+    cached = ResponseCache.get(cache_key)
+    if cached is not None:
+        return _json_response(cached)
+    data_version = ResponseCache.data_version()
+
+    # 1. Resolve os nomes (memória primeiro; os misses vão ao banco junto com a consulta)
+    found = {name: ProductResolver.lookup(name, partial=True) for name in names}
+    limit_date = datetime.now(timezone.utc) - timedelta(days=period_days)
+
+    # 2. Todas as séries numa consulta, ordenadas por (product_id, data)
+    points_by_product = await run_db(db, _load_batch_history, found, limit_date, granularity)
+
+    products = {}
+    for name, resolution in found.items():
+        if resolution is None:
+            products[name] = {"product_name": name, "history": []}
+            continue
+        product_id, resolved_name = resolution
+        points = points_by_product[product_id]
+        if max_points:
+            points = downsample_points(points, max_points)
+        products[name] = {"product_name": resolved_name, "history": points}
+
+    body = BatchPriceHistoryResponse.model_validate(
+        {"period_days": period_days, "products": products}
+    ).model_dump_json().encode()
+    ResponseCache.set(cache_key, body, data_version)
+    return _json_response(body)
+
+@router.get("/analytics", response_model=PriceAnalyticsResponse)
+async def get_product_analytics(
+    product_name: str = Query(..., description="Nome exato ou termo de busca do produto"),
+    period_days: int = Query(3650, ge=1, description="Quantos dias de histórico analisar (padrão: 10 anos)"),
+    window: int = Query(7, ge=1, le=365, description="Janela (em dias) da mínima e da média móveis"),
+    lowest_days: int = Query(30, ge=1, description="'Menor preço em N dias': tamanho de N"),
+    db: Session = Depends(get_products_db)
+):
+    """
+    Estatísticas por fonte sobre a série diária de menores preços (BRL):
+    mínima/média móveis, percentis, volatilidade, variação sobre a mediana de
+    30 dias, mínima do período e o indicador "menor preço em N dias".
+    """
+    cache_key = ("analytics", product_name, period_days, window, lowest_days)
+    cached = ResponseCache.get(cache_key)
+    if cached is not None:
+        return _json_response(cached)
+    data_version = ResponseCache.data_version()
+
+    found = ProductResolver.lookup(product_name, partial=True)
+    if found is None:
+        found = await run_db(db, ProductResolver.resolve, product_name, True)
+
+    sources = {}
+    resolved_name = product_name
+    if found:
+        product_id, resolved_name = found
+        limit_date = datetime.now(timezone.utc) - timedelta(days=period_days)
+        # Um ponto por dia e fonte (períodos longos vêm do agregado diário)
+        points = await run_db(db, get_history_points, product_id, limit_date, "day")
+        sources = build_analytics(points, window, lowest_days)
+
+    body = PriceAnalyticsResponse(
+        product_name=resolved_name,
+        window_days=window,
+        lowest_days=lowest_days,
+        sources=sources,
+    ).model_dump_json().encode()
+    ResponseCache.set(cache_key, body, data_version)
+    return _json_response(body)
@@ -10,6 +10,7 @@ class Settings(BaseSettings):
 
     # Define todas as suas variáveis de ambiente aqui
     DATABASE_URL: str
+    ASYNC_DB_ENABLED: bool = True  # Usa SQLAlchemy asyncio (asyncpg/aiosqlite) nas rotas de produtos e no updater
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
@@ -21,8 +22,42 @@ class Settings(BaseSettings):
     EBAY_CLIENT_SECRET: str
     EBAY_REFRESH_TOKEN: str
 
+    # Cliente HTTP do eBay (timeouts em segundos)
+    EBAY_CONNECT_TIMEOUT: float = 5.0
+    EBAY_READ_TIMEOUT: float = 15.0
+    EBAY_MAX_CONNECTIONS: int = 10
+
     # Scrapfly (para Web Scraping)
     SCRAPFLY_API_KEY: str
+    SCRAPFLY_MAX_CONCURRENCY: int = 3     # Cota de scrapes simultâneos do plano Scrapfly
+
+    # Atualizador de preços (limites de concorrência das buscas)
+    UPDATER_MAX_CONCURRENCY: int = 8      # Limite global de buscas simultâneas
+    UPDATER_EBAY_CONCURRENCY: int = 5     # Limite de buscas simultâneas no eBay
+    UPDATER_AMAZON_CONCURRENCY: int = 3   # Limite de buscas simultâneas na Amazon (<= cota Scrapfly)
+
+    # Orçamento (segundos) da atualização direcionada no cache miss do /comparison
+    COMPARISON_REFRESH_TIMEOUT: float = 20.0
+
+    # Cache em memória das respostas de /comparison e /history (LRU, invalidado a cada execução do updater)
+    RESPONSE_CACHE_MAX_ENTRIES: int = 512
+
+    # Histórico de preços: particionamento mensal (só Postgres) e retenção dos registros brutos
+    PRICE_HISTORY_PARTITIONED: bool = False      # Cria 'price_history' particionada por mês (banco novo)
+    # Meses de dados brutos mantidos. 0 = sem retenção (padrão): apagar histórico é opt-in;
+    # ative junto com o arquivo Parquet para não perder os registros brutos antigos
+    PRICE_HISTORY_RETENTION_MONTHS: int = 0
+    # Acima destes períodos (dias), o /history lê os agregados por hora / por dia em vez dos dados brutos
+    HISTORY_HOURLY_ROLLUP_DAYS: int = 30
+    HISTORY_DAILY_ROLLUP_DAYS: int = 90
+
+    # Arquivo colunar (Parquet) dos meses fechados de 'price_history', para análises offline
+    PARQUET_ARCHIVE_ENABLED: bool = False
+    PARQUET_ARCHIVE_DIR: str = "data/price_history_archive"
+
+    # Cache compartilhado entre workers e reinícios (cotações e token do eBay), em SQLite. Vazio desativa.
+    # Para várias réplicas, aponte para um volume compartilhado entre elas.
+    SHARED_CACHE_PATH: str = "data/shared_cache.sqlite3"
 
 # Cria a instância única das configurações para ser usada em toda a aplicação
 settings = Settings()
\ No newline at end of file
@@ -2,10 +2,14 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from zoneinfo import ZoneInfo
 from datetime import datetime
+import asyncio
 import logging
 
 # Importamos a função que faz o trabalho pesado
 from app.services.product_updater import update_all_products
+from app.services.retention_service import run_retention
+from app.services.parquet_archive import run_compaction
+from app.core.config import settings
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,6 +26,24 @@ async def update_prices_job():
     except Exception as e:
         logger.error(f"--- Erro CRÍTICO na Atualização Agendada: {e} ---")
 
+async def retention_job():
+    """Tarefa agendada: roda às 04:30 (partições futuras + retenção do histórico bruto)."""
+    logger.info("--- Iniciando Manutenção do Histórico de Preços ---")
+    try:
+        result = await asyncio.to_thread(run_retention)
+        logger.info(f"--- Manutenção do Histórico Concluída: {result} ---")
+    except Exception as e:
+        logger.error(f"--- Erro na Manutenção do Histórico: {e} ---")
+
+async def archive_job():
+    """Tarefa agendada: roda às 04:00, antes da retenção (arquiva os meses fechados em Parquet)."""
+    logger.info("--- Iniciando Arquivamento do Histórico em Parquet ---")
+    try:
+        archived = await asyncio.to_thread(run_compaction)
+        logger.info(f"--- Arquivamento Concluído: {len(archived)} meses gravados ---")
+    except Exception as e:
+        logger.error(f"--- Erro no Arquivamento do Histórico: {e} ---")
+
 def start_scheduler():
     """Configura e inicia o agendador."""
     # Definição do Fuso Horário
@@ -42,6 +64,25 @@ def start_scheduler():
         id="price_update_job",
         replace_existing=True
     )
+
+    # Arquivo Parquet antes da retenção, para os meses antigos serem gravados antes de apagados
+    if settings.PARQUET_ARCHIVE_ENABLED:
+        scheduler.add_job(
+            archive_job,
+            trigger=CronTrigger(hour=4, minute=0, timezone=tz),
+            misfire_grace_time=3600,
+            id="price_history_archive_job",
+            replace_existing=True
+        )
+
+    # Depois da execução da madrugada, fora do horário de pico
+    scheduler.add_job(
+        retention_job,
+        trigger=CronTrigger(hour=4, minute=30, timezone=tz),
+        misfire_grace_time=3600,
+        id="price_history_retention_job",
+        replace_existing=True
+    )
     
     scheduler.start()
     
@@ -0,0 +1,125 @@
+from datetime import date
+from typing import List, Tuple
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex
+from loguru import logger as log
+from app.db.base_class import Base
+from app.models.product import PriceHistory
+
+# Partições mensais: price_history_p202405 cobre [2024-05-01, 2024-06-01)
+PARTITION_PREFIX = "price_history_p"
+DEFAULT_PARTITION = "price_history_default"
+# Quantos meses à frente ficam sempre criados
+MONTHS_AHEAD = 3
+
+
+def add_months(month: date, months: int) -> date:
+    """Primeiro dia do mês deslocado em 'months' meses."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month.year:04d}{month.month:02d}"
+
+
+def partition_month(name: str) -> date:
+    """Mês coberto por uma partição, a partir do nome (inverso de partition_name)."""
+    suffix = name[len(PARTITION_PREFIX):]
+    return date(int(suffix[:4]), int(suffix[4:6]), 1)
+
+
+def partitioned_table_ddl() -> str:
+    """
+    CREATE TABLE de 'price_history' particionada por RANGE (timestamp), gerado
+    a partir das colunas do modelo. No Postgres a chave primária de uma tabela
+    particionada precisa incluir a coluna de partição: (id, timestamp).
+    """
+    dialect = postgresql.dialect()
+    table = PriceHistory.__table__
+    definitions = []
+    for column in table.columns:
+        if column.name == "id":
+            definitions.append('"id" SERIAL')
+            continue
+        not_null = " NOT NULL" if not column.nullable or column.name == "timestamp" else ""
+        definitions.append(f'"{column.name}" {column.type.compile(dialect=dialect)}{not_null}')
+
+    definitions.append('PRIMARY KEY ("id", "timestamp")')
+    for column in table.columns:
+        for fk in column.foreign_keys:
+            target_table, target_column = fk.target_fullname.split(".")
+            definitions.append(f'FOREIGN KEY ("{column.name}") REFERENCES {target_table} ("{target_column}")')
+
+    columns_sql = ",\n    ".join(definitions)
+    return f'CREATE TABLE {table.name} (\n    {columns_sql}\n) PARTITION BY RANGE ("timestamp")'
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table"
+    ), {"table": PriceHistory.__tablename__}).first() is not None
+
+
+def list_partitions(conn: Connection) -> List[Tuple[str, date]]:
+    """Partições mensais existentes (nome, mês), da mais antiga para a mais nova."""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {"table": PriceHistory.__tablename__}).scalars()
+    return sorted((name, partition_month(name)) for name in names if name.startswith(PARTITION_PREFIX))
+
+
+def ensure_partitions(conn: Connection, today: date, months_ahead: int = MONTHS_AHEAD):
+    """Cria (se faltarem) as partições do mês atual e dos próximos meses, mais a DEFAULT."""
+    current = today.replace(day=1)
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PriceHistory.__tablename__} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+    # Registros fora das faixas criadas (ex.: datas antigas importadas) não falham o INSERT
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PriceHistory.__tablename__} DEFAULT"
+    ))
+
+
+def drop_partition(conn: Connection, name: str):
+    """Desanexa e apaga uma partição inteira (sem DELETE linha a linha)."""
+    conn.execute(text(f"ALTER TABLE {PriceHistory.__tablename__} DETACH PARTITION {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
+
+
+def setup_price_history_partitions(engine: Engine, today: date) -> bool:
+    """
+    Chamado no startup antes do create_all. Em Postgres com particionamento
+    habilitado, cria 'price_history' particionada (se ainda não existir) e
+    garante as partições dos próximos meses. Uma tabela já existente sem
+    partições não é convertida: isso exige migração manual dos dados.
+    """
+    if engine.dialect.name != "postgresql":
+        return False
+
+    with engine.begin() as conn:
+        if not inspect(conn).has_table(PriceHistory.__tablename__):
+            # Tabelas referenciadas pelas FKs precisam existir antes
+            Base.metadata.create_all(conn, tables=[fk.column.table for fk in PriceHistory.__table__.foreign_keys])
+            conn.execute(text(partitioned_table_ddl()))
+            for index in PriceHistory.__table__.indexes:
+                conn.execute(CreateIndex(index))
+            log.info("Tabela 'price_history' criada com particionamento mensal.")
+        elif not is_partitioned(conn):
+            log.warning("'price_history' já existe sem particionamento; mantendo a tabela atual.")
+            return False
+
+        ensure_partitions(conn, today)
+    return True
@@ -0,0 +1,59 @@
+from typing import List
+from sqlalchemy import Column, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateIndex
+from loguru import logger as log
+from app.models.product import PriceHistory, PriceHistoryDaily
+
+# Colunas criadas depois das suas tabelas: o create_all só cria tabelas que
+# faltam, não altera as existentes. Todas precisam ser nullable (as linhas
+# antigas ficam com NULL).
+ADDED_COLUMNS: List[Column] = [
+    PriceHistory.__table__.c.run_id,
+    PriceHistory.__table__.c.price_original,
+    PriceHistoryDaily.__table__.c.first_price,
+    PriceHistoryDaily.__table__.c.first_at,
+    PriceHistoryDaily.__table__.c.last_price,
+    PriceHistoryDaily.__table__.c.last_at,
+]
+
+
+def add_column_ddl(conn: Connection, column: Column) -> str:
+    """ALTER TABLE ... ADD COLUMN gerado a partir da coluna do modelo (com a FK, se houver)."""
+    ddl = f"ALTER TABLE {column.table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+    for fk in column.foreign_keys:
+        target_table, target_column = fk.target_fullname.split(".")
+        ddl += f" REFERENCES {target_table} ({target_column})"
+    return ddl
+
+
+def upgrade_schema(engine: Engine) -> List[str]:
+    """
+    Chamado no startup depois do create_all: adiciona a bancos existentes as
+    colunas de ADDED_COLUMNS que faltarem e cria os índices dos modelos
+    dessas tabelas (IF NOT EXISTS). Idempotente: sem nada a fazer, só lê o
+    catálogo. Em 'price_history' particionada, o ALTER no pai vale para
+    todas as partições.
+    """
+    added = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        tables = []
+        for column in ADDED_COLUMNS:
+            table = column.table
+            if not inspector.has_table(table.name):
+                continue
+            if table not in tables:
+                tables.append(table)
+            if column.name in {c["name"] for c in inspector.get_columns(table.name)}:
+                continue
+            conn.execute(text(add_column_ddl(conn, column)))
+            added.append(f"{table.name}.{column.name}")
+
+        for table in tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+    if added:
+        log.info(f"Colunas adicionadas ao banco existente: {', '.join(added)}")
+    return added
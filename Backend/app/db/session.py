@@ -1,6 +1,53 @@
+from typing import AsyncGenerator
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
 engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def get_async_database_url(database_url: str) -> str:
+    """
+    Converte a DATABASE_URL síncrona para o driver assíncrono equivalente:
+    Postgres -> asyncpg, SQLite -> aiosqlite.
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+
+    if backend == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+        # asyncpg não entende 'sslmode' (parâmetro da libpq); usa 'ssl'
+        if "sslmode" in url.query:
+            query = dict(url.query)
+            query["ssl"] = query.pop("sslmode")
+            url = url.set(query=query)
+    elif backend == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+
+    return url.render_as_string(hide_password=False)
+
+
+# Engine assíncrono (opcional): as rotas e o updater não bloqueiam o event loop no I/O do banco
+async_engine = create_async_engine(get_async_database_url(settings.DATABASE_URL)) if settings.ASYNC_DB_ENABLED else None
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Dependência que fornece uma sessão assíncrona."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Executa fn(session, *args) na sessão recebida.
+    Com AsyncSession, roda via run_sync: o código de consulta continua síncrono
+    (mesmas queries nos dois modos), mas o I/O passa pelo driver assíncrono.
+    Com Session comum (modo síncrono/testes), chama fn diretamente.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return fn(db, *args, **kwargs)
@@ -0,0 +1,45 @@
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+def dialect_insert(db: Session, model):
+    """
+    Retorna o INSERT específico do dialeto em uso (Postgres ou SQLite), que
+    suporta ON CONFLICT. Para outros bancos, devolve o INSERT genérico.
+    """
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert(model)
+    if dialect_name == "sqlite":
+        return sqlite.insert(model)
+    return insert(model)
+
+
+def insert_ignore_duplicates(db: Session, model, rows, index_elements):
+    """INSERT ... ON CONFLICT (index_elements) DO NOTHING em lote."""
+    if not rows:
+        return
+    stmt = dialect_insert(db, model)
+    if hasattr(stmt, "on_conflict_do_nothing"):
+        stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+    db.execute(stmt, rows)
+
+
+def upsert(db: Session, model, rows, index_elements, update_columns):
+    """
+    INSERT ... ON CONFLICT (index_elements) DO UPDATE SET update_columns em lote.
+    Em bancos sem ON CONFLICT, cai para session.merge linha a linha.
+    """
+    if not rows:
+        return
+    stmt = dialect_insert(db, model)
+    if not hasattr(stmt, "on_conflict_do_update"):
+        for row in rows:
+            db.merge(model(**row))
+        return
+    stmt = stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: getattr(stmt.excluded, column) for column in update_columns},
+    )
+    db.execute(stmt, rows)
@@ -1,25 +1,59 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from app.db.base_class import Base
-from app.db.session import engine
+from datetime import datetime, timezone
+from app.core.config import settings
+from app.db.session import engine, async_engine, SessionLocal
+from app.db.partitioning import setup_price_history_partitions
+from app.db.schema_upgrade import upgrade_schema
 from app.core.scheduler import start_scheduler
 from app.models.product import Product, PriceHistory  # noqa: F401
 from app.models.user import User  # noqa: F401
-from app.api.endpoints import auth, products, current_exchange
+from app.models.exchange_rate import ExchangeRate  # noqa: F401
+from app.api.endpoints import auth, products, current_exchange, export
 from app.services.product_updater import update_all_products 
+from app.services import ebay_service
+from app.services.product_catalog import ProductCatalog
+from app.services.product_resolver import ProductResolver, ensure_trigram_index
+from app.services.response_cache import ResponseCache
+from app.services.rollup_service import backfill_empty_rollups
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Lógica de Início
+    if settings.PRICE_HISTORY_PARTITIONED:
+        print("--- Preparando Partições de 'price_history' ---")
+        setup_price_history_partitions(engine, datetime.now(timezone.utc).date())
+
     print("--- Criando Tabelas no Banco de Dados (se não existirem) ---")
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    ensure_trigram_index(engine)
+
+    print("--- Carregando Catálogo de Produtos ---")
+    with SessionLocal() as db:
+        ProductCatalog.load(db)
+        ProductResolver.sync(db)
+        backfill_empty_rollups(db)
+        db.commit()
     
     print("--- Inicializando Agendador de Tarefas ---")
     start_scheduler()
+
+    # Invalidações do cache de respostas feitas por outros workers
+    version_watch = asyncio.create_task(ResponseCache.watch_shared_version())
     
     yield
 
+    version_watch.cancel()
+
+    # Lógica de Encerramento
+    await ebay_service.close_async_client()
+    if async_engine is not None:
+        await async_engine.dispose()
+
 # Passamos o lifespan na criação do app
 app = FastAPI(title="Benchiban API", lifespan=lifespan)
 
@@ -48,6 +82,9 @@ app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 # Produtos (Scraping e Comparação)
 app.include_router(products.router, prefix="/api/products", tags=["products"])
 
+# Exportação do histórico (streaming NDJSON/CSV)
+app.include_router(export.router, prefix="/api/export", tags=["export"])
+
 # Câmbio
 app.include_router(current_exchange.router, prefix="/api/exchange-rate", tags=["exchange-rate"])
 
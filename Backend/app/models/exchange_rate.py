@@ -0,0 +1,15 @@
+from sqlalchemy import Column, String, Float, Date, DateTime
+from app.db.base_class import Base
+
+class ExchangeRate(Base):
+    """
+    Cotação histórica de um par de moedas: uma linha por dia (a última busca
+    do dia prevalece). Fonte das conversões "na data" do histórico de preços.
+    """
+    __tablename__ = "exchange_rates"
+
+    base = Column(String(3), primary_key=True)    # Ex.: "USD"
+    quote = Column(String(3), primary_key=True)   # Ex.: "BRL"
+    day = Column(Date, primary_key=True)
+    rate = Column(Float, nullable=False)          # 1 base = rate quote
+    fetched_at = Column(DateTime, nullable=False)
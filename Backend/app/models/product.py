@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Index, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from app.db.base_class import Base
@@ -13,14 +13,46 @@ class Product(Base):
     # Relacionamento com o histórico
     history = relationship("PriceHistory", back_populates="product")
 
+class ProductAlias(Base):
+    """
+    Chaves normalizadas (nome, termo de busca e apelidos) que resolvem para
+    um produto. A chave é única; no Postgres ganha também um índice trigram
+    (criado no startup) para buscas parciais.
+    """
+    __tablename__ = "product_aliases"
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    alias = Column(String, nullable=False)                         # Texto original
+    normalized_key = Column(String, unique=True, nullable=False)   # Ex.: "nvidia rtx 5090 32gb"
+
+class ScrapeRun(Base):
+    """Uma execução do updater. Todos os preços coletados nela apontam para o mesmo run."""
+    __tablename__ = "scrape_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    started_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = Column(DateTime, nullable=True)
+    products_count = Column(Integer, default=0) # Quantos produtos foram buscados
+    items_count = Column(Integer, default=0)    # Quantos preços foram salvos
+
+    # Relacionamento com os preços coletados
+    history = relationship("PriceHistory", back_populates="run")
+
 class PriceHistory(Base):
     __tablename__ = "price_history"
+    __table_args__ = (
+        # "Últimas ofertas do produto X" = maior run_id do produto (busca indexada)
+        Index("ix_price_history_product_run", "product_id", "run_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
+    run_id = Column(Integer, ForeignKey("scrape_runs.id"), nullable=True) # Execução que coletou o preço
     price = Column(Float, nullable=False) # Preço
     price_usd = Column(Float, nullable=True)
-    currency = Column(String, default="USD") # Moeda padrão
+    currency = Column(String, default="USD") # Moeda do anúncio
+    price_original = Column(Float, nullable=True) # Valor do anúncio, na moeda 'currency'
     source = Column(String) # De qual plataforma o preço é buscado
     link = Column(String) # Link do anúncio
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -29,5 +61,60 @@ class PriceHistory(Base):
     seller_rating = Column(Float, nullable=True) # Avaliação
     exchange_rate = Column(Float, nullable=True) # Taxa de câmbio
     
-    # Relacionamento reverso
-    product = relationship("Product", back_populates="history")
\ No newline at end of file
+    # Relacionamentos reversos
+    product = relationship("Product", back_populates="history")
+    run = relationship("ScrapeRun", back_populates="history")
+
+class PriceRollupMixin:
+    """
+    Colunas comuns dos agregados de 'price_history' por produto, fonte e bucket.
+    Preços em BRL (como 'price_history.price'); média = soma / contagem.
+    """
+    min_price = Column(Float, nullable=False)
+    max_price = Column(Float, nullable=False)
+    sum_price = Column(Float, nullable=False)
+    price_count = Column(Integer, nullable=False)
+    min_price_usd = Column(Float, nullable=True)
+    max_price_usd = Column(Float, nullable=True)
+    sum_price_usd = Column(Float, nullable=True)
+    price_usd_count = Column(Integer, nullable=False, default=0)
+    exchange_rate = Column(Float, nullable=True)  # Média do bucket
+    # Primeiro/último preço do bucket (nulos em agregados reconstruídos dos dados brutos)
+    first_price = Column(Float, nullable=True)
+    first_at = Column(DateTime, nullable=True)
+    last_price = Column(Float, nullable=True)
+    last_at = Column(DateTime, nullable=True)
+
+class PriceHistoryHourly(PriceRollupMixin, Base):
+    """Agregado por hora, mantido pelo updater ao fim de cada execução."""
+    __tablename__ = "price_history_hourly"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    source = Column(String, primary_key=True)
+    hour = Column(DateTime, primary_key=True)  # Início da hora (UTC)
+
+class PriceHistoryDaily(PriceRollupMixin, Base):
+    """
+    Agregado diário, mantido pelo updater ao fim de cada execução. Também
+    recebe os dias antigos que a política de retenção agrega antes de apagar
+    os registros brutos, para que o /history continue mostrando esse período.
+    """
+    __tablename__ = "price_history_daily"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    source = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+
+class LatestOffers(Base):
+    """
+    Snapshot das ofertas mais recentes de cada produto, mantido pelo updater
+    ao fim de cada execução: top-N por fonte já ordenado e a melhor oferta.
+    O /comparison lê uma única linha por chave, sem tocar em 'price_history'.
+    """
+    __tablename__ = "latest_offers"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    run_id = Column(Integer, ForeignKey("scrape_runs.id"), nullable=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    offers = Column(JSON, nullable=False)    # {fonte: [itens ordenados pelo preço em BRL]}
+    best_deal = Column(JSON, nullable=True)  # Item mais barato entre todas as fontes
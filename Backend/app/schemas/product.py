@@ -26,14 +26,46 @@ class ComparisonResponse(BaseModel):
     exchange_rate_timestamp: Optional[str] = None
 
 class PriceHistoryPoint(BaseModel):
-    """Um ponto no gráfico contendo valores em BRL e USD."""
+    """Um ponto no gráfico contendo valores em BRL e USD (menor preço do bucket, mais média e máximo)."""
     date: str
     price_brl: Optional[float] = None  # Valor em Reais
     price_usd: Optional[float] = None  # Valor em Dólar
+    price_brl_avg: Optional[float] = None
+    price_brl_max: Optional[float] = None
+    price_usd_avg: Optional[float] = None
+    price_usd_max: Optional[float] = None
     exchange_rate: Optional[float] = None
     source: str
 
 class PriceHistoryResponse(BaseModel):
     """Resposta contendo a lista de pontos."""
     product_name: str
-    history: List[PriceHistoryPoint]
\ No newline at end of file
+    history: List[PriceHistoryPoint]
+
+class BatchPriceHistoryResponse(BaseModel):
+    """Históricos de vários produtos, indexados pelo nome pedido na consulta."""
+    period_days: int
+    products: Dict[str, PriceHistoryResponse]
+
+class PriceAnalyticsPoint(PriceHistoryPoint):
+    """Ponto diário do histórico com as médias/mínimas móveis da janela."""
+    rolling_min: Optional[float] = None
+    rolling_mean: Optional[float] = None
+
+class SourceAnalytics(BaseModel):
+    """Estatísticas da série de menores preços diários (BRL) de uma fonte."""
+    points: List[PriceAnalyticsPoint]
+    latest_price: Optional[float] = None
+    all_time_low: Optional[float] = None
+    all_time_low_date: Optional[str] = None
+    is_lowest_in_n_days: bool = False
+    median_30d: Optional[float] = None
+    pct_vs_median_30d: Optional[float] = None  # Variação (%) do preço atual sobre a mediana de 30 dias
+    volatility: Optional[float] = None         # Desvio padrão (%) das variações diárias
+    percentiles: Dict[str, float] = {}         # p10, p25, p50, p75, p90
+
+class PriceAnalyticsResponse(BaseModel):
+    product_name: str
+    window_days: int
+    lowest_days: int
+    sources: Dict[str, SourceAnalytics]
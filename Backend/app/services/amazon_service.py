@@ -1,3 +1,4 @@
+import asyncio
 import math
 import re
 from typing import List, Dict, Any, Optional
@@ -8,12 +9,16 @@ from app.core.config import settings
 from app.services.currency_service import CurrencyService 
 
 # --- CONFIGURAÇÃO DO CLIENTE ---
-SCRAPFLY = ScrapflyClient(key=settings.SCRAPFLY_API_KEY)
+SCRAPFLY = ScrapflyClient(key=settings.SCRAPFLY_API_KEY, max_concurrency=settings.SCRAPFLY_MAX_CONCURRENCY)
 BASE_CONFIG = {
     "asp": True,
     "country": "BR",
 }
 
+# Semáforo que limita os scrapes assíncronos à cota do Scrapfly (um por event loop)
+_scrape_semaphore: Optional[asyncio.Semaphore] = None
+_scrape_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
 # --- MAPA DE CONFIGURAÇÃO DE BUSCA ---
 AMAZON_SEARCH_CONFIG = {
     # ------------------------------------------------------
@@ -98,13 +103,21 @@ def _parse_price_br(price_str: str) -> Optional[float]:
         log.warning(f"Amazon BR: Não foi possível converter o preço: {price_str}")
         return None
 
-def _parse_search_page(result: ScrapeApiResponse, palavras_chave_obrigatorias: List[str]) -> List[Dict[str, Any]]:
-    """Extrai Título, Preço e Link da página de busca E FILTRA"""
+def _parse_search_page(
+    result: ScrapeApiResponse,
+    palavras_chave_obrigatorias: List[str],
+    usd_to_brl: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Extrai Título, Preço e Link da página de busca E FILTRA.
+    Se a cotação não for informada, ela é obtida do CurrencyService.
+    """
     previews = []
     product_boxes = result.selector.css("div.s-result-item[data-component-type=s-search-result]")
 
     try:
-        usd_to_brl = CurrencyService.get_usd_to_brl()
+        if usd_to_brl is None:
+            usd_to_brl = CurrencyService.get_usd_to_brl()
         brl_to_usd_rate = 1 / usd_to_brl if usd_to_brl else 0
     except Exception:
         brl_to_usd_rate = 0
@@ -163,6 +176,25 @@ def _parse_search_page(result: ScrapeApiResponse, palavras_chave_obrigatorias: L
     log.info(f"Amazon BR: Extraídos {len(previews)} produtos válidos APÓS FILTRAGEM.")
     return previews
 
+def _build_search_url(search_term: str) -> str:
+    # URL da Amazon Brasileira
+    return f"https://www.amazon.com.br/s?k={quote_plus(search_term)}"
+
+def _top_results(resultados: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Ordena pelo preço em Reais (já que estamos no BR)
+    resultados_ordenados = sorted(resultados, key=lambda x: x['price'])
+    return resultados_ordenados[:3]
+
+def _get_scrape_semaphore() -> asyncio.Semaphore:
+    """Semáforo da cota do Scrapfly, recriado se o event loop mudar."""
+    global _scrape_semaphore, _scrape_semaphore_loop
+
+    loop = asyncio.get_running_loop()
+    if _scrape_semaphore is None or _scrape_semaphore_loop is not loop:
+        _scrape_semaphore = asyncio.Semaphore(settings.SCRAPFLY_MAX_CONCURRENCY)
+        _scrape_semaphore_loop = loop
+    return _scrape_semaphore
+
 # --- FUNÇÃO PRINCIPAL DO SERVIÇO ---
 def search_amazon_items(query: str) -> List[Dict[str, Any]]:
     log.info(f"--- Amazon BR: Recebida busca por '{query}' ---")
@@ -173,11 +205,8 @@ def search_amazon_items(query: str) -> List[Dict[str, Any]]:
         log.warning(f"--- Amazon: Nenhuma configuração para '{query}'. ---")
         return []
 
-    search_term = config_para_busca["search_term"]
     palavras_filtro = config_para_busca["required_keywords"]
-    
-    # URL da Amazon Brasileira
-    url_busca = f"https://www.amazon.com.br/s?k={quote_plus(search_term)}"
+    url_busca = _build_search_url(config_para_busca["search_term"])
     
     log.info(f"--- Amazon BR: Buscando URL: {url_busca} ---")
 
@@ -185,11 +214,44 @@ def search_amazon_items(query: str) -> List[Dict[str, Any]]:
         result = SCRAPFLY.scrape(ScrapeConfig(url_busca, **BASE_CONFIG))
         
         resultados = _parse_search_page(result, palavras_filtro)
-        
-        # Ordena pelo preço em Reais (já que estamos no BR)
-        resultados_ordenados = sorted(resultados, key=lambda x: x['price'])
-        return resultados_ordenados[:3]
+        return _top_results(resultados)
+
+    except Exception as e:
+        log.error(f"--- Amazon BR: Falha ao buscar a URL {url_busca}: {e}")
+        return []
+
+async def search_amazon_items_async(query: str) -> List[Dict[str, Any]]:
+    """
+    Versão assíncrona de search_amazon_items.
+    Várias buscas podem ser disparadas de uma vez (asyncio.gather); o semáforo
+    mantém no máximo SCRAPFLY_MAX_CONCURRENCY scrapes em voo, e cada página é
+    processada assim que o seu scrape termina.
+    """
+    log.info(f"--- Amazon BR: Recebida busca por '{query}' ---")
+
+    config_para_busca = AMAZON_SEARCH_CONFIG.get(query)
+
+    if not config_para_busca:
+        log.warning(f"--- Amazon: Nenhuma configuração para '{query}'. ---")
+        return []
+
+    palavras_filtro = config_para_busca["required_keywords"]
+    url_busca = _build_search_url(config_para_busca["search_term"])
+
+    try:
+        async with _get_scrape_semaphore():
+            log.info(f"--- Amazon BR: Buscando URL: {url_busca} ---")
+            result = await SCRAPFLY.async_scrape(ScrapeConfig(url_busca, **BASE_CONFIG))
+
+        # Cotação do cache (a atualização, quando precisa, roda fora do event loop)
+        try:
+            usd_to_brl = await CurrencyService.get_usd_to_brl_async()
+        except Exception:
+            usd_to_brl = 0
+
+        resultados = _parse_search_page(result, palavras_filtro, usd_to_brl)
+        return _top_results(resultados)
 
     except Exception as e:
         log.error(f"--- Amazon BR: Falha ao buscar a URL {url_busca}: {e}")
-        return []
\ No newline at end of file
+        return []
@@ -0,0 +1,108 @@
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+PERCENTILES = (10, 25, 50, 75, 90)
+MEDIAN_DAYS = 30
+
+
+def rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Mínimo móvel; nas primeiras posições (janela incompleta) usa o mínimo
+    acumulado. NaN (dia sem preço) é ignorado; janela só com NaN dá NaN.
+    """
+    if len(values) == 0:
+        return values.copy()
+    head = np.fmin.accumulate(values[:window - 1])
+    if len(values) < window:
+        return head
+    full = np.fmin.reduce(np.lib.stride_tricks.sliding_window_view(values, window), axis=1)
+    return np.concatenate([head, full])
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Média móvel via soma acumulada (janela incompleta no início), ignorando NaN."""
+    present = ~np.isnan(values)
+    sums = np.concatenate([[0.0], np.cumsum(np.where(present, values, 0.0))])
+    counts = np.concatenate([[0], np.cumsum(present)])
+    ends = np.arange(1, len(values) + 1)
+    starts = np.maximum(ends - window, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums[ends] - sums[starts]) / (counts[ends] - counts[starts])
+
+
+def daily_grid(dates: np.ndarray, prices: np.ndarray):
+    """
+    Reamostra a série em dias corridos: um array do primeiro ao último dia,
+    com NaN nos dias sem preço (e o menor preço, se houver mais de um no
+    dia), mais a posição de cada ponto nele. Assim uma janela de N posições
+    cobre N dias, não N pontos.
+    """
+    offsets = (dates - dates[0]).astype(np.int64)
+    grid = np.full(int(offsets[-1]) + 1, np.nan)
+    np.fmin.at(grid, offsets, prices)
+    return grid, offsets
+
+
+def series_stats(dates: np.ndarray, prices: np.ndarray, window: int, lowest_days: int) -> Dict[str, Any]:
+    """
+    Estatísticas de uma série (datas datetime64 ordenadas, preços float) em
+    uma passada vetorizada: janelas móveis, percentis, volatilidade, mediana
+    de 30 dias e mínimas do período.
+    """
+    if len(prices) == 0:
+        return {"rolling_min": prices, "rolling_mean": prices}
+
+    latest_date, latest_price = dates[-1], prices[-1]
+    recent_low = prices[dates >= latest_date - np.timedelta64(lowest_days, "D")].min()
+    median_30d = float(np.median(prices[dates >= latest_date - np.timedelta64(MEDIAN_DAYS, "D")]))
+
+    low_index = int(np.argmin(prices))
+    changes = np.diff(prices) / prices[:-1]
+
+    # Janelas de 'window' dias corridos: dias sem coleta não alargam a janela
+    grid, offsets = daily_grid(dates, prices)
+
+    return {
+        "rolling_min": rolling_min(grid, window)[offsets],
+        "rolling_mean": rolling_mean(grid, window)[offsets],
+        "latest_price": float(latest_price),
+        "all_time_low": float(prices[low_index]),
+        "all_time_low_index": low_index,
+        "is_lowest_in_n_days": bool(latest_price <= recent_low),
+        "median_30d": median_30d,
+        "pct_vs_median_30d": float((latest_price - median_30d) / median_30d * 100) if median_30d else None,
+        "volatility": float(np.std(changes) * 100) if len(changes) >= 2 else None,
+        "percentiles": {f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(prices, PERCENTILES))},
+    }
+
+
+def build_analytics(points: List[Dict[str, Any]], window: int, lowest_days: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Agrupa os pontos diários do histórico (formato de PriceHistoryPoint) por
+    fonte e calcula as estatísticas sobre o menor preço em BRL de cada dia.
+    """
+    by_source: Dict[str, List[Dict[str, Any]]] = {}
+    for point in points:
+        if point.get("price_brl") is not None:
+            by_source.setdefault(point["source"], []).append(point)
+
+    analytics = {}
+    for source, source_points in by_source.items():
+        source_points.sort(key=lambda p: p["date"])
+        dates = np.array([p["date"][:10] for p in source_points], dtype="datetime64[D]")
+        prices = np.array([p["price_brl"] for p in source_points], dtype=np.float64)
+
+        stats = series_stats(dates, prices, window, lowest_days)
+        rolling_min_values = stats.pop("rolling_min").tolist()
+        rolling_mean_values = stats.pop("rolling_mean").tolist()
+        low_index: Optional[int] = stats.pop("all_time_low_index", None)
+
+        analytics[source] = {
+            **stats,
+            "all_time_low_date": source_points[low_index]["date"] if low_index is not None else None,
+            "points": [
+                {**point, "rolling_min": low, "rolling_mean": mean}
+                for point, low, mean in zip(source_points, rolling_min_values, rolling_mean_values)
+            ],
+        }
+    return analytics
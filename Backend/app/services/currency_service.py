@@ -1,44 +1,139 @@
+import asyncio
+import httpx
 import requests
+import threading
 import time
 from datetime import datetime, timezone # <--- Import adicionado
+from typing import Dict, List, Optional
 from loguru import logger as log
+from app.services.shared_cache import SharedCache
+
+FRANKFURTER_URL = "https://api.frankfurter.app/latest?from=USD&to=BRL"
+AWESOMEAPI_URL = "https://economia.awesomeapi.com.br/last/USD-BRL"
+PROVIDER_TIMEOUT = 5
+# Chave da cotação no cache compartilhado entre workers
+SHARED_RATE_KEY = "usd_brl"
 
 class CurrencyService:
     _cached_rate = None
     _last_update = 0
     _CACHE_TTL = 3600
+    # Idade máxima da cotação servida sem esperar a API (stale-while-revalidate)
+    _MAX_STALENESS = 6 * 3600
+    # Uma busca por vez: chamadas concorrentes esperam a mesma atualização
+    _lock = threading.Lock()
+    _refresh_task: Optional[asyncio.Task] = None
+
+    # Busca "hedged": consulta o provedor principal e, se ele não responder
+    # em _HEDGE_DELAY segundos (ou falhar), dispara o outro; vale a primeira
+    # resposta válida. Com _HEDGE_DELAY = 0 os dois são consultados juntos.
+    _HEDGED_FETCH = True
+    _HEDGE_DELAY = 0.3
+    # Estatísticas por provedor (médias móveis exponenciais) que definem o principal
+    _STATS_ALPHA = 0.2
+    _ERROR_PENALTY = 5.0  # segundos somados à latência por taxa de erro de 100%
+    _provider_stats: Dict[str, Dict[str, Optional[float]]] = {}
 
     @classmethod
     def get_usd_to_brl(cls, force_refresh: bool = False) -> float:
-        
-        #Força a busca na API de câmbio
-        current_time = time.time()
-        
+
         # Se NÃO for forçado e o cache for válido, usa o cache
-        if not force_refresh and cls._cached_rate and (current_time - cls._last_update < cls._CACHE_TTL):
+        if not force_refresh and cls._is_fresh():
             return cls._cached_rate
 
-        # Se for forçado ou cache expirou, busca novo
-        log.info(f"Buscando nova cotação... (Force Refresh: {force_refresh})")
+        with cls._lock:
+            # Outra thread (ou outro worker, via cache compartilhado) pode ter atualizado
+            if not force_refresh:
+                cls._adopt_shared()
+                if cls._is_fresh():
+                    return cls._cached_rate
 
-        # 1. Tenta API Principal (Frankfurter)
-        try:
-            rate = cls._fetch_frankfurter()
+            # Se for forçado ou cache expirou, busca novo
+            log.info(f"Buscando nova cotação... (Force Refresh: {force_refresh})")
+            try:
+                rate = cls._fetch_rate()
+            except Exception as e:
+                log.error(f"Falha Crítica nas APIs de cotação: {e}")
+                if cls._cached_rate:
+                    return cls._cached_rate
+                raise Exception("Serviço de cotação indisponível.")
             cls._update_cache(rate)
             return rate
-        except Exception as e:
-            log.warning(f"Falha na Frankfurter API: {e}. Tentando Fallback...")
 
-        # 2. Tenta Fallback (AwesomeAPI - BR)
+    @classmethod
+    async def get_usd_to_brl_async(cls, force_refresh: bool = False) -> float:
+        """
+        Versão para o event loop (stale-while-revalidate):
+        - cache dentro do TTL: devolve direto;
+        - cache vencido, mas com menos de _MAX_STALENESS: devolve o valor atual
+          na hora e dispara a atualização em segundo plano;
+        - sem cache, forçado ou velho demais: espera a atualização.
+        Atualizações concorrentes compartilham uma única busca às APIs, feita
+        com HTTP assíncrono (ou numa thread, sem o modo hedged): o event loop
+        nunca bloqueia no HTTP nem no cache compartilhado (SQLite), que só é
+        lido e gravado dentro da atualização, numa thread.
+        """
+        if not force_refresh and cls._cached_rate:
+            age = time.time() - cls._last_update
+            if age < cls._CACHE_TTL:
+                return cls._cached_rate
+            if age < cls._MAX_STALENESS:
+                cls._start_refresh()
+                return cls._cached_rate
+
         try:
-            rate = cls._fetch_awesomeapi()
-            cls._update_cache(rate)
-            return rate
+            # shield: se a requisição for cancelada, a atualização compartilhada continua
+            return await asyncio.shield(cls._start_refresh(force=force_refresh))
         except Exception as e:
-            log.error(f"Falha Crítica nas APIs de cotação: {e}")
-            if cls._cached_rate:
+            if cls._cached_rate and time.time() - cls._last_update < cls._MAX_STALENESS:
                 return cls._cached_rate
-            raise Exception("Serviço de cotação indisponível.")
+            raise Exception("Serviço de cotação indisponível.") from e
+
+    @classmethod
+    def _start_refresh(cls, force: bool = False) -> asyncio.Task:
+        """Atualização em andamento neste event loop ou uma nova, se não houver."""
+        task = cls._refresh_task
+        loop = asyncio.get_running_loop()
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(cls._refresh(force))
+            task.add_done_callback(cls._log_refresh_failure)
+            cls._refresh_task = task
+        return task
+
+    @classmethod
+    async def _refresh(cls, force: bool = False) -> float:
+        # Outro worker pode já ter atualizado (ou é o primeiro acesso após reiniciar)
+        if not force:
+            await asyncio.to_thread(cls._adopt_shared)
+            if cls._is_fresh():
+                return cls._cached_rate
+
+        log.info("Atualizando cotação em segundo plano...")
+        if cls._HEDGED_FETCH:
+            rate = await cls._fetch_rate_hedged()
+        else:
+            rate = await asyncio.to_thread(cls._fetch_rate)
+        cls._set_rate(rate)
+        await asyncio.to_thread(cls._publish, rate, cls._last_update)
+        return rate
+
+    @staticmethod
+    def _log_refresh_failure(task: asyncio.Task):
+        # Recupera a exceção mesmo sem ninguém aguardando (atualização em segundo plano)
+        if not task.cancelled() and task.exception():
+            log.error(f"Falha Crítica nas APIs de cotação: {task.exception()}")
+
+    @classmethod
+    def _adopt_shared(cls):
+        """Usa a cotação do cache compartilhado se ela for mais nova que a deste processo."""
+        entry = SharedCache.get(SHARED_RATE_KEY)
+        if entry and entry[1] > cls._last_update:
+            cls._cached_rate = entry[0]["rate"]
+            cls._last_update = entry[1]
+
+    @classmethod
+    def _is_fresh(cls) -> bool:
+        return bool(cls._cached_rate) and (time.time() - cls._last_update < cls._CACHE_TTL)
 
     @classmethod
     def get_last_update_timestamp(cls):
@@ -48,22 +143,141 @@ class CurrencyService:
         # Converte timestamp UNIX para objeto datetime com timezone UTC
         return datetime.fromtimestamp(cls._last_update, tz=timezone.utc)
 
+    @classmethod
+    def _fetch_rate(cls) -> float:
+        """Busca sequencial (código síncrono): o provedor principal primeiro, o outro como fallback."""
+        fetchers = {"frankfurter": cls._fetch_frankfurter, "awesomeapi": cls._fetch_awesomeapi}
+        order = cls.provider_order()
+        for name in order:
+            start = time.perf_counter()
+            try:
+                rate = fetchers[name]()
+            except Exception as e:
+                cls._record(name, time.perf_counter() - start, failed=True)
+                if name == order[-1]:
+                    raise
+                log.warning(f"Falha na API {name}: {e}. Tentando Fallback...")
+                continue
+            cls._record(name, time.perf_counter() - start, failed=False)
+            return rate
+
+    @classmethod
+    async def _fetch_rate_hedged(cls) -> float:
+        """
+        Busca concorrente: começa pelo provedor principal e dispara o próximo
+        quando o atual falha ou passa de _HEDGE_DELAY sem responder. A primeira
+        cotação válida vence e as buscas restantes são canceladas, então a
+        latência fica perto da do provedor mais rápido, não da soma das duas.
+        """
+        fetchers = {"frankfurter": cls._fetch_frankfurter_async, "awesomeapi": cls._fetch_awesomeapi_async}
+        order = cls.provider_order()
+        pending = set()
+        errors: List[Exception] = []
+        try:
+            for position, name in enumerate(order):
+                pending.add(asyncio.create_task(cls._timed_fetch(name, fetchers[name])))
+                is_last = position == len(order) - 1
+                while pending:
+                    done, pending = await asyncio.wait(
+                        pending,
+                        timeout=None if is_last else cls._HEDGE_DELAY,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    for task in done:
+                        if task.exception() is None:
+                            return task.result()
+                        errors.append(task.exception())
+                    if not is_last:
+                        # Estourou o hedge delay ou falhou: dispara o próximo provedor
+                        break
+        finally:
+            for task in pending:
+                task.cancel()
+            # Espera os cancelamentos: a latência dos perdedores entra nas
+            # estatísticas antes da próxima escolha de provedor
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        raise Exception(f"Todas as APIs de cotação falharam: {errors}")
+
+    @classmethod
+    async def _timed_fetch(cls, name: str, fetcher) -> float:
+        start = time.perf_counter()
+        try:
+            rate = await fetcher()
+        except asyncio.CancelledError:
+            # Perdeu a corrida: não conta como erro, mas o tempo até o
+            # cancelamento é um limite inferior da sua latência. Sem essa
+            # amostra, um principal sempre lento nunca perderia a vez.
+            cls._record(name, time.perf_counter() - start, failed=False)
+            raise
+        except Exception as e:
+            cls._record(name, time.perf_counter() - start, failed=True)
+            log.warning(f"Falha na API {name}: {e}")
+            raise
+        cls._record(name, time.perf_counter() - start, failed=False)
+        return rate
+
+    @classmethod
+    def _record(cls, name: str, latency: float, failed: bool):
+        stats = cls._provider_stats.setdefault(name, {"latency": None, "error_rate": 0.0, "calls": 0})
+        alpha = cls._STATS_ALPHA
+        # Falhas (timeouts, em geral) também contam na latência: provedor lento e instável perde a vez
+        stats["latency"] = latency if stats["latency"] is None else (1 - alpha) * stats["latency"] + alpha * latency
+        stats["error_rate"] = (1 - alpha) * stats["error_rate"] + alpha * (1.0 if failed else 0.0)
+        stats["calls"] += 1
+
+    @classmethod
+    def provider_order(cls) -> List[str]:
+        """Provedores do melhor para o pior (latência média + penalidade por erros); Frankfurter no empate."""
+        def score(name: str) -> float:
+            stats = cls._provider_stats.get(name)
+            if not stats:
+                return 0.0
+            return (stats["latency"] or 0.0) + stats["error_rate"] * cls._ERROR_PENALTY
+        return sorted(["frankfurter", "awesomeapi"], key=score)
+
+    @classmethod
+    def get_provider_stats(cls) -> Dict[str, Dict[str, Optional[float]]]:
+        return {name: dict(stats) for name, stats in cls._provider_stats.items()}
+
     @classmethod
     def _fetch_frankfurter(cls) -> float:
-        url = "https://api.frankfurter.app/latest?from=USD&to=BRL"
-        resp = requests.get(url, timeout=5)
+        resp = requests.get(FRANKFURTER_URL, timeout=PROVIDER_TIMEOUT)
         resp.raise_for_status()
         return float(resp.json()["rates"]["BRL"])
 
     @classmethod
     def _fetch_awesomeapi(cls) -> float:
-        url = "https://economia.awesomeapi.com.br/last/USD-BRL"
-        resp = requests.get(url, timeout=5)
+        resp = requests.get(AWESOMEAPI_URL, timeout=PROVIDER_TIMEOUT)
+        resp.raise_for_status()
+        return float(resp.json()["USDBRL"]["bid"])
+
+    @classmethod
+    async def _fetch_frankfurter_async(cls) -> float:
+        async with httpx.AsyncClient(timeout=PROVIDER_TIMEOUT) as client:
+            resp = await client.get(FRANKFURTER_URL)
+        resp.raise_for_status()
+        return float(resp.json()["rates"]["BRL"])
+
+    @classmethod
+    async def _fetch_awesomeapi_async(cls) -> float:
+        async with httpx.AsyncClient(timeout=PROVIDER_TIMEOUT) as client:
+            resp = await client.get(AWESOMEAPI_URL)
         resp.raise_for_status()
         return float(resp.json()["USDBRL"]["bid"])
 
     @classmethod
     def _update_cache(cls, rate: float):
+        cls._set_rate(rate)
+        cls._publish(rate, cls._last_update)
+
+    @classmethod
+    def _set_rate(cls, rate: float):
         cls._cached_rate = rate
         cls._last_update = time.time()
-        log.info(f"Cotação USD/BRL atualizada: {rate}")
\ No newline at end of file
+        log.info(f"Cotação USD/BRL atualizada: {rate}")
+
+    @classmethod
+    def _publish(cls, rate: float, updated_at: float):
+        """Grava a cotação no cache compartilhado (I/O síncrono em SQLite)."""
+        SharedCache.set(SHARED_RATE_KEY, {"rate": rate}, updated_at)
@@ -0,0 +1,65 @@
+from datetime import datetime
+from typing import Any, Dict, List
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: índices de até 'threshold' pontos que
+    preservam a forma da série (picos e vales). Mantém o primeiro e o último
+    ponto; os demais são divididos em threshold-2 buckets e de cada um fica
+    o ponto que forma o maior triângulo com o ponto escolhido no bucket
+    anterior e a média do bucket seguinte.
+
+    Bordas dos buckets e médias são calculadas de uma vez (reduceat); só a
+    escolha, que depende do bucket anterior, percorre os buckets.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    # Bucket i cobre [edges[i], edges[i+1]); o último "bucket seguinte" é o último ponto
+    edges = (np.floor(np.arange(threshold - 1) * every) + 1).astype(np.int64)
+    edges[-1] = n - 1
+    bucket_sizes = np.diff(np.append(edges, n))
+    avg_x = np.add.reduceat(x, edges) / bucket_sizes
+    avg_y = np.add.reduceat(y, edges) / bucket_sizes
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Área (x2) do triângulo (ponto a, candidato, média do próximo bucket)
+        area = np.abs(
+            (x[a] - avg_x[i + 1]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y[i + 1] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_points(points: List[Dict[str, Any]], max_points: int) -> List[Dict[str, Any]]:
+    """
+    Reduz cada fonte a no máximo 'max_points' pontos com LTTB sobre
+    (data, menor preço em BRL). Séries já pequenas passam intactas.
+    """
+    by_source: Dict[str, List[Dict[str, Any]]] = {}
+    for point in points:
+        by_source.setdefault(point["source"], []).append(point)
+
+    result = []
+    for source_points in by_source.values():
+        priced = [p for p in source_points if p.get("price_brl") is not None]
+        if len(priced) <= max_points:
+            result.extend(source_points)
+            continue
+        x = np.array([datetime.fromisoformat(p["date"]).timestamp() for p in priced], dtype=np.float64)
+        y = np.array([p["price_brl"] for p in priced], dtype=np.float64)
+        order = np.argsort(x, kind="stable")
+        result.extend(priced[order[i]] for i in lttb_indices(x[order], y[order], max_points))
+
+    result.sort(key=lambda p: p["date"])
+    return result
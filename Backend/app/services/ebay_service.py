@@ -1,92 +1,205 @@
+import asyncio
 import requests
+import httpx
 import math
-from typing import List, Dict, Any
+import numpy as np
+from typing import List, Dict, Any, Optional
 from loguru import logger as log
+from app.core.config import settings
 from app.services import ebay_token_manager
 from app.services.currency_service import CurrencyService
+from app.services.rate_matrix import RateMatrix
+
+# --- CONFIGURAÇÃO DA API ---
+EBAY_SEARCH_URL = "https://api.ebay.com/buy/browse/v1/item_summary/search"
+EBAY_SEARCH_FILTER = "buyingOptions:{FIXED_PRICE},conditionIds:{1000}" # Apenas produtos novos e preço fixo
+EBAY_TIMEOUT = (settings.EBAY_CONNECT_TIMEOUT, settings.EBAY_READ_TIMEOUT)
+
+# Cliente HTTP assíncrono compartilhado (pool de conexões keep-alive)
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _build_params(query: str) -> Dict[str, Any]:
+    return {
+        "q": query,
+        "limit": 20,
+        "filter": EBAY_SEARCH_FILTER,
+    }
+
+def _build_headers(token: str) -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+    }
+
+def _listing_currencies(data: Dict[str, Any]) -> set:
+    """Moedas presentes nos itens da resposta (para buscar todas as cotações numa chamada)."""
+    return {item["price"].get("currency") for item in data.get("itemSummaries", []) if "price" in item}
+
+def _format_search_results(data: Dict[str, Any], query: str, usd_to_brl_rate: Optional[float]) -> List[Dict[str, Any]]:
+    """
+    Filtra, ordena e padroniza os itens retornados pela Browse API.
+    Anúncios em qualquer moeda (USD, EUR, GBP, CAD...) são convertidos para
+    USD e BRL de uma vez pelo RateMatrix; sem cotação, o item é descartado.
+    """
+    items = data.get("itemSummaries", [])
+    
+    # Filtra itens válidos
+    valid_items = [
+        item for item in items
+        if "price" in item and "seller" in item and item["seller"].get("feedbackPercentage")
+    ]
+
+    # Conversão do lote inteiro (moedas misturadas) para USD numa passada vetorizada
+    prices_usd = RateMatrix.convert(
+        [float(item["price"]["value"]) for item in valid_items],
+        [item["price"].get("currency") for item in valid_items],
+        "USD",
+    )
+    converted = [(item, price_usd) for item, price_usd in zip(valid_items, prices_usd.tolist()) if not math.isnan(price_usd)]
+
+    if not converted:
+        log.warning(f"eBay: Nenhum item válido encontrado para '{query}'")
+        return []
+
+    # Ordena por: Maior Reputação Vendedor -> Menor Preço (em USD, comparável entre moedas)
+    sorted_items = sorted(
+        converted,
+        key=lambda x: (-float(x[0]["seller"]["feedbackPercentage"]), x[1])
+    )
+    
+    top_3_raw = sorted_items[:3]
+
+    # Estimativa em BRL (apenas para retorno da API, não necessariamente para salvar no banco como 'price')
+    prices_brl = [None] * len(top_3_raw)
+    if usd_to_brl_rate:
+        usd = np.array([price_usd for _, price_usd in top_3_raw], dtype=np.float64)
+        prices_brl = (np.ceil(usd * usd_to_brl_rate * 100) / 100).tolist()
+
+    formatted_results = []
+    for (item, price_usd), price_brl_estimated in zip(top_3_raw, prices_brl):
+        price_val = float(item["price"]["value"])
+        currency = item["price"]["currency"]
+        if currency != "USD":
+            price_usd = round(price_usd, 2)
+
+        formatted_results.append({
+            "title": item.get("title"),
+            # Campos para o Banco de Dados
+            "price": price_val,         # Valor Original (ex: 1000)
+            "currency": currency,       # Moeda Original (ex: USD)
+            "price_usd": price_usd,     # Valor em Dólar (ex: 1000)
+            "price_brl": price_brl_estimated, 
+            "seller_rating": float(item["seller"]["feedbackPercentage"]),
+            "seller_username": item["seller"]["username"],
+            "link": item["itemWebUrl"],
+            "source": "eBay"
+        })
+        
+    return formatted_results
 
 def search_ebay_items(query: str) -> List[Dict[str, Any]]:
     """
     Busca itens NOVOS no eBay.
     Retorna o preço original E o preço padronizado em USD.
     """
-    url = "https://api.ebay.com/buy/browse/v1/item_summary/search"
-    params = {
-        "q": query,
-        "limit": 20,
-        "filter": "buyingOptions:{FIXED_PRICE},conditionIds:{1000}" # Apenas produtos novos e preço fixo
-    }
-
     try:
         valid_token = ebay_token_manager.get_valid_ebay_token()
     except Exception as e:
         log.error(f"eBay: Erro ao obter token: {e}")
         return []
-    
-    headers = {
-        "Authorization": f"Bearer {valid_token}",
-        "Content-Type": "application/json",
-    }
 
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = requests.get(
+            EBAY_SEARCH_URL,
+            headers=_build_headers(valid_token),
+            params=_build_params(query),
+            timeout=EBAY_TIMEOUT,
+        )
         response.raise_for_status()
         data = response.json()
-        
-        items = data.get("itemSummaries", [])
-        
-        # Filtra itens válidos
-        valid_items = [
-            item for item in items
-            if "price" in item and "seller" in item and item["seller"].get("feedbackPercentage")
-        ]
-
-        if not valid_items:
-            log.warning(f"eBay: Nenhum item válido encontrado para '{query}'")
-            return []
-
-        # Ordena por: Maior Reputação Vendedor -> Menor Preço
-        sorted_items = sorted(
-            valid_items,
-            key=lambda x: (-float(x["seller"]["feedbackPercentage"]), float(x["price"]["value"]))
-        )
-        
-        top_3_raw = sorted_items[:3]
-        
+
+        # Cotações das moedas dos anúncios (uma chamada para todas, só se faltar no cache)
+        RateMatrix.ensure(_listing_currencies(data))
+
         # Obtém cotação para calcular estimativa em BRL
         try:
             usd_to_brl_rate = CurrencyService.get_usd_to_brl()
         except Exception:
             usd_to_brl_rate = None
 
-        formatted_results = []
-        for item in top_3_raw:
-            price_val = float(item["price"]["value"])
-            currency = item["price"]["currency"]
-            
-            # LÓGICA DE PREÇOS
-            # Se for USD, o price_usd é o próprio valor. Se for outra moeda, precisaria converter (assumindo USD por enquanto)
-            price_usd = price_val if currency == "USD" else None
-            # Estimativa em BRL (apenas para retorno da API, não necessariamente para salvar no banco como 'price')
-            price_brl_estimated = None
-            if price_usd and usd_to_brl_rate:
-                price_brl_estimated = math.ceil((price_usd * usd_to_brl_rate) * 100) / 100
-
-            formatted_results.append({
-                "title": item.get("title"),
-                # Campos para o Banco de Dados
-                "price": price_val,         # Valor Original (ex: 1000)
-                "currency": currency,       # Moeda Original (ex: USD)
-                "price_usd": price_usd,     # Valor em Dólar (ex: 1000)
-                "price_brl": price_brl_estimated, 
-                "seller_rating": float(item["seller"]["feedbackPercentage"]),
-                "seller_username": item["seller"]["username"],
-                "link": item["itemWebUrl"],
-                "source": "eBay"
-            })
-            
-        return formatted_results
+        return _format_search_results(data, query, usd_to_brl_rate)
 
     except requests.exceptions.RequestException as e:
         log.error(f"eBay: Erro na requisição da API: {e}")
-        return []
\ No newline at end of file
+        return []
+
+
+# --- CLIENTE ASSÍNCRONO ---
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Retorna o cliente HTTP assíncrono compartilhado.
+    O pool mantém conexões keep-alive com a API do eBay, então buscas seguidas
+    reaproveitam a conexão TLS já aberta em vez de refazer o handshake.
+    Um novo cliente é criado se o anterior foi fechado ou pertence a outro event loop.
+    """
+    global _async_client, _async_client_loop
+
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client.is_closed or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                settings.EBAY_READ_TIMEOUT,
+                connect=settings.EBAY_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.EBAY_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.EBAY_MAX_CONNECTIONS,
+            ),
+        )
+        _async_client_loop = loop
+    return _async_client
+
+async def close_async_client():
+    """Fecha o pool de conexões (chamado no shutdown da aplicação)."""
+    global _async_client, _async_client_loop
+
+    if _async_client is not None and not _async_client.is_closed:
+        await _async_client.aclose()
+    _async_client = None
+    _async_client_loop = None
+
+async def search_ebay_items_async(query: str) -> List[Dict[str, Any]]:
+    """
+    Versão assíncrona de search_ebay_items, segura para uso em asyncio.gather.
+    A requisição usa o pool compartilhado; token e cotação (ainda síncronos)
+    rodam em thread para não bloquear o event loop.
+    """
+    try:
+        valid_token = await asyncio.to_thread(ebay_token_manager.get_valid_ebay_token)
+    except Exception as e:
+        log.error(f"eBay: Erro ao obter token: {e}")
+        return []
+
+    try:
+        response = await get_async_client().get(
+            EBAY_SEARCH_URL,
+            headers=_build_headers(valid_token),
+            params=_build_params(query),
+        )
+        response.raise_for_status()
+        data = response.json()
+    except httpx.HTTPError as e:
+        log.error(f"eBay: Erro na requisição da API: {e}")
+        return []
+
+    await RateMatrix.ensure_async(_listing_currencies(data))
+
+    try:
+        usd_to_brl_rate = await CurrencyService.get_usd_to_brl_async()
+    except Exception:
+        usd_to_brl_rate = None
+
+    return _format_search_results(data, query, usd_to_brl_rate)
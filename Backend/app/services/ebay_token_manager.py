@@ -5,9 +5,12 @@ import os
 from datetime import datetime, timedelta, timezone
 
 from app.core.config import settings
+from app.services.shared_cache import SharedCache
 
-# Caminho para o arquivo que irá armazenar o token
+# Caminho para o arquivo que irá armazenar o token (sem cache compartilhado)
 TOKEN_FILE_PATH = "ebay_token.json"
+# Chave do token no cache compartilhado entre workers
+SHARED_TOKEN_KEY = "ebay_token"
 
 def _read_token_from_file() -> dict | None:
     """Lê os dados do token do arquivo JSON."""
@@ -24,6 +27,21 @@ def _write_token_to_file(token_data: dict):
     with open(TOKEN_FILE_PATH, "w") as f:
         json.dump(token_data, f, indent=2)
 
+def _read_token() -> dict | None:
+    """
+    Token do cache compartilhado (todos os workers); sem ele (desativado,
+    vazio ou com falha), do arquivo local.
+    """
+    entry = SharedCache.get(SHARED_TOKEN_KEY)
+    if entry:
+        return entry[0]
+    return _read_token_from_file()
+
+def _write_token(token_data: dict):
+    # Cache compartilhado indisponível: o arquivo local garante que o token não se perde
+    if not SharedCache.set(SHARED_TOKEN_KEY, token_data):
+        _write_token_to_file(token_data)
+
 def _refresh_access_token() -> str:
     """Usa o Refresh Token para obter um novo Access Token da API do eBay."""
     url = "https://api.ebay.com/identity/v1/oauth2/token"
@@ -54,8 +72,8 @@ def _refresh_access_token() -> str:
     # Calcula o timestamp exato de expiração
     expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
 
-    # Salva o novo token e o seu tempo de expiração no arquivo
-    _write_token_to_file({
+    # Salva o novo token e o seu tempo de expiração (visível para os outros workers)
+    _write_token({
         "access_token": access_token,
         "expires_at": expires_at.isoformat()
     })
@@ -68,7 +86,7 @@ def get_valid_ebay_token() -> str:
     Obtém um Access Token válido, renovando-o se estiver expirado ou ausente.
     Esta é a única função que outros serviços devem chamar.
     """
-    token_info = _read_token_from_file()
+    token_info = _read_token()
 
     if token_info:
         expires_at = datetime.fromisoformat(token_info["expires_at"])
@@ -0,0 +1,150 @@
+import sys
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import requests
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from loguru import logger as log
+from app.db.session import SessionLocal
+from app.db.upsert import insert_ignore_duplicates, upsert
+from app.models.exchange_rate import ExchangeRate
+
+FRANKFURTER_TIMESERIES_URL = "https://api.frankfurter.app/{start}..{end}"
+TIMESERIES_TIMEOUT = 30
+
+# (moeda base, moeda cotada)
+Pair = Tuple[str, str]
+
+
+class RateTimeline:
+    """
+    Cotações de um par lidas de 'exchange_rates': um array ordenado de dias
+    (datetime64[D]) e outro de cotações. "Cotação no instante T" é uma busca
+    binária (searchsorted) pela última cotação com dia <= T; séries inteiras
+    são convertidas de uma vez, com uma busca vetorizada. Carregada do banco
+    a cada uso: nada fica em memória de processo, então todos os workers
+    enxergam as cotações gravadas pelos outros.
+    """
+
+    def __init__(self, days: np.ndarray, rates: np.ndarray):
+        self.days = days
+        self.rates = rates
+
+    @classmethod
+    def load(
+        cls,
+        db: Session,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        pair: Pair = ("USD", "BRL"),
+    ) -> "RateTimeline":
+        """
+        Cotações de 'start' a 'end' (sem limites: todas), mais a última
+        anterior a 'start', que é a vigente no começo do intervalo.
+        """
+        same_pair = (ExchangeRate.base == pair[0], ExchangeRate.quote == pair[1])
+        stmt = select(ExchangeRate.day, ExchangeRate.rate).where(*same_pair).order_by(ExchangeRate.day)
+        if start is not None:
+            previous = select(func.max(ExchangeRate.day)).where(*same_pair, ExchangeRate.day < start).scalar_subquery()
+            stmt = stmt.where(or_(ExchangeRate.day >= start, ExchangeRate.day == previous))
+        if end is not None:
+            stmt = stmt.where(ExchangeRate.day <= end)
+        rows = db.execute(stmt).all()
+        return cls(
+            np.array([day for day, _ in rows], dtype="datetime64[D]"),
+            np.array([rate for _, rate in rows], dtype=np.float64),
+        )
+
+    def rates_at(self, when: np.ndarray) -> np.ndarray:
+        """
+        Cotações vigentes em cada instante de 'when' (datetime64). Antes da
+        primeira cotação conhecida (ou sem cotações), o resultado é NaN.
+        """
+        when = np.asarray(when, dtype="datetime64[D]")
+        if len(self.days) == 0:
+            return np.full(len(when), np.nan)
+        index = np.searchsorted(self.days, when, side="right") - 1
+        return np.where(index >= 0, self.rates[np.maximum(index, 0)], np.nan)
+
+    def rate_at(self, when: datetime) -> Optional[float]:
+        rate = self.rates_at(np.array([np.datetime64(when.date(), "D")]))[0]
+        return None if np.isnan(rate) else float(rate)
+
+
+def record_rate(db: Session, rate: float, fetched_at: Optional[datetime] = None, pair: Pair = ("USD", "BRL")):
+    """
+    Registra a cotação usada agora (upsert na linha do dia). O commit fica a
+    cargo de quem chama (o updater grava junto com os preços da execução);
+    até lá a cotação só existe na transação, nunca na memória do processo.
+    """
+    fetched_at = fetched_at or datetime.now(timezone.utc)
+    day = fetched_at.astimezone(timezone.utc).date() if fetched_at.tzinfo else fetched_at.date()
+    upsert(
+        db,
+        ExchangeRate,
+        [{"base": pair[0], "quote": pair[1], "day": day, "rate": rate, "fetched_at": fetched_at}],
+        index_elements=["base", "quote", "day"],
+        update_columns=["rate", "fetched_at"],
+    )
+
+
+def fetch_timeseries(start: date, end: date, pair: Pair = ("USD", "BRL")) -> Dict[date, float]:
+    """Série diária da Frankfurter (dias úteis do BCE) entre 'start' e 'end', numa chamada."""
+    resp = requests.get(
+        FRANKFURTER_TIMESERIES_URL.format(start=start.isoformat(), end=end.isoformat()),
+        params={"from": pair[0], "to": pair[1]},
+        timeout=TIMESERIES_TIMEOUT,
+    )
+    resp.raise_for_status()
+    return {date.fromisoformat(day): float(rates[pair[1]]) for day, rates in resp.json()["rates"].items()}
+
+
+def backfill_exchange_rates(db: Session, start: date, end: Optional[date] = None, pair: Pair = ("USD", "BRL")) -> int:
+    """
+    Preenche 'exchange_rates' com a série histórica, em lote. Dias já
+    registrados (cotação realmente usada pelo updater) são mantidos.
+    """
+    end = end or datetime.now(timezone.utc).date()
+    series = fetch_timeseries(start, end, pair)
+    fetched_at = datetime.now(timezone.utc)
+    rows = [
+        {"base": pair[0], "quote": pair[1], "day": day, "rate": rate, "fetched_at": fetched_at}
+        for day, rate in sorted(series.items())
+    ]
+    insert_ignore_duplicates(db, ExchangeRate, rows, index_elements=["base", "quote", "day"])
+    db.flush()
+    return len(rows)
+
+
+def apply_exchange_rates(
+    db: Session,
+    series: Iterable[List[Dict[str, Any]]],
+    pair: Pair = ("USD", "BRL"),
+) -> None:
+    """
+    Preenche 'exchange_rate' dos pontos do histórico com a cotação vigente
+    na data de cada um: uma única consulta cobre o intervalo de todas as
+    séries e cada série é resolvida numa busca vetorizada. Pontos fora da
+    cobertura da tabela mantêm o valor gravado nas linhas (histórico legado).
+    """
+    series = [points for points in series if points]
+    if not series:
+        return
+    dates = [np.array([point["date"][:10] for point in points], dtype="datetime64[D]") for points in series]
+    start = min(d.min() for d in dates).astype(date)
+    end = max(d.max() for d in dates).astype(date)
+    timeline = RateTimeline.load(db, start, end, pair)
+    for points, when in zip(series, dates):
+        for point, rate in zip(points, timeline.rates_at(when).tolist()):
+            if rate == rate:  # não é NaN
+                point["exchange_rate"] = rate
+
+
+if __name__ == "__main__":
+    # Carga inicial: python -m app.services.exchange_rate_history [AAAA-MM-DD]
+    start = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else datetime.now(timezone.utc).date() - timedelta(days=365)
+    with SessionLocal() as db:
+        count = backfill_exchange_rates(db, start)
+        db.commit()
+    log.info(f"Cotações históricas gravadas desde {start}: {count} dias.")
@@ -0,0 +1,102 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator, Optional
+from sqlalchemy import Date, func, select
+from sqlalchemy.orm import Session
+from app.models.exchange_rate import ExchangeRate
+from app.models.product import PriceHistory
+
+# Linhas buscadas por vez no cursor do servidor (e escritas por chunk na resposta)
+EXPORT_BATCH_SIZE = 1000
+
+# Linhas novas não carregam a cotação (ela fica em 'exchange_rates'): o export
+# traz a USD->BRL vigente no dia de cada registro; as legadas mantêm a gravada.
+_RATE_ON_DAY = (
+    select(ExchangeRate.rate)
+    .where(
+        ExchangeRate.base == "USD",
+        ExchangeRate.quote == "BRL",
+        ExchangeRate.day <= func.date(PriceHistory.timestamp, type_=Date),
+    )
+    .order_by(ExchangeRate.day.desc())
+    .limit(1)
+    .scalar_subquery()
+)
+
+EXPORT_COLUMNS = [
+    PriceHistory.timestamp,
+    PriceHistory.product_id,
+    PriceHistory.run_id,
+    PriceHistory.source,
+    PriceHistory.price,
+    PriceHistory.price_usd,
+    PriceHistory.currency,
+    PriceHistory.price_original,
+    func.coalesce(PriceHistory.exchange_rate, _RATE_ON_DAY).label("exchange_rate"),
+    PriceHistory.original_title,
+    PriceHistory.seller_name,
+    PriceHistory.seller_rating,
+    PriceHistory.link,
+]
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+
+def build_export_query(
+    product_id: Optional[int] = None,
+    source: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    stmt = select(*EXPORT_COLUMNS)
+    if product_id is not None:
+        stmt = stmt.where(PriceHistory.product_id == product_id)
+    if source:
+        stmt = stmt.where(PriceHistory.source.ilike(source))
+    if start is not None:
+        stmt = stmt.where(PriceHistory.timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(PriceHistory.timestamp < end)
+    # Ordem estável (cronológica) para notebooks; o índice (product_id, ...) filtra antes
+    return stmt.order_by(PriceHistory.timestamp, PriceHistory.id)
+
+
+def stream_batches(db: Session, stmt) -> Iterator:
+    """
+    Lê o resultado com cursor do lado do servidor (stream_results + yield_per):
+    só EXPORT_BATCH_SIZE linhas ficam em memória por vez, seja qual for o total.
+    """
+    result = db.execute(stmt.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE))
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def stream_ndjson(db: Session, stmt) -> Iterator[str]:
+    """Um objeto JSON por linha, escrito em chunks de EXPORT_BATCH_SIZE linhas."""
+    for batch in stream_batches(db, stmt):
+        yield "".join(
+            json.dumps({field: _json_value(value) for field, value in zip(EXPORT_FIELDS, row)}, ensure_ascii=False) + "\n"
+            for row in batch
+        )
+
+
+def stream_csv(db: Session, stmt) -> Iterator[str]:
+    """CSV com cabeçalho, escrito em chunks de EXPORT_BATCH_SIZE linhas."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for batch in stream_batches(db, stmt):
+        writer.writerows(tuple(_json_value(value) for value in row) for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    # Exportação vazia ainda devolve o cabeçalho
+    if buffer.tell():
+        yield buffer.getvalue()
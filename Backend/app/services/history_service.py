@@ -0,0 +1,169 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.product import PriceHistory, PriceHistoryDaily, PriceHistoryHourly
+from app.services.exchange_rate_history import apply_exchange_rates
+from app.services.retention_service import retention_cutoff
+from app.services.rollup_service import ROLLUP_BUCKETS, hour_bucket
+
+# Formato do bucket no SQLite (strftime); no Postgres usamos date_trunc
+_SQLITE_FORMATS = {
+    "minute": "%Y-%m-%d %H:%M",
+    "hour": "%Y-%m-%d %H",
+    "day": "%Y-%m-%d",
+}
+
+
+def bucket_expression(dialect_name: str, granularity: str, column=PriceHistory.timestamp):
+    """Expressão SQL que trunca o timestamp no tamanho de bucket pedido."""
+    if dialect_name == "sqlite":
+        return func.strftime(_SQLITE_FORMATS[granularity], column)
+    return func.date_trunc(granularity, column)
+
+
+def _group_columns(dialect_name: str, granularity: str) -> list:
+    if granularity == "run":
+        # Uma execução do updater por ponto; registros legados (sem run_id) caem por minuto
+        return [PriceHistory.run_id, bucket_expression(dialect_name, "minute")]
+    return [bucket_expression(dialect_name, granularity)]
+
+
+def rollup_model_for(period_days: int, granularity: str):
+    """
+    Tabela de agregado usada para o período pedido (None = registros brutos).
+    Acima dos limites configurados, o bucket passa a ser a hora ou o dia, e
+    o custo da consulta deixa de depender de quantas amostras brutas existem.
+    """
+    if period_days > settings.HISTORY_DAILY_ROLLUP_DAYS:
+        return PriceHistoryDaily
+    if period_days > settings.HISTORY_HOURLY_ROLLUP_DAYS:
+        return PriceHistoryDaily if granularity == "day" else PriceHistoryHourly
+    return None
+
+
+def get_history_points(
+    db: Session,
+    product_id: int,
+    limit_date: datetime,
+    granularity: str = "run",
+) -> List[Dict[str, Any]]:
+    """
+    Agrega o histórico do produto no banco: um ponto por bucket e por fonte,
+    com min/média/máx em BRL e USD. Só os pontos agregados chegam à aplicação.
+    Períodos longos são lidos das tabelas de agregado por hora/dia.
+    """
+    return get_history_points_batch(db, [product_id], limit_date, granularity)[product_id]
+
+
+def get_history_points_batch(
+    db: Session,
+    product_ids: Sequence[int],
+    limit_date: datetime,
+    granularity: str = "run",
+) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Mesmo que get_history_points, para vários produtos de uma vez: uma única
+    consulta com WHERE product_id IN (...) ordenada por (product_id, data),
+    devolvendo as séries por produto.
+    """
+    # O corte da retenção e os agregados são UTC sem fuso, como as colunas de timestamp
+    naive_limit = limit_date.astimezone(timezone.utc).replace(tzinfo=None) if limit_date.tzinfo else limit_date
+    period_days = (datetime.now(timezone.utc).replace(tzinfo=None) - naive_limit).days
+    rollup_model = rollup_model_for(period_days, granularity)
+    points: Dict[int, List[Dict[str, Any]]] = {product_id: [] for product_id in product_ids}
+    if not product_ids:
+        return points
+
+    # Período anterior à retenção: os registros brutos (e os agregados por hora) já viraram agregados diários
+    cutoff = retention_cutoff()
+    if cutoff and naive_limit < cutoff and rollup_model is not PriceHistoryDaily:
+        _rollup_points(db, PriceHistoryDaily, points, naive_limit, cutoff)
+        naive_limit = cutoff
+
+    if rollup_model is not None:
+        _rollup_points(db, rollup_model, points, naive_limit)
+    else:
+        _raw_points(db, points, naive_limit, granularity)
+
+    # Cotação da data de cada ponto (tabela 'exchange_rates'), uma consulta para todas as séries
+    apply_exchange_rates(db, points.values())
+    return points
+
+
+def _raw_points(db: Session, points: Dict[int, List[Dict[str, Any]]], limit_date: datetime, granularity: str):
+    source = func.coalesce(PriceHistory.source, "Desconhecido").label("source")
+    group_columns = _group_columns(db.get_bind().dialect.name, granularity)
+
+    stmt = (
+        select(
+            PriceHistory.product_id,
+            func.min(PriceHistory.timestamp).label("date"),
+            source,
+            func.min(PriceHistory.price).label("price_brl"),
+            func.avg(PriceHistory.price).label("price_brl_avg"),
+            func.max(PriceHistory.price).label("price_brl_max"),
+            func.min(PriceHistory.price_usd).label("price_usd"),
+            func.avg(PriceHistory.price_usd).label("price_usd_avg"),
+            func.max(PriceHistory.price_usd).label("price_usd_max"),
+            func.avg(PriceHistory.exchange_rate).label("exchange_rate"),
+        )
+        .where(PriceHistory.product_id.in_(list(points)), PriceHistory.timestamp >= limit_date)
+        .group_by(PriceHistory.product_id, *group_columns, source)
+        .order_by(PriceHistory.product_id, func.min(PriceHistory.timestamp), source)
+    )
+
+    for row in db.execute(stmt).mappings():
+        point = dict(row)
+        product_id = point.pop("product_id")
+        point["date"] = row["date"].isoformat()
+        points[product_id].append(point)
+
+
+def _rollup_points(
+    db: Session,
+    model,
+    points: Dict[int, List[Dict[str, Any]]],
+    limit_date: datetime,
+    before: Optional[datetime] = None,
+):
+    """
+    Um ponto por bucket e fonte, lido da tabela de agregado (uma linha por
+    ponto). Só as colunas usadas, como linhas Core (sem objetos ORM).
+    """
+    bucket = getattr(model, ROLLUP_BUCKETS[model])
+    start = limit_date.date() if model is PriceHistoryDaily else hour_bucket(limit_date)
+    stmt = select(
+        model.product_id,
+        bucket,
+        model.source,
+        model.min_price,
+        model.max_price,
+        model.sum_price,
+        model.price_count,
+        model.min_price_usd,
+        model.max_price_usd,
+        model.sum_price_usd,
+        model.price_usd_count,
+        model.exchange_rate,
+    ).where(model.product_id.in_(list(points)), bucket >= start)
+    if before is not None:
+        stmt = stmt.where(bucket < (before.date() if model is PriceHistoryDaily else before))
+
+    rows = db.execute(stmt.order_by(model.product_id, bucket, model.source))
+    for (product_id, bucket_start, source, min_price, max_price, sum_price, price_count,
+         min_price_usd, max_price_usd, sum_price_usd, price_usd_count, exchange_rate) in rows:
+        if not isinstance(bucket_start, datetime):
+            bucket_start = datetime.combine(bucket_start, datetime.min.time())
+        points[product_id].append({
+            "date": bucket_start.isoformat(),
+            "source": source,
+            "price_brl": min_price,
+            "price_brl_avg": sum_price / price_count if price_count else None,
+            "price_brl_max": max_price,
+            "price_usd": min_price_usd,
+            "price_usd_avg": sum_price_usd / price_usd_count if price_usd_count else None,
+            "price_usd_max": max_price_usd,
+            "exchange_rate": exchange_rate,
+        })
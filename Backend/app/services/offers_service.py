@@ -0,0 +1,160 @@
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+from sqlalchemy.orm import Session
+from app.db.upsert import upsert
+from app.models.product import LatestOffers, PriceHistory
+
+# Quantas ofertas por fonte ficam no snapshot
+TOP_N_PER_SOURCE = 3
+
+
+def _convert_prices(currency: Optional[str], price: float, price_usd: Optional[float], usd_rate: float):
+    """Calcula (price_usd, price_brl) de uma oferta usando a cotação informada."""
+    # Se o preço original for em USD e não tivermos o campo price_usd salvo
+    if currency == "USD" and price_usd is None:
+        price_usd = price
+
+    calculated_brl = 0.0
+
+    # Lógica de conversão
+    if currency == "BRL":
+        # Amazon BR / ML: O preço real é o próprio
+        calculated_brl = price
+    elif price_usd and usd_rate > 0:
+        # eBay USD: Converte usando a cotação informada
+        calculated_brl = math.ceil((price_usd * usd_rate) * 100) / 100
+
+    return price_usd, calculated_brl
+
+
+# Colunas de 'price_history' lidas por build_offers. Selecionadas via Core
+# (select(*OFFER_COLUMNS)...mappings()): cada linha é um Row do SQLAlchemy
+# (tupla com __slots__), sem objeto ORM nem identity map.
+OFFER_COLUMNS = (
+    PriceHistory.price,
+    PriceHistory.price_usd,
+    PriceHistory.currency,
+    PriceHistory.price_original,
+    PriceHistory.source,
+    PriceHistory.link,
+    PriceHistory.original_title,
+    PriceHistory.seller_name,
+    PriceHistory.seller_rating,
+    PriceHistory.timestamp,
+)
+
+
+def _sort_by_price(item: Dict[str, Any]) -> float:
+    # --- Ordenação baseada em REAIS (BRL) ---
+    return item['price_brl'] if item['price_brl'] else float('inf')
+
+
+def build_offers(rows: Iterable[Mapping[str, Any]], product_name: str, usd_rate: float) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Agrupa linhas de 'price_history' (como mapeamentos) por fonte, converte
+    para BRL e ordena cada fonte pelo preço em Reais.
+    """
+    results_by_source: Dict[str, List[Dict[str, Any]]] = {
+        "ebay": [],
+        "amazon": [],
+    }
+
+    for h in rows:
+        price_usd_val, calculated_brl = _convert_prices(h["currency"], h["price"], h.get("price_usd"), usd_rate)
+        timestamp = h.get("timestamp")
+
+        item = {
+            "title": h.get("original_title") or product_name,
+            "seller": h.get("seller_name"),
+            "seller_username": h.get("seller_name"),
+            "rating": h.get("seller_rating"),
+            # Valor do anúncio na moeda original (linhas antigas não o têm: usa o preço gravado)
+            "price_original": h["price"] if h.get("price_original") is None else h["price_original"],
+            "currency_original": h["currency"],
+            "price_usd": price_usd_val,
+            "price_brl": calculated_brl,
+            "source": h["source"],
+            "link": h.get("link", "#"),
+            "timestamp": timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp,
+        }
+
+        source_key = h["source"].lower().replace(" ", "")
+        if "amazon" in source_key:
+            results_by_source["amazon"].append(item)
+        elif "ebay" in source_key:
+            results_by_source["ebay"].append(item)
+        # Adiciona suporte caso apareçam outros sources
+        else:
+            results_by_source.setdefault(source_key, []).append(item)
+
+    # Ordena todas as listas
+    for source in results_by_source:
+        results_by_source[source].sort(key=_sort_by_price)
+
+    return results_by_source
+
+
+def pick_best_deal(results_by_source: Dict[str, List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """Melhor oferta geral: como cada fonte já está ordenada, basta comparar as primeiras."""
+    heads = [items[0] for items in results_by_source.values() if items]
+    return min(heads, key=_sort_by_price) if heads else None
+
+
+def reprice_offers(results_by_source: Dict[str, List[Dict[str, Any]]], usd_rate: float) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Reconverte para BRL as ofertas em moeda estrangeira com a cotação DE AGORA.
+    A conversão é monotônica, então a ordem de cada fonte se mantém.
+    """
+    repriced = {}
+    for source, items in results_by_source.items():
+        repriced[source] = []
+        for item in items:
+            if item["currency_original"] != "BRL":
+                price_usd, price_brl = _convert_prices(
+                    item["currency_original"], item["price_original"], item["price_usd"], usd_rate
+                )
+                item = {**item, "price_usd": price_usd, "price_brl": price_brl}
+            repriced[source].append(item)
+    return repriced
+
+
+def save_latest_offers(
+    db: Session,
+    rows_by_product: Dict[int, List[Mapping[str, Any]]],
+    product_names: Dict[int, str],
+    usd_rate: float,
+    run_id: Optional[int],
+):
+    """
+    Atualiza o snapshot 'latest_offers' dos produtos com linhas nesta execução
+    (upsert por product_id). Produtos sem resultados mantêm o snapshot anterior.
+    """
+    now = datetime.now(timezone.utc)
+    snapshots = []
+    for product_id, rows in rows_by_product.items():
+        if not rows:
+            continue
+        offers = build_offers(rows, product_names.get(product_id, ""), usd_rate)
+        offers = {source: items[:TOP_N_PER_SOURCE] for source, items in offers.items()}
+        snapshots.append({
+            "product_id": product_id,
+            "run_id": run_id,
+            "updated_at": now,
+            "offers": offers,
+            "best_deal": pick_best_deal(offers),
+        })
+
+    upsert(
+        db,
+        LatestOffers,
+        snapshots,
+        index_elements=["product_id"],
+        update_columns=["run_id", "updated_at", "offers", "best_deal"],
+    )
+
+
+def get_latest_offers(db: Session, product_id: int) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """Lê o snapshot do produto (busca pela chave primária)."""
+    snapshot = db.get(LatestOffers, product_id)
+    return snapshot.offers if snapshot else None
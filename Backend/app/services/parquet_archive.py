@@ -0,0 +1,174 @@
+import os
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Sequence
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from loguru import logger as log
+from app.core.config import settings
+from app.db.partitioning import add_months
+from app.db.session import SessionLocal
+from app.models.product import PriceHistory
+from app.services.history_export import build_export_query, stream_batches
+
+# Esquema colunar do arquivo (mesmas colunas do export de 'price_history')
+ARCHIVE_SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("us")),
+    ("product_id", pa.int32()),
+    ("run_id", pa.int32()),
+    ("source", pa.string()),
+    ("price", pa.float64()),
+    ("price_usd", pa.float64()),
+    ("currency", pa.string()),
+    ("price_original", pa.float64()),
+    ("exchange_rate", pa.float64()),
+    ("original_title", pa.string()),
+    ("seller_name", pa.string()),
+    ("seller_rating", pa.float64()),
+    ("link", pa.string()),
+])
+
+# Linhas por row group: cada um ganha estatísticas min/max próprias (pulados nos filtros)
+ROW_GROUP_SIZE = 64_000
+
+
+def archive_dir() -> Path:
+    return Path(settings.PARQUET_ARCHIVE_DIR)
+
+
+def month_path(month: date, base: Optional[Path] = None) -> Path:
+    """Particionamento estilo Hive: <dir>/month=2024-05/price_history.parquet"""
+    return (base or archive_dir()) / f"month={month:%Y-%m}" / "price_history.parquet"
+
+
+def archive_month(db: Session, month: date, base: Optional[Path] = None) -> int:
+    """
+    Grava um mês fechado de 'price_history' num arquivo Parquet (zstd, com
+    estatísticas por coluna). Lê com cursor do servidor e escreve em lotes,
+    então a memória não cresce com o tamanho do mês. A escrita vai para um
+    arquivo temporário e só então é renomeada (leitores nunca veem arquivo pela metade).
+    Mês sem registros não gera arquivo (nem diretório) e retorna 0.
+    """
+    target = month_path(month, base)
+    # Prefixo '_': o pyarrow ignora o temporário ao ler o diretório do arquivo
+    tmp_path = target.with_name(f"_{target.name}.tmp")
+
+    next_month = add_months(month, 1)
+    stmt = build_export_query(
+        start=datetime(month.year, month.month, 1),
+        end=datetime(next_month.year, next_month.month, 1),
+    )
+    # Ordem por produto dentro do mês: row groups com faixas de product_id estreitas
+    stmt = stmt.order_by(None).order_by(PriceHistory.product_id, PriceHistory.timestamp)
+
+    try:
+        rows_written = _write_rows(db, stmt, tmp_path)
+    except BaseException:
+        # Falha no meio da escrita: não deixa o temporário para trás
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    if not rows_written:
+        log.info(f"Mês {month:%Y-%m} sem registros: nenhum arquivo Parquet gravado.")
+        return 0
+    os.replace(tmp_path, target)
+    log.info(f"Arquivo Parquet de {month:%Y-%m} gravado: {rows_written} linhas em {target}.")
+    return rows_written
+
+
+def _write_rows(db: Session, stmt, path: Path) -> int:
+    """Escreve o resultado em 'path' em row groups; sem linhas, o arquivo não é criado."""
+    rows_written = 0
+    writer: Optional[pq.ParquetWriter] = None
+    try:
+        buffer = []
+        for batch in stream_batches(db, stmt):
+            buffer.extend(batch)
+            if len(buffer) < ROW_GROUP_SIZE:
+                continue
+            writer = writer or _open_writer(path)
+            writer.write_table(_to_table(buffer), row_group_size=ROW_GROUP_SIZE)
+            rows_written += len(buffer)
+            buffer = []
+        if buffer:
+            writer = writer or _open_writer(path)
+            writer.write_table(_to_table(buffer), row_group_size=ROW_GROUP_SIZE)
+            rows_written += len(buffer)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows_written
+
+
+def _open_writer(path: Path) -> pq.ParquetWriter:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return pq.ParquetWriter(path, ARCHIVE_SCHEMA, compression="zstd", write_statistics=True)
+
+
+def _to_table(rows: Sequence) -> pa.Table:
+    columns = list(zip(*rows))
+    return pa.Table.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, ARCHIVE_SCHEMA)],
+        schema=ARCHIVE_SCHEMA,
+    )
+
+
+def compact_closed_months(db: Session, today: Optional[date] = None, base: Optional[Path] = None) -> List[date]:
+    """
+    Arquiva todo mês já fechado (anterior ao mês atual) que ainda não tem
+    arquivo. Meses passados não mudam mais, então cada um é escrito uma vez.
+    Meses sem registros (ex.: o updater ficou parado) são pulados, sem
+    arquivo vazio.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    current_month = today.replace(day=1)
+
+    oldest = db.execute(select(func.min(PriceHistory.timestamp))).scalar()
+    if oldest is None:
+        return []
+
+    archived = []
+    month = oldest.date().replace(day=1)
+    while month < current_month:
+        if not month_path(month, base).exists() and archive_month(db, month, base):
+            archived.append(month)
+        month = add_months(month, 1)
+    return archived
+
+
+def run_compaction() -> List[date]:
+    """Job agendado: arquiva os meses fechados ainda sem arquivo."""
+    with SessionLocal() as db:
+        return compact_closed_months(db)
+
+
+def read_archive(
+    columns: Optional[List[str]] = None,
+    filters=None,
+    base: Optional[Path] = None,
+) -> pa.Table:
+    """
+    Lê o arquivo histórico como uma tabela Arrow com memory-map (sem copiar
+    para a memória o que não for usado). 'filters' segue o formato do pyarrow,
+    ex.: [("month", ">=", "2024-01"), ("source", "=", "eBay")]; a partição
+    'month' e as estatísticas dos row groups evitam ler arquivos/blocos inteiros.
+
+    O esquema é sempre o ARCHIVE_SCHEMA atual (mais a partição 'month'):
+    meses arquivados antes de uma coluna existir a trazem como nula, em vez
+    de o pyarrow adotar o esquema do primeiro arquivo e descartá-la.
+
+    Para análises: read_archive(...).to_pandas() ou pyarrow.compute direto.
+    """
+    path = base or archive_dir()
+    if not path.exists():
+        return ARCHIVE_SCHEMA.empty_table()
+    return pq.read_table(
+        path,
+        columns=columns,
+        filters=filters,
+        schema=ARCHIVE_SCHEMA.append(pa.field("month", pa.string())),
+        memory_map=True,
+        partitioning="hive",
+    )
@@ -0,0 +1,94 @@
+from datetime import datetime
+from typing import List, Dict, Any
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.models.product import PriceHistory, ScrapeRun
+
+
+def build_price_rows(
+    product_id: int,
+    items: List[Dict[str, Any]],
+    usd_rate: float,
+    timestamp: datetime,
+) -> List[Dict[str, Any]]:
+    """
+    Normaliza os itens retornados pelas lojas em linhas prontas para a tabela
+    'price_history' (coluna price sempre em BRL, price_usd sempre em USD e
+    price_original no valor e na moeda do anúncio, 'currency'). A cotação
+    não é repetida em cada linha: fica em 'exchange_rates'.
+    """
+    rows = []
+    for item in items:
+        raw_price = item.get("price")
+        raw_currency = item.get("currency")
+
+        if raw_price is None:
+            continue
+
+        # Preço original como veio da loja
+        original_price = float(raw_price)
+
+        if raw_currency == "USD":
+            # Veio do eBay → Salva USD original, calcula BRL
+            price_usd_to_save = original_price
+            price_brl_to_save = original_price * usd_rate
+        elif raw_currency and raw_currency != "BRL":
+            # eBay em outra moeda (EUR, GBP...) → USD já convertido pelo RateMatrix, calcula BRL
+            if item.get("price_usd") is None:
+                continue
+            price_usd_to_save = float(item["price_usd"])
+            price_brl_to_save = price_usd_to_save * usd_rate
+        else:
+            # Veio da Amazon BR → Salva BRL original, estima USD
+            price_brl_to_save = original_price
+            price_usd_to_save = round(original_price / usd_rate, 2) if usd_rate > 0 else None
+
+        rows.append({
+            "product_id": product_id,
+            "price": price_brl_to_save,           # Coluna price sempre em BRL para o frontend
+            "currency": raw_currency if raw_currency and raw_currency != "BRL" else "BRL",
+            "price_original": original_price,     # Sem perder o valor em EUR, GBP...
+            "price_usd": price_usd_to_save,       # Valor original se for dólar
+            "source": item.get("source", "Desconhecido"),
+            "link": item.get("link"),
+            "original_title": item.get("title"),
+            "seller_name": item.get("seller_username"),
+            "seller_rating": item.get("seller_rating"),
+            "timestamp": timestamp,
+        })
+    return rows
+
+
+def bulk_insert_price_history(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """
+    Grava todas as linhas de uma execução com um único INSERT em lote
+    (executemany; no Postgres vira INSERT ... VALUES multi-linha), sem criar
+    um objeto ORM por linha. O commit fica a cargo de quem chama, para que
+    a execução inteira caia numa única transação.
+    """
+    if not rows:
+        return 0
+    db.execute(insert(PriceHistory), rows)
+    return len(rows)
+
+
+def create_scrape_run(
+    db: Session,
+    started_at: datetime,
+    finished_at: datetime,
+    products_count: int,
+    items_count: int,
+) -> ScrapeRun:
+    """
+    Registra a execução já com todos os seus dados (uma única escrita por run)
+    e gera o id usado como run_id nas linhas de 'price_history'.
+    """
+    run = ScrapeRun(
+        started_at=started_at,
+        finished_at=finished_at,
+        products_count=products_count,
+        items_count=items_count,
+    )
+    db.add(run)
+    db.flush()
+    return run
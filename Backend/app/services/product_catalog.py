@@ -0,0 +1,79 @@
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from loguru import logger as log
+from app.db.upsert import insert_ignore_duplicates
+from app.models.product import Product
+from app.services.product_resolver import ProductResolver
+
+
+class ProductCatalog:
+    """
+    Cache em memória do catálogo de produtos (search_term -> product_id).
+    Carregado com uma única query no startup e no início de cada execução
+    do updater, evitando uma ida ao banco por termo em cada requisição.
+    """
+    _ids_by_term: Dict[str, int] = {}
+    _names_by_id: Dict[int, str] = {}
+
+    @staticmethod
+    def _key(term: str) -> str:
+        return term.strip().lower()
+
+    @classmethod
+    def _store(cls, product_id: int, name: Optional[str], search_term: str):
+        cls._ids_by_term[cls._key(search_term)] = product_id
+        cls._names_by_id[product_id] = name or search_term
+
+    @classmethod
+    def load(cls, db: Session) -> int:
+        """(Re)carrega todo o catálogo com uma única query."""
+        rows = db.execute(select(Product.id, Product.name, Product.search_term)).all()
+
+        # Monta os novos mapas e troca de uma vez (leitores nunca veem o cache vazio)
+        cls._ids_by_term = {cls._key(search_term): product_id for product_id, _, search_term in rows}
+        cls._names_by_id = {product_id: name or search_term for product_id, name, search_term in rows}
+        log.info(f"Catálogo de produtos carregado: {len(cls._ids_by_term)} produtos.")
+        return len(cls._ids_by_term)
+
+    @classmethod
+    def ensure(cls, db: Session, terms: List[str]) -> Dict[str, int]:
+        """
+        Garante que todos os termos existem na tabela 'products' e devolve o
+        mapa termo -> id. Os ausentes são criados com um upsert
+        (ON CONFLICT DO NOTHING), seguro mesmo com execuções concorrentes.
+        """
+        cls.load(db)
+
+        missing = [term for term in terms if cls.get_id(term) is None]
+        if missing:
+            insert_ignore_duplicates(
+                db,
+                Product,
+                [{"name": term, "search_term": term} for term in missing],
+                index_elements=["search_term"],
+            )
+            rows = db.execute(
+                select(Product.id, Product.name, Product.search_term)
+                .where(Product.search_term.in_(missing))
+            ).all()
+            for product_id, name, search_term in rows:
+                cls._store(product_id, name, search_term)
+            # Aliases normalizados dos produtos novos (usados pelo /history e /comparison)
+            ProductResolver.register(db, rows)
+
+        return {term: cls.get_id(term) for term in terms if cls.get_id(term) is not None}
+
+    @classmethod
+    def get_id(cls, term: str) -> Optional[int]:
+        """Busca apenas no cache (sem acesso ao banco)."""
+        return cls._ids_by_term.get(cls._key(term))
+
+    @classmethod
+    def get_name(cls, product_id: int) -> Optional[str]:
+        return cls._names_by_id.get(product_id)
+
+    @classmethod
+    def clear(cls):
+        cls._ids_by_term = {}
+        cls._names_by_id = {}
@@ -0,0 +1,164 @@
+import re
+import unicodedata
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from loguru import logger as log
+from app.db.upsert import insert_ignore_duplicates
+from app.models.product import Product, ProductAlias
+
+# (product_id, nome do produto)
+Resolution = Tuple[int, str]
+
+
+def normalize_key(value: str) -> str:
+    """
+    Chave normalizada de busca: minúsculas, sem acentos, só letras e números
+    separados por um espaço. "NVIDIA  RTX-5090 (32GB)" -> "nvidia rtx 5090 32gb"
+    """
+    value = unicodedata.normalize("NFKD", value)
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", value.lower()).split())
+
+
+class ProductResolver:
+    """
+    Resolve o texto digitado pelo usuário para um produto usando a tabela
+    'product_aliases' (chave normalizada única, com índice trigram no
+    Postgres) e um espelho em memória dela. Sem ILIKE com curinga à esquerda
+    sobre 'products': a busca exata é um lookup por chave e a busca parcial
+    usa o índice trigram (ou o espelho em memória) com desempate determinístico.
+    """
+    _ids_by_key: Dict[str, int] = {}
+    _names_by_id: Dict[int, str] = {}
+
+    @classmethod
+    def load(cls, db: Session) -> int:
+        """(Re)carrega o espelho em memória dos aliases com uma única query."""
+        rows = db.execute(
+            select(ProductAlias.normalized_key, ProductAlias.product_id, Product.name, Product.search_term)
+            .join(Product, Product.id == ProductAlias.product_id)
+        ).all()
+        cls._ids_by_key = {key: product_id for key, product_id, _, _ in rows}
+        cls._names_by_id = {product_id: name or search_term for _, product_id, name, search_term in rows}
+        return len(cls._ids_by_key)
+
+    @classmethod
+    def register(cls, db: Session, products: Iterable[Tuple[int, Optional[str], str]]) -> int:
+        """Cria os aliases padrão (nome e termo de busca) de cada (id, nome, termo) informado."""
+        rows = {}
+        for product_id, name, search_term in products:
+            for alias in (search_term, name):
+                key = normalize_key(alias or "")
+                if key and key not in rows:
+                    rows[key] = {"product_id": product_id, "alias": alias, "normalized_key": key}
+                    cls._ids_by_key.setdefault(key, product_id)
+            cls._names_by_id[product_id] = name or search_term
+
+        # Chave já usada por outro produto: mantém o dono atual (ON CONFLICT DO NOTHING)
+        insert_ignore_duplicates(db, ProductAlias, list(rows.values()), index_elements=["normalized_key"])
+        return len(rows)
+
+    @classmethod
+    def add_alias(cls, db: Session, product_id: int, alias: str) -> bool:
+        """Apelido extra para um produto (ex.: '5090' -> RTX 5090). False se a chave já existir."""
+        key = normalize_key(alias)
+        if not key or db.execute(select(ProductAlias.id).where(ProductAlias.normalized_key == key)).first():
+            return False
+        db.add(ProductAlias(product_id=product_id, alias=alias, normalized_key=key))
+        db.flush()
+        cls._ids_by_key[key] = product_id
+        return True
+
+    @classmethod
+    def sync(cls, db: Session) -> int:
+        """Garante os aliases padrão de todos os produtos (startup) e recarrega o espelho."""
+        products = db.execute(select(Product.id, Product.name, Product.search_term)).all()
+        cls.register(db, products)
+        cls.load(db)
+        log.info(f"Resolvedor de produtos carregado: {len(cls._ids_by_key)} aliases.")
+        return len(cls._ids_by_key)
+
+    @classmethod
+    def lookup(cls, query: str, partial: bool = False) -> Optional[Resolution]:
+        """Resolve só pela memória (sem acesso ao banco)."""
+        key = normalize_key(query)
+        if not key:
+            return None
+
+        product_id = cls._ids_by_key.get(key)
+        if product_id is None and partial:
+            # Menor chave que contém o texto (mais específica); empate pelo menor id
+            matches = [(len(alias_key), pid) for alias_key, pid in cls._ids_by_key.items() if key in alias_key]
+            product_id = min(matches)[1] if matches else None
+
+        if product_id is None:
+            return None
+        return product_id, cls._names_by_id.get(product_id, query)
+
+    @classmethod
+    def resolve(cls, db: Session, query: str, partial: bool = False) -> Optional[Resolution]:
+        """
+        Memória primeiro; em caso de miss (ex.: produto criado por outro worker),
+        consulta 'product_aliases' pela chave exata e, se 'partial', pela chave
+        que contém o texto (LIKE servido pelo índice trigram no Postgres).
+        """
+        found = cls.lookup(query, partial)
+        if found:
+            return found
+
+        key = normalize_key(query)
+        if not key:
+            return None
+
+        stmt = select(ProductAlias.product_id, Product.name, Product.search_term)\
+            .join(Product, Product.id == ProductAlias.product_id)
+        row = db.execute(stmt.where(ProductAlias.normalized_key == key)).first()
+        exact = row is not None
+        if row is None and partial:
+            row = db.execute(
+                stmt.where(ProductAlias.normalized_key.contains(key, autoescape=True))
+                .order_by(func.length(ProductAlias.normalized_key), ProductAlias.product_id)
+                .limit(1)
+            ).first()
+        if row is None:
+            # Produto ainda sem aliases: busca pelo termo exato (índice único de search_term)
+            row = db.execute(
+                select(Product.id, Product.name, Product.search_term).where(Product.search_term == query)
+            ).first()
+            if row is None:
+                return None
+            exact = True
+
+        product_id, name, search_term = row
+        # Só match exato vira chave: um parcial em cache responderia depois
+        # também às buscas exatas (partial=False) pelo mesmo texto
+        if exact:
+            cls._ids_by_key.setdefault(key, product_id)
+        cls._names_by_id[product_id] = name or search_term
+        return product_id, name or search_term
+
+    @classmethod
+    def clear(cls):
+        cls._ids_by_key = {}
+        cls._names_by_id = {}
+
+
+def ensure_trigram_index(engine: Engine):
+    """
+    No Postgres, cria a extensão pg_trgm e o índice GIN trigram em
+    'product_aliases.normalized_key' (acelera LIKE '%...%'). Sem permissão
+    para a extensão, a busca parcial continua funcionando sem o índice.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_product_aliases_key_trgm "
+                "ON product_aliases USING gin (normalized_key gin_trgm_ops)"
+            ))
+    except Exception as e:
+        log.warning(f"Índice trigram de 'product_aliases' não criado: {e}")
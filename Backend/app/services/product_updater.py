@@ -1,8 +1,18 @@
 import asyncio
+import inspect
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
-from app.models.product import Product, PriceHistory
+from app.core.config import settings
+from app.db.session import SessionLocal, AsyncSessionLocal
 from app.services import ebay_service, amazon_service
+from app.services.product_catalog import ProductCatalog
+from app.services.product_resolver import normalize_key
+from app.services.response_cache import ResponseCache
+from app.services.rollup_service import update_rollups
+from app.services.price_history_writer import build_price_rows, bulk_insert_price_history, create_scrape_run
+from app.services.offers_service import save_latest_offers
+from app.services.exchange_rate_history import record_rate
 from app.services.currency_service import CurrencyService 
 from loguru import logger as log
 
@@ -25,96 +35,225 @@ PRODUCTS_TO_MONITOR = [
     "Intel Arc A770 16GB",
 ]
 
+# Atualizações direcionadas em andamento (termo -> task), para coalescer requisições
+_inflight_refreshes: Dict[str, asyncio.Task] = {}
+
+def _source_fetchers() -> Dict[str, Tuple[Callable[[str], Any], int]]:
+    """
+    Fontes consultadas pelo updater e o limite de concorrência de cada uma.
+    Resolvido a cada execução para respeitar mocks/patches nos serviços.
+    """
+    return {
+        "ebay": (ebay_service.search_ebay_items_async, settings.UPDATER_EBAY_CONCURRENCY),
+        "amazon": (amazon_service.search_amazon_items_async, settings.UPDATER_AMAZON_CONCURRENCY),
+    }
+
+async def _fetch_source(
+    term: str,
+    source: str,
+    fetcher: Callable[[str], Any],
+    global_limit: asyncio.Semaphore,
+    source_limit: asyncio.Semaphore,
+) -> List[Dict[str, Any]]:
+    """
+    Executa UMA busca (produto, fonte) respeitando o limite global e o da fonte.
+    Buscas síncronas rodam em thread para não travar o event loop.
+    Erros são isolados: a falha de uma fonte não derruba as demais.
+    """
+    # Primeiro a vaga da fonte: quem espera por uma fonte saturada não segura
+    # uma vaga global que buscas de outras fontes poderiam usar
+    async with source_limit, global_limit:
+        try:
+            if inspect.iscoroutinefunction(fetcher):
+                results = await fetcher(term)
+            else:
+                results = await asyncio.to_thread(fetcher, term)
+                if inspect.isawaitable(results):
+                    results = await results
+            return results or []
+        except Exception as e:
+            log.error(f" -> {term} [{source}]: Falha na busca: {e}")
+            return []
+
+async def fetch_all_sources(terms: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Dispara em paralelo todas as buscas (produto x fonte) e devolve os
+    resultados combinados por termo, na ordem das fontes.
+    O tempo total tende ao da busca mais lenta, e não à soma de todas.
+    """
+    fetchers = _source_fetchers()
+    global_limit = asyncio.Semaphore(settings.UPDATER_MAX_CONCURRENCY)
+    source_limits = {
+        source: asyncio.Semaphore(limit) for source, (_, limit) in fetchers.items()
+    }
+
+    tasks = [
+        _fetch_source(term, source, fetcher, global_limit, source_limits[source])
+        for term in terms
+        for source, (fetcher, _) in fetchers.items()
+    ]
+    fetched = await asyncio.gather(*tasks)
+
+    results_by_term: Dict[str, List[Dict[str, Any]]] = {term: [] for term in terms}
+    for index, results in enumerate(fetched):
+        term = terms[index // len(fetchers)]
+        results_by_term[term].extend(results)
+    return results_by_term
+
 async def update_all_products():
     """Percorre a lista completa de GPUs, busca no eBay + Amazon e salva no banco."""
-    db: Session = SessionLocal()
-    
+    await update_products(PRODUCTS_TO_MONITOR)
+
+def _save_results(
+    db: Session,
+    terms: List[str],
+    results_by_term: Dict[str, List[Dict[str, Any]]],
+    usd_rate: float,
+    started_at: datetime,
+    live_rate: bool = True,
+) -> int:
+    """
+    Persiste os resultados de uma execução numa única transação.
+    Recebe uma Session síncrona: no modo assíncrono roda via AsyncSession.run_sync.
+    A cotação usada vai para 'exchange_rates' (uma linha por dia), não para cada
+    linha de preço; a de fallback (live_rate=False) não é registrada.
+    """
+    run_timestamp = datetime.now(timezone.utc)
+    rows_to_save = []
+    rows_by_product: Dict[int, List[Dict[str, Any]]] = {}
+
+    try:
+        # Garante que os produtos pais existem na tabela 'products' (uma query + upsert)
+        product_ids = ProductCatalog.ensure(db, terms)
+
+        for term in terms:
+            product_id = product_ids.get(term)
+            if product_id is None:
+                log.error(f" -> {term}: Produto não encontrado no catálogo.")
+                continue
+
+            all_results = results_by_term[term]
+            
+            # Verificação explícita se há resultados
+            if not all_results:
+                log.warning(f" -> {term}: Nenhum resultado encontrado.")
+                continue
+
+            term_rows = build_price_rows(product_id, all_results, usd_rate, run_timestamp)
+            rows_to_save.extend(term_rows)
+            rows_by_product[product_id] = term_rows
+            log.info(f" -> {term}: {len(term_rows)} novos preços coletados!")
+
+        # Registra a execução e associa todas as linhas a ela
+        run = create_scrape_run(db, started_at, run_timestamp, len(terms), len(rows_to_save))
+        for row in rows_to_save:
+            row["run_id"] = run.id
+
+        # Gravação em lote: um INSERT set-based e um único commit por execução
+        count_saved = bulk_insert_price_history(db, rows_to_save)
+
+        # Cotação usada, gravada antes dos agregados: eles leem a do dia da tabela 'exchange_rates'
+        if live_rate and rows_to_save:
+            record_rate(db, usd_rate, run_timestamp)
+
+        # Agregados por hora/dia (períodos longos do /history), atualizados incrementalmente
+        update_rollups(db, rows_to_save)
+
+        # Snapshot das últimas ofertas (lido pelo /comparison), na mesma transação
+        product_names = {product_id: ProductCatalog.get_name(product_id) for product_id in rows_by_product}
+        save_latest_offers(db, rows_by_product, product_names, usd_rate, run.id)
+        db.commit()
+
+        # Novos dados gravados: as respostas em cache das rotas ficam obsoletas
+        ResponseCache.bump_version()
+        return count_saved
+    except Exception:
+        db.rollback()
+        raise
+
+async def update_products(terms: List[str]) -> bool:
+    """
+    Busca no eBay + Amazon apenas os termos informados e salva no banco.
+    Erros são registrados sem derrubar o agendador; o retorno diz se a
+    gravação foi concluída.
+    """
+    started_at = datetime.now(timezone.utc)
+
     try:
-        log.info("--- Iniciando Atualização Massiva de Preços ---")
+        log.info(f"--- Iniciando Atualização de Preços ({len(terms)} produtos) ---")
         
         # Obtemos a cotação ATUAL do Dólar
+        live_rate = True
         try:
-            usd_rate = CurrencyService.get_usd_to_brl()
+            usd_rate = await CurrencyService.get_usd_to_brl_async()
             log.info(f"Taxa de conversão USD -> BRL obtida: {usd_rate}")
         except Exception as e:
             log.error(f"Erro ao obter cotação: {e}. Usando fallback de segurança 5.4")
             usd_rate = 5.4
+            live_rate = False
 
-        for term in PRODUCTS_TO_MONITOR:
-            log.info(f"Buscando: {term}...")
-            
-            count_saved = 0
-
-            # Garante que o produto pai existe na tabela 'products'
-            db_product = db.query(Product).filter(Product.search_term == term).first()
-            if not db_product:
-                db_product = Product(name=term, search_term=term)
-                db.add(db_product)
-                db.commit()
-                db.refresh(db_product)
-
-            # Busca (eBay + Amazon)
-            results_ebay = ebay_service.search_ebay_items(term)
-            results_amazon = amazon_service.search_amazon_items(term) 
-            
-            # Combina resultados
-            all_results = results_ebay + results_amazon
-            
-            # Verificação explícita se há resultados
-            if not all_results:
-                log.warning(f" -> {term}: Nenhum resultado encontrado.")
-                continue
+        # Busca (eBay + Amazon) de todos os produtos em paralelo
+        results_by_term = await fetch_all_sources(terms)
 
-            for item in all_results:
-                raw_price = item.get("price")
-                raw_currency = item.get("currency")
-
-                if raw_price is not None:
-                    # Preço original como veio da loja
-                    original_price = float(raw_price)
-
-                    # Variáveis que vamos preencher
-                    price_brl_to_save = 0.0
-                    price_usd_to_save = None
-                    exchange_rate_to_save = 1.0
-
-                    if raw_currency == "USD":
-                        # Veio do eBay → Salva USD original, calcula BRL
-                        price_usd_to_save = original_price                    
-                        price_brl_to_save = original_price * usd_rate   
-                        exchange_rate_to_save = usd_rate
-                    else:
-                        # Veio da Amazon BR → Salva BRL original, estima USD
-                        price_brl_to_save = original_price
-                        price_usd_to_save = round(original_price / usd_rate, 2) if usd_rate > 0 else None
-                        exchange_rate_to_save = usd_rate
-                    # --------------------------------------------
-                    currency_to_save = "USD" if raw_currency == "USD" else "BRL"
-
-                    history_entry = PriceHistory(
-                        product_id=db_product.id,
-                        price=price_brl_to_save,           # Coluna price sempre em BRL para o frontend
-                        currency=currency_to_save,                     
-                        price_usd=price_usd_to_save,       # Valor original se for dólar
-                        exchange_rate=exchange_rate_to_save,
-                        source=item.get("source", "Desconhecido"),
-                        link=item.get("link"),
-                        original_title=item.get("title"),
-                        seller_name=item.get("seller_username"),
-                        seller_rating=item.get("seller_rating"),
-                    )
-                    db.add(history_entry)
-                    count_saved += 1
-                
-            db.commit()
-            log.info(f" -> {term}: {count_saved} novos preços salvos!")
+        # A sessão só é aberta depois das buscas, para não segurar conexão durante o scraping
+        if settings.ASYNC_DB_ENABLED:
+            async with AsyncSessionLocal() as db:
+                count_saved = await db.run_sync(_save_results, terms, results_by_term, usd_rate, started_at, live_rate)
+        else:
+            db: Session = SessionLocal()
+            try:
+                count_saved = _save_results(db, terms, results_by_term, usd_rate, started_at, live_rate)
+            finally:
+                db.close()
+
+        log.info(f"--- {count_saved} preços salvos em lote ---")
+        # Avisa os outros workers (SQLite numa thread, fora do event loop)
+        await asyncio.to_thread(ResponseCache.publish_version)
+        return True
 
     except Exception as e:
         log.critical(f"Erro crítico no updater: {e}")
-        db.rollback()
+        return False
     finally:
-        db.close()
         log.info("--- Atualização Finalizada ---")
 
+async def refresh_product(term: str, timeout: Optional[float] = None) -> bool:
+    """
+    Atualização direcionada de UM produto monitorado (usada no cache miss do /comparison).
+    Requisições simultâneas para o mesmo termo compartilham a mesma busca em voo
+    (single-flight). Se o orçamento de tempo estourar, retorna False sem cancelar
+    a busca, que continua em segundo plano e grava quando terminar. Também
+    retorna False se a atualização falhar.
+    """
+    monitored = monitored_term(term)
+    if monitored is None:
+        log.warning(f"--- Refresh ignorado: '{term}' não é um produto monitorado ---")
+        return False
+    term = monitored
+
+    loop = asyncio.get_running_loop()
+    task = _inflight_refreshes.get(term)
+    if task is None or task.done() or task.get_loop() is not loop:
+        task = loop.create_task(update_products([term]))
+        _inflight_refreshes[term] = task
+        task.add_done_callback(lambda t: _forget_refresh(term, t))
+    else:
+        log.info(f"--- Refresh de '{term}' já em andamento, aguardando a mesma busca ---")
+
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        log.warning(f"--- Refresh de '{term}' excedeu {timeout}s; respondendo com os dados disponíveis ---")
+        return False
+
+def monitored_term(term: str) -> Optional[str]:
+    """Termo de PRODUCTS_TO_MONITOR que corresponde ao texto digitado, com a mesma normalização do resolver."""
+    key = normalize_key(term)
+    return next((monitored for monitored in PRODUCTS_TO_MONITOR if normalize_key(monitored) == key), None)
+
+def _forget_refresh(term: str, task: asyncio.Task):
+    if _inflight_refreshes.get(term) is task:
+        del _inflight_refreshes[term]
+
 if __name__ == "__main__":
     asyncio.run(update_all_products())
\ No newline at end of file
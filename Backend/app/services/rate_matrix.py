@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+import requests
+from loguru import logger as log
+from app.services.shared_cache import SharedCache
+
+FRANKFURTER_LATEST_URL = "https://api.frankfurter.app/latest"
+RATES_TIMEOUT = 5
+# Chave das cotações (base USD) no cache compartilhado entre workers
+SHARED_MATRIX_KEY = "rate_matrix"
+
+# (moedas, índice por moeda, matriz, momento da cotação)
+RatesState = Tuple[List[str], Dict[str, int], np.ndarray, float]
+_EMPTY_STATE: RatesState = (["USD"], {"USD": 0}, np.ones((1, 1)), 0.0)
+
+
+class RateMatrix:
+    """
+    Cotações cruzadas entre várias moedas numa matriz densa:
+    matrix[i, j] = quanto vale 1 unidade de currencies[i] em currencies[j].
+    Todas as moedas são buscadas numa única chamada (base USD) e a conversão
+    de um lote inteiro, com moedas misturadas, é uma operação vetorizada.
+    O estado é uma tupla trocada numa única atribuição: leitores em outras
+    threads veem a matriz antiga ou a nova inteira, nunca uma mistura.
+    """
+    _state: RatesState = _EMPTY_STATE
+    _CACHE_TTL = 3600
+    _lock = threading.Lock()
+
+    @classmethod
+    def ensure(cls, currencies: Iterable[str]) -> bool:
+        """
+        Garante cotações em cache para as moedas pedidas (uma chamada para o
+        conjunto todo, só quando falta moeda ou o cache venceu).
+        """
+        wanted = {c for c in currencies if c}
+        if cls._covers(wanted):
+            return True
+        with cls._lock:
+            if cls._covers(wanted):
+                return True
+            # Outro worker pode já ter buscado estas moedas
+            shared = SharedCache.get(SHARED_MATRIX_KEY)
+            if shared and time.time() - shared[1] < cls._CACHE_TTL and shared[1] > cls._state[3]:
+                cls.load(shared[0], updated_at=shared[1])
+                if cls._covers(wanted):
+                    return True
+            currencies, _, _, last_update = cls._state
+            known = set(currencies) if time.time() - last_update < cls._CACHE_TTL else set()
+            try:
+                cls._refresh(sorted((known | wanted) - {"USD"}))
+            except Exception as e:
+                log.warning(f"Falha ao buscar cotações de {sorted(wanted)}: {e}")
+                return False
+            return cls._covers(wanted)
+
+    @classmethod
+    async def ensure_async(cls, currencies: Iterable[str]) -> bool:
+        """Como ensure, com a chamada HTTP fora do event loop (e sem custo quando o cache cobre)."""
+        wanted = {c for c in currencies if c}
+        if cls._covers(wanted):
+            return True
+        return await asyncio.to_thread(cls.ensure, wanted)
+
+    @classmethod
+    def _covers(cls, currencies: set) -> bool:
+        _, index, _, last_update = cls._state
+        fresh = currencies <= {"USD"} or time.time() - last_update < cls._CACHE_TTL
+        return fresh and all(c in index for c in currencies)
+
+    @classmethod
+    def _refresh(cls, quotes: Sequence[str]):
+        resp = requests.get(
+            FRANKFURTER_LATEST_URL,
+            params={"from": "USD", "to": ",".join(quotes)},
+            timeout=RATES_TIMEOUT,
+        )
+        resp.raise_for_status()
+        usd_rates = resp.json()["rates"]  # 1 USD = usd_rates[X] unidades de X
+        usd_rates = {"USD": 1.0, **{code: float(rate) for code, rate in usd_rates.items()}}
+        cls.load(usd_rates)
+        SharedCache.set(SHARED_MATRIX_KEY, usd_rates, cls._state[3])
+        log.info(f"Matriz de cotações atualizada: {len(usd_rates)} moedas.")
+
+    @classmethod
+    def load(cls, usd_rates: Dict[str, float], updated_at: Optional[float] = None):
+        """Monta a matriz a partir das cotações com base USD (1 USD = rate unidades da moeda)."""
+        currencies = sorted(usd_rates)
+        per_usd = np.array([usd_rates[c] for c in currencies], dtype=np.float64)
+        to_usd = 1.0 / per_usd
+        # 1 unidade de i = to_usd[i] USD = to_usd[i] / to_usd[j] unidades de j
+        matrix = to_usd[:, None] / to_usd[None, :]
+        index = {code: i for i, code in enumerate(currencies)}
+        cls._state = (currencies, index, matrix, updated_at if updated_at is not None else time.time())
+
+    @classmethod
+    def convert(cls, amounts: Sequence[float], currencies: Sequence[str], target: str) -> np.ndarray:
+        """
+        Converte um lote de valores (cada um na sua moeda) para 'target' numa
+        operação vetorizada. Moeda sem cotação conhecida resulta em NaN.
+        """
+        _, index, matrix, _ = cls._state
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if target not in index:
+            return np.full(len(amounts), np.nan)
+        rows = np.array([index.get(c, -1) for c in currencies], dtype=np.int64)
+        rates = np.where(rows >= 0, matrix[np.maximum(rows, 0), index[target]], np.nan)
+        return amounts * rates
+
+    @classmethod
+    def clear(cls):
+        cls._state = _EMPTY_STATE
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+from loguru import logger as log
+from app.core.config import settings
+from app.services.shared_cache import SharedCache
+
+# Chave, no cache compartilhado, do instante da última gravação de dados
+SHARED_VERSION_KEY = "response_cache_version"
+
+
+class ResponseCache:
+    """
+    Cache em memória (LRU) das respostas JÁ SERIALIZADAS (bytes JSON) das rotas
+    de produtos. A chave inclui a versão dos dados, incrementada pelo updater a
+    cada commit: uma nova execução invalida tudo de uma vez, sem TTL.
+
+    O cache é de cada processo, mas a invalidação vale para todos os workers
+    do host: depois de bump_version, quem gravou chama publish_version, que
+    grava o instante da gravação no SharedCache; cada worker consulta esse
+    instante a cada _SYNC_INTERVAL segundos numa task de fundo
+    (watch_shared_version) e descarta suas respostas quando ele avança.
+    Leitura e escrita do SQLite nunca rodam no event loop: get/set/data_version
+    só tocam a memória. Sem cache compartilhado (ou entre hosts diferentes),
+    cada processo só vê as próprias gravações.
+    """
+    _entries: "OrderedDict[Tuple[int, Hashable], bytes]" = OrderedDict()
+    _data_version: int = 0
+    _lock = threading.Lock()
+    _SYNC_INTERVAL = 1.0
+    _shared_seen = 0.0   # Última gravação (epoch) já refletida neste processo
+
+    @classmethod
+    def data_version(cls) -> int:
+        return cls._data_version
+
+    @classmethod
+    def bump_version(cls) -> int:
+        """
+        Chamado após gravar novos preços: descarta as respostas da versão
+        anterior (só memória; publish_version avisa os outros workers).
+        """
+        with cls._lock:
+            cls._shared_seen = max(cls._shared_seen, time.time())
+            return cls._invalidate()
+
+    @classmethod
+    def publish_version(cls) -> bool:
+        """
+        Grava no cache compartilhado o instante da última invalidação local.
+        I/O síncrono em SQLite: chamar numa thread (asyncio.to_thread) ou
+        num job que já rode fora do event loop.
+        """
+        written_at = cls._shared_seen
+        return SharedCache.set(SHARED_VERSION_KEY, {"written_at": written_at}, written_at)
+
+    @classmethod
+    def _invalidate(cls) -> int:
+        cls._data_version += 1
+        cls._entries.clear()
+        log.info(f"Cache de respostas invalidado (versão {cls._data_version}).")
+        return cls._data_version
+
+    @classmethod
+    def poll_shared_version(cls) -> bool:
+        """
+        Aplica gravações feitas por outros workers. I/O síncrono em SQLite,
+        como publish_version; True se as respostas em cache foram descartadas.
+        """
+        entry = SharedCache.get(SHARED_VERSION_KEY)
+        with cls._lock:
+            if entry and entry[1] > cls._shared_seen:
+                cls._shared_seen = entry[1]
+                cls._invalidate()
+                return True
+        return False
+
+    @classmethod
+    async def watch_shared_version(cls):
+        """Task de fundo (iniciada no startup): consulta a versão compartilhada numa thread."""
+        if not SharedCache.enabled():
+            return
+        while True:
+            try:
+                await asyncio.to_thread(cls.poll_shared_version)
+            except Exception as e:
+                log.warning(f"Falha ao consultar a versão compartilhada do cache de respostas: {e}")
+            await asyncio.sleep(cls._SYNC_INTERVAL)
+
+    @classmethod
+    def get(cls, key: Hashable) -> Optional[bytes]:
+        with cls._lock:
+            full_key = (cls._data_version, key)
+            body = cls._entries.get(full_key)
+            if body is not None:
+                cls._entries.move_to_end(full_key)
+            return body
+
+    @classmethod
+    def set(cls, key: Hashable, body: bytes, version: int):
+        """
+        Guarda a resposta calculada com os dados da 'version' informada (lida
+        ANTES da consulta). Se o updater gravou no meio tempo, ela é descartada.
+        """
+        with cls._lock:
+            if version != cls._data_version:
+                return
+            cls._entries[(version, key)] = body
+            cls._entries.move_to_end((version, key))
+            while len(cls._entries) > settings.RESPONSE_CACHE_MAX_ENTRIES:
+                cls._entries.popitem(last=False)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._entries.clear()
+            cls._shared_seen = 0.0
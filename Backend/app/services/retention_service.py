@@ -0,0 +1,90 @@
+from datetime import date, datetime, timezone
+from typing import Dict, Optional
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+from loguru import logger as log
+from app.core.config import settings
+from app.db import partitioning
+from app.db.session import SessionLocal
+from app.models.product import PriceHistory, PriceHistoryDaily, PriceHistoryHourly
+from app.services.response_cache import ResponseCache
+from app.services.rollup_service import backfill_rollups, missing_rollups
+
+
+def retention_cutoff(today: Optional[date] = None) -> Optional[datetime]:
+    """
+    Início do período de dados brutos mantidos: primeiro dia do mês de N meses
+    atrás (alinhado às partições mensais). None quando a retenção está desligada.
+    """
+    months = settings.PRICE_HISTORY_RETENTION_MONTHS
+    if months <= 0:
+        return None
+    today = today or datetime.now(timezone.utc).date()
+    first_month = partitioning.add_months(today.replace(day=1), -months)
+    return datetime(first_month.year, first_month.month, 1)
+
+
+def apply_retention(db: Session, today: Optional[date] = None) -> Dict[str, int]:
+    """
+    Política de retenção de 'price_history': garante o agregado diário dos
+    registros brutos mais antigos que o corte (dias que o updater ainda não
+    agregou, ex.: dados legados) e então os remove, junto com os agregados
+    por hora desse período. Com particionamento, as partições mensais
+    inteiras são descartadas (DROP); o que sobrar antes do corte (ex.:
+    partição DEFAULT) sai com DELETE.
+    """
+    cutoff = retention_cutoff(today)
+    if cutoff is None:
+        return {"rolled_up_days": 0, "dropped_partitions": 0, "deleted_rows": 0}
+
+    try:
+        # O corte cai no início de um dia: cada dia antigo é agregado por completo
+        rolled_up = backfill_rollups(db, PriceHistoryDaily, before=cutoff)
+
+        # Só apaga se todo dia antigo já estiver no agregado diário
+        missing = missing_rollups(db, PriceHistoryDaily, before=cutoff)
+        if missing:
+            # Mantém o que o backfill agregou; nada é apagado
+            db.commit()
+            log.error(
+                f"Retenção cancelada: {missing} dias anteriores a {cutoff.date()} "
+                "sem agregado diário. Nenhum registro foi apagado."
+            )
+            return {"rolled_up_days": rolled_up, "dropped_partitions": 0, "deleted_rows": 0}
+
+        dropped = 0
+        conn = db.connection()
+        if partitioning.is_partitioned(conn):
+            for name, month in partitioning.list_partitions(conn):
+                if partitioning.add_months(month, 1) <= cutoff.date():
+                    partitioning.drop_partition(conn, name)
+                    dropped += 1
+
+        deleted = db.execute(delete(PriceHistory).where(PriceHistory.timestamp < cutoff)).rowcount or 0
+        db.execute(delete(PriceHistoryHourly).where(PriceHistoryHourly.hour < cutoff))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if rolled_up or dropped or deleted:
+        # Pontos antigos do /history passam a vir do agregado diário
+        ResponseCache.bump_version()
+        # Job já roda numa thread (run_retention via to_thread): pode gravar direto
+        ResponseCache.publish_version()
+    log.info(
+        f"Retenção aplicada (corte {cutoff.date()}): {rolled_up} agregados diários, "
+        f"{dropped} partições removidas, {deleted} registros apagados."
+    )
+    return {"rolled_up_days": rolled_up, "dropped_partitions": dropped, "deleted_rows": deleted}
+
+
+def run_retention():
+    """Manutenção diária: garante as próximas partições e aplica a retenção."""
+    today = datetime.now(timezone.utc).date()
+    with SessionLocal() as db:
+        conn = db.connection()
+        if partitioning.is_partitioned(conn):
+            partitioning.ensure_partitions(conn, today)
+            db.commit()
+        return apply_retention(db, today)
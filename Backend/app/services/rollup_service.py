@@ -0,0 +1,287 @@
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, List, Mapping, Optional
+from sqlalchemy import Date, DateTime, and_, case, func, or_, select, update
+from sqlalchemy.orm import Session
+from loguru import logger as log
+from app.db.session import SessionLocal
+from app.db.upsert import dialect_insert, insert_ignore_duplicates
+from app.models.exchange_rate import ExchangeRate
+from app.models.product import PriceHistory, PriceHistoryDaily, PriceHistoryHourly
+
+# Tabela de agregado -> coluna do bucket
+ROLLUP_BUCKETS = {
+    PriceHistoryHourly: "hour",
+    PriceHistoryDaily: "day",
+}
+
+
+def _utc_naive(ts: datetime) -> datetime:
+    """Timestamps são gravados em UTC sem fuso nas colunas DateTime."""
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def hour_bucket(ts: datetime) -> datetime:
+    return _utc_naive(ts).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(ts: datetime) -> date:
+    return _utc_naive(ts).date()
+
+
+def build_rollup_rows(
+    rows: List[Mapping[str, Any]],
+    bucket_column: str,
+    bucket_fn: Callable[[datetime], Any],
+) -> List[Dict[str, Any]]:
+    """
+    Agrega as linhas de 'price_history' de uma execução por produto, fonte e
+    bucket, no formato das tabelas de agregado (min/max/soma/contagem e
+    primeiro/último preço).
+    """
+    rollups: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        timestamp = _utc_naive(row["timestamp"])
+        source = row.get("source") or "Desconhecido"
+        key = (row["product_id"], source, bucket_fn(timestamp))
+        price, price_usd, rate = row["price"], row.get("price_usd"), row.get("exchange_rate")
+
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollups[key] = {
+                "product_id": key[0],
+                "source": source,
+                bucket_column: key[2],
+                "min_price": price,
+                "max_price": price,
+                "sum_price": price,
+                "price_count": 1,
+                "min_price_usd": price_usd,
+                "max_price_usd": price_usd,
+                "sum_price_usd": price_usd,
+                "price_usd_count": 1 if price_usd is not None else 0,
+                "exchange_rate": rate,
+                "first_price": price,
+                "first_at": timestamp,
+                "last_price": price,
+                "last_at": timestamp,
+                "_rate_sum": rate or 0.0,
+                "_rate_count": 1 if rate is not None else 0,
+            }
+            continue
+
+        rollup["min_price"] = min(rollup["min_price"], price)
+        rollup["max_price"] = max(rollup["max_price"], price)
+        rollup["sum_price"] += price
+        rollup["price_count"] += 1
+        if price_usd is not None:
+            rollup["min_price_usd"] = price_usd if rollup["min_price_usd"] is None else min(rollup["min_price_usd"], price_usd)
+            rollup["max_price_usd"] = price_usd if rollup["max_price_usd"] is None else max(rollup["max_price_usd"], price_usd)
+            rollup["sum_price_usd"] = (rollup["sum_price_usd"] or 0.0) + price_usd
+            rollup["price_usd_count"] += 1
+        if rate is not None:
+            rollup["_rate_sum"] += rate
+            rollup["_rate_count"] += 1
+        if timestamp < rollup["first_at"]:
+            rollup["first_price"], rollup["first_at"] = price, timestamp
+        if timestamp >= rollup["last_at"]:
+            rollup["last_price"], rollup["last_at"] = price, timestamp
+
+    result = []
+    for rollup in rollups.values():
+        rate_sum, rate_count = rollup.pop("_rate_sum"), rollup.pop("_rate_count")
+        rollup["exchange_rate"] = rate_sum / rate_count if rate_count else None
+        result.append(rollup)
+    return result
+
+
+def _lowest(current, new):
+    return case((or_(current.is_(None), new < current), new), else_=current)
+
+
+def _highest(current, new):
+    return case((or_(current.is_(None), new > current), new), else_=current)
+
+
+def merge_rollups(db: Session, model, rows: List[Dict[str, Any]]):
+    """
+    Soma os agregados de uma execução aos já existentes com um único
+    INSERT ... ON CONFLICT DO UPDATE: a combinação é feita pelo banco, então
+    execuções concorrentes (ex.: refresh de um produto) não perdem dados.
+    """
+    if not rows:
+        return
+    stmt = dialect_insert(db, model)
+    if not hasattr(stmt, "on_conflict_do_update"):
+        log.warning(f"Banco sem ON CONFLICT: agregados de '{model.__tablename__}' não atualizados.")
+        return
+
+    current, new = model.__table__.c, stmt.excluded
+    total_count = current.price_count + new.price_count
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["product_id", "source", ROLLUP_BUCKETS[model]],
+        set_={
+            "min_price": _lowest(current.min_price, new.min_price),
+            "max_price": _highest(current.max_price, new.max_price),
+            "sum_price": current.sum_price + new.sum_price,
+            "price_count": total_count,
+            "min_price_usd": _lowest(current.min_price_usd, new.min_price_usd),
+            "max_price_usd": _highest(current.max_price_usd, new.max_price_usd),
+            "sum_price_usd": func.coalesce(current.sum_price_usd, 0.0) + func.coalesce(new.sum_price_usd, 0.0),
+            "price_usd_count": current.price_usd_count + new.price_usd_count,
+            # Média da cotação ponderada pela quantidade de preços de cada lado
+            "exchange_rate": (
+                func.coalesce(current.exchange_rate, new.exchange_rate) * current.price_count
+                + func.coalesce(new.exchange_rate, current.exchange_rate) * new.price_count
+            ) / total_count,
+            "first_price": case(
+                (or_(current.first_at.is_(None), new.first_at < current.first_at), new.first_price),
+                else_=current.first_price,
+            ),
+            "first_at": _lowest(current.first_at, new.first_at),
+            "last_price": case(
+                (or_(current.last_at.is_(None), new.last_at >= current.last_at), new.last_price),
+                else_=current.last_price,
+            ),
+            "last_at": _highest(current.last_at, new.last_at),
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def update_rollups(db: Session, rows: List[Mapping[str, Any]]) -> int:
+    """Chamado pelo updater na mesma transação dos preços: atualiza os agregados por hora e por dia."""
+    hourly = build_rollup_rows(rows, "hour", hour_bucket)
+    daily = build_rollup_rows(rows, "day", day_bucket)
+    merge_rollups(db, PriceHistoryHourly, hourly)
+    merge_rollups(db, PriceHistoryDaily, daily)
+    if hourly:
+        fill_rollup_exchange_rates(db, PriceHistoryHourly, since=min(row["hour"] for row in hourly))
+    if daily:
+        fill_rollup_exchange_rates(db, PriceHistoryDaily, since=min(row["day"] for row in daily))
+    return len(hourly) + len(daily)
+
+
+def fill_rollup_exchange_rates(db: Session, model, since=None, pair=("USD", "BRL")):
+    """
+    As linhas de preço não carregam mais a cotação (ela fica em
+    'exchange_rates'): buckets sem cotação recebem a vigente no seu dia,
+    com um único UPDATE correlacionado. Buckets com cotação gravada
+    (histórico legado) não são alterados.
+    """
+    key = getattr(model, ROLLUP_BUCKETS[model])
+    bucket_day = key if model is PriceHistoryDaily else func.date(key, type_=Date)
+    rate = (
+        select(ExchangeRate.rate)
+        .where(ExchangeRate.base == pair[0], ExchangeRate.quote == pair[1], ExchangeRate.day <= bucket_day)
+        .order_by(ExchangeRate.day.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    stmt = update(model).where(model.exchange_rate.is_(None)).values(exchange_rate=rate)
+    if since is not None:
+        stmt = stmt.where(key >= since)
+    db.execute(stmt)
+
+
+def _bucket_expression(db: Session, model):
+    timestamp = PriceHistory.timestamp
+    if model is PriceHistoryDaily:
+        return func.date(timestamp, type_=Date)
+    if db.get_bind().dialect.name == "sqlite":
+        return func.strftime("%Y-%m-%d %H:00:00", timestamp, type_=DateTime)
+    return func.date_trunc("hour", timestamp, type_=DateTime)
+
+
+def backfill_rollups(
+    db: Session,
+    model,
+    since: Optional[datetime] = None,
+    before: Optional[datetime] = None,
+) -> int:
+    """
+    Reconstrói agregados a partir dos registros brutos (dados anteriores aos
+    agregados incrementais). Buckets que já existem não são alterados
+    (ON CONFLICT DO NOTHING); primeiro/último preço ficam nulos.
+    """
+    bucket = _bucket_expression(db, model)
+    source = func.coalesce(PriceHistory.source, "Desconhecido")
+    stmt = (
+        select(
+            PriceHistory.product_id,
+            source.label("source"),
+            bucket.label(ROLLUP_BUCKETS[model]),
+            func.min(PriceHistory.price).label("min_price"),
+            func.max(PriceHistory.price).label("max_price"),
+            func.sum(PriceHistory.price).label("sum_price"),
+            func.count(PriceHistory.price).label("price_count"),
+            func.min(PriceHistory.price_usd).label("min_price_usd"),
+            func.max(PriceHistory.price_usd).label("max_price_usd"),
+            func.sum(PriceHistory.price_usd).label("sum_price_usd"),
+            func.count(PriceHistory.price_usd).label("price_usd_count"),
+            func.avg(PriceHistory.exchange_rate).label("exchange_rate"),
+        )
+        .where(PriceHistory.product_id.is_not(None))
+        .group_by(PriceHistory.product_id, source, bucket)
+    )
+    if since is not None:
+        stmt = stmt.where(PriceHistory.timestamp >= since)
+    if before is not None:
+        stmt = stmt.where(PriceHistory.timestamp < before)
+
+    rows = [dict(row) for row in db.execute(stmt).mappings()]
+    insert_ignore_duplicates(db, model, rows, index_elements=["product_id", "source", ROLLUP_BUCKETS[model]])
+    fill_rollup_exchange_rates(db, model)
+    return len(rows)
+
+
+def backfill_empty_rollups(db: Session) -> Dict[str, int]:
+    """
+    Chamado no startup: com algum agregado vazio (banco anterior a eles, ou
+    tabela recém-criada), reconstrói os dois a partir dos registros brutos,
+    para o /history de períodos longos não começar vazio. Buckets já
+    existentes (ex.: diários gerados pela retenção) são mantidos. Com os
+    agregados populados, custa só duas consultas LIMIT 1.
+    """
+    if all(db.execute(select(model.product_id).limit(1)).first() is not None for model in ROLLUP_BUCKETS):
+        return {}
+    counts = {model.__tablename__: backfill_rollups(db, model) for model in ROLLUP_BUCKETS}
+    log.info(f"Agregados vazios reconstruídos dos registros brutos: {counts}")
+    return counts
+
+
+def missing_rollups(db: Session, model, before: Optional[datetime] = None) -> int:
+    """
+    Quantos buckets (produto, fonte, bucket) dos registros brutos ainda não
+    têm linha no agregado. Zero significa que apagar os brutos não perde dados.
+    """
+    bucket = _bucket_expression(db, model)
+    source = func.coalesce(PriceHistory.source, "Desconhecido")
+    groups = select(
+        PriceHistory.product_id,
+        source.label("source"),
+        bucket.label("bucket"),
+    ).where(PriceHistory.product_id.is_not(None))
+    if before is not None:
+        groups = groups.where(PriceHistory.timestamp < before)
+    groups = groups.group_by(PriceHistory.product_id, source, bucket).subquery()
+
+    key = getattr(model, ROLLUP_BUCKETS[model])
+    stmt = (
+        select(func.count())
+        .select_from(groups.outerjoin(model, and_(
+            model.product_id == groups.c.product_id,
+            model.source == groups.c.source,
+            key == groups.c.bucket,
+        )))
+        .where(model.product_id.is_(None))
+    )
+    return db.execute(stmt).scalar() or 0
+
+
+if __name__ == "__main__":
+    # Reconstrução única dos agregados para dados gravados antes deles existirem
+    with SessionLocal() as db:
+        hourly = backfill_rollups(db, PriceHistoryHourly)
+        daily = backfill_rollups(db, PriceHistoryDaily)
+        db.commit()
+    log.info(f"Agregados reconstruídos: {hourly} por hora, {daily} por dia.")
@@ -0,0 +1,86 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Optional, Tuple
+from loguru import logger as log
+from app.core.config import settings
+
+
+class SharedCache:
+    """
+    Chave-valor em SQLite (modo WAL) compartilhado por todos os workers do
+    host e persistido entre reinícios: uma atualização feita por um processo
+    vale para os outros, e o primeiro acesso após um deploy não precisa ir
+    às APIs externas. Cada escrita é uma transação (atômica); leitores nunca
+    veem valor pela metade. Falhas do arquivo viram "miss", nunca erro.
+    """
+    _path: Optional[str] = settings.SHARED_CACHE_PATH or None
+    _initialized = False
+
+    @classmethod
+    def configure(cls, path: Optional[str]):
+        """Troca o arquivo (None desativa o cache compartilhado)."""
+        cls._path = path or None
+        cls._initialized = False
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return cls._path is not None
+
+    @classmethod
+    def _connect(cls) -> sqlite3.Connection:
+        if not cls._initialized:
+            # Diretório do arquivo pode não existir ainda (ex.: 'data/' numa imagem nova)
+            Path(cls._path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(cls._path, timeout=5, isolation_level=None)
+        if not cls._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            cls._initialized = True
+        return conn
+
+    @classmethod
+    def get(cls, key: str) -> Optional[Tuple[Any, float]]:
+        """(valor, updated_at em epoch) ou None."""
+        if not cls.enabled():
+            return None
+        try:
+            conn = cls._connect()
+            try:
+                row = conn.execute("SELECT value, updated_at FROM shared_cache WHERE key = ?", (key,)).fetchone()
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError) as e:
+            log.warning(f"Cache compartilhado indisponível ({key}): {e}")
+            return None
+        return (json.loads(row[0]), row[1]) if row else None
+
+    @classmethod
+    def set(cls, key: str, value: Any, updated_at: Optional[float] = None) -> bool:
+        """
+        Grava o valor se ele for mais novo que o atual (um worker com dado
+        antigo não sobrescreve a atualização de outro). False se o cache
+        estiver desativado ou a gravação falhar.
+        """
+        if not cls.enabled():
+            return False
+        updated_at = updated_at if updated_at is not None else time.time()
+        try:
+            conn = cls._connect()
+            try:
+                conn.execute(
+                    "INSERT INTO shared_cache (key, value, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at "
+                    "WHERE excluded.updated_at >= shared_cache.updated_at",
+                    (key, json.dumps(value), updated_at),
+                )
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError) as e:
+            log.warning(f"Falha ao gravar no cache compartilhado ({key}): {e}")
+            return False
+        return True
@@ -0,0 +1,116 @@
+"""
+Benchmark do caminho de leitura das rotas quentes (/comparison e /history).
+
+Compara, num SQLite em memória, o caminho antigo (objetos PriceHistory
+completos do ORM, copiados para dicts e depois para modelos Pydantic um a
+um) com o caminho enxuto (select Core só das colunas usadas, linhas do
+SQLAlchemy com __slots__ e validação/serialização numa chamada só).
+
+Uso (a partir da pasta Backend):
+    python -m benchmarks.benchmark_read_path
+"""
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+load_dotenv(".env.test")
+
+from sqlalchemy import create_engine, select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.db.base_class import Base  # noqa: E402
+from app.models.product import PriceHistory, Product, ScrapeRun  # noqa: E402
+from app.schemas.product import PriceHistoryPoint, PriceHistoryResponse  # noqa: E402
+from app.services.offers_service import OFFER_COLUMNS, build_offers  # noqa: E402
+
+ROW_COUNTS = [1_000, 10_000, 50_000]
+REPEAT = 5
+USD_RATE = 5.5
+
+
+def _seed(db: Session, rows: int) -> int:
+    product = Product(name="RTX 5090", search_term="rtx 5090")
+    run = ScrapeRun(started_at=datetime(2024, 1, 1), products_count=1, items_count=rows)
+    db.add_all([product, run])
+    db.flush()
+    start = datetime(2024, 1, 1)
+    db.execute(PriceHistory.__table__.insert(), [
+        {
+            "product_id": product.id, "run_id": run.id, "timestamp": start + timedelta(seconds=i),
+            "price": 2000.0 + i % 500, "price_usd": None, "currency": "USD", "source": "eBay",
+            "exchange_rate": USD_RATE, "original_title": f"NVIDIA GeForce RTX 5090 32GB #{i}",
+            "seller_name": "seller", "seller_rating": 99.5, "link": f"https://www.ebay.com/itm/{i}",
+        }
+        for i in range(rows)
+    ])
+    db.commit()
+    return product.id
+
+
+def _as_mapping(entry: PriceHistory) -> dict:
+    return {column.key: getattr(entry, column.key) for column in OFFER_COLUMNS}
+
+
+def _offers_orm(db: Session, product_id: int):
+    entries = db.query(PriceHistory).filter(PriceHistory.product_id == product_id).all()
+    return build_offers([_as_mapping(e) for e in entries], "RTX 5090", USD_RATE)
+
+
+def _offers_core(db: Session, product_id: int):
+    rows = db.execute(select(*OFFER_COLUMNS).where(PriceHistory.product_id == product_id)).mappings().all()
+    return build_offers(rows, "RTX 5090", USD_RATE)
+
+
+def _points(rows: int) -> list:
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "date": (start + timedelta(minutes=i)).isoformat(), "source": "eBay",
+            "price_brl": 2000.0 + i % 500, "price_brl_avg": 2100.0, "price_brl_max": 2200.0,
+            "price_usd": 360.0, "price_usd_avg": 380.0, "price_usd_max": 400.0, "exchange_rate": USD_RATE,
+        }
+        for i in range(rows)
+    ]
+
+
+def _history_per_point(points: list) -> bytes:
+    history = [PriceHistoryPoint(**point) for point in points]
+    return PriceHistoryResponse(product_name="RTX 5090", history=history).model_dump_json().encode()
+
+
+def _history_single_call(points: list) -> bytes:
+    return PriceHistoryResponse.model_validate(
+        {"product_name": "RTX 5090", "history": points}
+    ).model_dump_json().encode()
+
+
+def _best_of(fn, *args) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    print(f"{'linhas':>7} | {'ofertas ORM (ms)':>16} | {'ofertas Core (ms)':>17} | "
+          f"{'histórico por ponto (ms)':>24} | {'histórico 1 chamada (ms)':>24}")
+    for rows in ROW_COUNTS:
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with Session(engine) as db:
+            product_id = _seed(db, rows)
+            # expunge_all a cada rodada: sem isso o ORM reaproveitaria o identity map
+            orm = _best_of(lambda: (_offers_orm(db, product_id), db.expunge_all()))
+            core = _best_of(_offers_core, db, product_id)
+        engine.dispose()
+
+        points = _points(rows)
+        per_point = _best_of(_history_per_point, points)
+        single = _best_of(_history_single_call, points)
+        print(f"{rows:>7} | {orm:>16.1f} | {core:>17.1f} | {per_point:>24.1f} | {single:>24.1f}")
+
+
+if __name__ == "__main__":
+    main()
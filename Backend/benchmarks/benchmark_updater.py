@@ -0,0 +1,58 @@
+"""
+Benchmark do fan-out concorrente do updater.
+
+Simula buscas no eBay e na Amazon com latência fixa e mede o tempo de
+parede de fetch_all_sources conforme o catálogo cresce, comparando com
+a soma sequencial das latências (modelo antigo, um produto por vez).
+
+Uso (a partir da pasta Backend):
+    python -m benchmarks.benchmark_updater
+"""
+import asyncio
+import time
+from unittest.mock import patch
+
+from dotenv import load_dotenv
+load_dotenv(".env.test")
+
+from app.core.config import settings  # noqa: E402
+from app.services.product_updater import fetch_all_sources  # noqa: E402
+
+EBAY_LATENCY = 0.15    # segundos por busca no eBay
+AMAZON_LATENCY = 0.40  # segundos por scrape na Amazon
+CATALOG_SIZES = [5, 10, 20, 40, 80]
+
+
+async def _fake_ebay(term: str):
+    await asyncio.sleep(EBAY_LATENCY)  # Cliente assíncrono (httpx)
+    return [{"price": 100.0, "currency": "USD", "source": "eBay", "title": term}]
+
+
+async def _fake_amazon(term: str):
+    await asyncio.sleep(AMAZON_LATENCY)  # Scrape assíncrono (Scrapfly)
+    return [{"price": 500.0, "currency": "BRL", "source": "Amazon", "title": term}]
+
+
+async def _run(size: int) -> float:
+    terms = [f"GPU {i}" for i in range(size)]
+    with patch("app.services.product_updater.ebay_service.search_ebay_items_async", new=_fake_ebay), \
+         patch("app.services.product_updater.amazon_service.search_amazon_items_async", new=_fake_amazon):
+        start = time.perf_counter()
+        await fetch_all_sources(terms)
+        return time.perf_counter() - start
+
+
+def main():
+    print(
+        f"Limites: global={settings.UPDATER_MAX_CONCURRENCY} "
+        f"ebay={settings.UPDATER_EBAY_CONCURRENCY} amazon={settings.UPDATER_AMAZON_CONCURRENCY}"
+    )
+    print(f"{'produtos':>9} | {'sequencial (s)':>14} | {'concorrente (s)':>15} | {'ganho':>6}")
+    for size in CATALOG_SIZES:
+        sequential = size * (EBAY_LATENCY + AMAZON_LATENCY)
+        concurrent = asyncio.run(_run(size))
+        print(f"{size:>9} | {sequential:>14.2f} | {concurrent:>15.2f} | {sequential / concurrent:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
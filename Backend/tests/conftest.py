@@ -11,6 +11,24 @@ from app.db.session import SessionLocal, engine
 from app.db.base_class import Base
 from app.main import app
 from app.api.endpoints.auth import get_db
+from app.models.product import Product
+from app.services.product_catalog import ProductCatalog
+from app.services.product_resolver import ProductResolver
+from app.services.response_cache import ResponseCache
+from app.services.rate_matrix import RateMatrix
+
+@pytest.fixture(autouse=True)
+def reset_product_catalog():
+    """O catálogo, os aliases, as cotações e o cache de respostas são memória do processo: começam vazios em cada teste."""
+    ProductCatalog.clear()
+    ProductResolver.clear()
+    ResponseCache.clear()
+    RateMatrix.clear()
+    yield
+    ProductCatalog.clear()
+    ProductResolver.clear()
+    ResponseCache.clear()
+    RateMatrix.clear()
 
 @pytest.fixture(scope="function")
 def db_session() -> Generator[Session, None, None]:
@@ -30,6 +48,14 @@ def db_session() -> Generator[Session, None, None]:
     connection.close()
     Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture
+def product(db_session: Session) -> Product:
+    """Um produto já gravado (flush) na sessão de teste."""
+    product = Product(name="RTX 5090", search_term="RTX 5090")
+    db_session.add(product)
+    db_session.flush()
+    return product
+
 @pytest.fixture(scope="function")
 def client(db_session: Session) -> Generator[TestClient, None, None]:
     """
@@ -134,3 +134,61 @@ def test_search_amazon_items_returns_only_3_cheapest(mock_scrape, mock_currency)
 def test_search_amazon_items_scrape_error(mock_scrape):
     results = search_amazon_items("NVIDIA RTX 5090 32GB")
     assert results == []
+
+
+# ============================================================
+# TESTES PARA search_amazon_items_async
+# ============================================================
+import asyncio
+from app.services.amazon_service import search_amazon_items_async, AMAZON_SEARCH_CONFIG
+
+
+def _make_result(title, link, price):
+    mock_result = MagicMock()
+    box = MagicMock()
+    box.css.return_value.get.side_effect = [title, link, price]
+    mock_result.selector.css.return_value = [box]
+    return mock_result
+
+
+@pytest.mark.asyncio
+@patch("app.services.amazon_service.CurrencyService.get_usd_to_brl_async", return_value=5.00)
+async def test_search_amazon_items_async_success(mock_currency):
+    async def fake_async_scrape(config):
+        return _make_result("Placa NVIDIA RTX 5090 32GB Ultra", "/rtx5090-ultra", "R$ 12.000,00")
+
+    with patch("app.services.amazon_service.SCRAPFLY.async_scrape", side_effect=fake_async_scrape):
+        results = await search_amazon_items_async("NVIDIA RTX 5090 32GB")
+
+    assert len(results) == 1
+    assert results[0]["price_brl"] == 12000.00
+    assert results[0]["price_usd"] == pytest.approx(2400.00)
+
+
+@pytest.mark.asyncio
+async def test_search_amazon_items_async_scrape_error():
+    with patch("app.services.amazon_service.SCRAPFLY.async_scrape", side_effect=Exception("erro")):
+        results = await search_amazon_items_async("NVIDIA RTX 5090 32GB")
+
+    assert results == []
+
+
+@pytest.mark.asyncio
+@patch("app.services.amazon_service.CurrencyService.get_usd_to_brl_async", return_value=5.00)
+async def test_search_amazon_items_async_respects_scrapfly_quota(mock_currency):
+    """Todo o catálogo é disparado de uma vez, mas nunca acima da cota."""
+    running = {"now": 0, "max": 0}
+
+    async def fake_async_scrape(config):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.05)
+        running["now"] -= 1
+        return _make_result("Sem resultado", "/x", "R$ 1,00")
+
+    with patch("app.services.amazon_service.SCRAPFLY.async_scrape", side_effect=fake_async_scrape), \
+         patch("app.services.amazon_service.settings.SCRAPFLY_MAX_CONCURRENCY", 2), \
+         patch("app.services.amazon_service._scrape_semaphore", None):
+        await asyncio.gather(*(search_amazon_items_async(q) for q in AMAZON_SEARCH_CONFIG))
+
+    assert running["max"] == 2
@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app.db.base_class import Base
+from app.db.session import get_async_database_url, run_db
+from app.models.product import Product, PriceHistory, LatestOffers, PriceHistoryDaily
+from app.services.product_catalog import ProductCatalog
+
+
+# ============================================================
+# Conversão da URL para os drivers assíncronos
+# ============================================================
+def test_async_database_url_postgres():
+    url = get_async_database_url("postgresql://user:pass@db:5432/benchiban?sslmode=require")
+    assert url.startswith("postgresql+asyncpg://user:pass@db:5432/benchiban")
+    assert "ssl=require" in url
+    assert "sslmode" not in url
+
+
+def test_async_database_url_psycopg2_and_sqlite():
+    assert get_async_database_url("postgresql+psycopg2://u:p@h/db").startswith("postgresql+asyncpg://")
+    assert get_async_database_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+
+
+# ============================================================
+# Sessão assíncrona de verdade (aiosqlite)
+# ============================================================
+@pytest.fixture
+async def async_session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_run_db_with_async_session(async_session_factory):
+    async with async_session_factory() as db:
+        ids = await run_db(db, ProductCatalog.ensure, ["GPU A", "GPU B"])
+        await db.commit()
+
+        assert set(ids) == {"GPU A", "GPU B"}
+        count = (await db.execute(select(func.count(Product.id)))).scalar_one()
+        assert count == 2
+
+
+@pytest.mark.asyncio
+async def test_run_db_with_sync_session_calls_directly():
+    mock_db = MagicMock()
+    fn = MagicMock(return_value=42)
+
+    assert await run_db(mock_db, fn, "x", y=1) == 42
+    fn.assert_called_once_with(mock_db, "x", y=1)
+
+
+@pytest.mark.asyncio
+async def test_updater_persists_through_async_engine(async_session_factory):
+    from app.services.product_updater import update_products
+
+    async def fake_ebay(term):
+        return [{"price": 100.0, "currency": "USD", "source": "eBay", "title": term}]
+
+    async def fake_amazon(term):
+        return [{"price": 1000.0, "currency": "BRL", "source": "Amazon", "title": term}]
+
+    with patch("app.services.product_updater.settings.ASYNC_DB_ENABLED", True), \
+         patch("app.services.product_updater.AsyncSessionLocal", async_session_factory), \
+         patch("app.services.product_updater.SessionLocal") as mock_sync_session, \
+         patch("app.services.product_updater.CurrencyService.get_usd_to_brl_async", return_value=5.0), \
+         patch("app.services.product_updater.ebay_service.search_ebay_items_async", new=fake_ebay), \
+         patch("app.services.product_updater.amazon_service.search_amazon_items_async", new=fake_amazon):
+
+        await update_products(["GPU A", "GPU B"])
+
+    mock_sync_session.assert_not_called()
+    async with async_session_factory() as db:
+        prices = (await db.execute(select(PriceHistory.price).order_by(PriceHistory.price))).scalars().all()
+        snapshots = (await db.execute(select(func.count()).select_from(LatestOffers))).scalar_one()
+        daily_counts = (await db.execute(select(PriceHistoryDaily.price_count))).scalars().all()
+    assert prices == [500.0, 500.0, 1000.0, 1000.0]
+    # Snapshot das últimas ofertas mantido pelo updater (um por produto)
+    assert snapshots == 2
+    # Agregados diários por produto e fonte mantidos na mesma transação
+    assert sorted(daily_counts) == [1, 1, 1, 1]
@@ -1,3 +1,5 @@
+import asyncio
+import time
 import pytest
 from unittest.mock import patch, MagicMock
 from app.services.currency_service import CurrencyService
@@ -10,6 +12,8 @@ from datetime import datetime, timezone
 def reset_cache():
     CurrencyService._cached_rate = None
     CurrencyService._last_update = 0
+    CurrencyService._refresh_task = None
+    CurrencyService._provider_stats = {}
     yield
 
 
@@ -126,3 +130,148 @@ def test_last_update_timestamp():
 def test_last_update_none():
     CurrencyService._last_update = 0
     assert CurrencyService.get_last_update_timestamp() is None
+
+
+# ---------------------------------------------------------
+# TESTE 8 — Cache vencido: devolve o valor atual e atualiza em segundo plano
+# ---------------------------------------------------------
+async def test_async_serves_stale_rate_and_refreshes_in_background():
+    CurrencyService._cached_rate = 5.00
+    CurrencyService._last_update = time.time() - CurrencyService._CACHE_TTL - 10
+
+    with patch.object(CurrencyService, "_fetch_rate_hedged", return_value=5.40) as mock_fetch:
+        rate = await CurrencyService.get_usd_to_brl_async()
+        assert rate == 5.00  # não esperou a API
+
+        await CurrencyService._refresh_task
+        assert mock_fetch.call_count == 1
+        assert await CurrencyService.get_usd_to_brl_async() == 5.40
+
+
+# ---------------------------------------------------------
+# TESTE 9 — Misses concorrentes compartilham uma única chamada
+# ---------------------------------------------------------
+async def test_async_concurrent_misses_coalesce_into_one_fetch():
+    async def slow_fetch():
+        await asyncio.sleep(0.05)
+        return 5.25
+
+    with patch.object(CurrencyService, "_fetch_rate_hedged", side_effect=slow_fetch) as mock_fetch:
+        rates = await asyncio.gather(*(CurrencyService.get_usd_to_brl_async() for _ in range(10)))
+
+    assert rates == [5.25] * 10
+    assert mock_fetch.call_count == 1
+
+
+# ---------------------------------------------------------
+# TESTE 10 — Além da idade máxima, não serve o valor velho
+# ---------------------------------------------------------
+async def test_async_rate_older_than_max_staleness_is_not_served():
+    CurrencyService._cached_rate = 5.00
+    CurrencyService._last_update = time.time() - CurrencyService._MAX_STALENESS - 10
+
+    with patch.object(CurrencyService, "_fetch_rate_hedged", side_effect=Exception("API fora")):
+        with pytest.raises(Exception):
+            await CurrencyService.get_usd_to_brl_async()
+
+    with patch.object(CurrencyService, "_fetch_rate_hedged", return_value=5.60):
+        assert await CurrencyService.get_usd_to_brl_async() == 5.60
+
+
+# ---------------------------------------------------------
+# TESTE 11 — Hedged: provedor principal lento, vence o outro (e o lento é cancelado)
+# ---------------------------------------------------------
+async def test_hedged_fetch_returns_fastest_provider_and_cancels_loser():
+    cancelled = []
+
+    async def slow_frankfurter():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append("frankfurter")
+            raise
+        return 5.10
+
+    async def fast_awesomeapi():
+        await asyncio.sleep(0.01)
+        return 5.20
+
+    with patch.object(CurrencyService, "_HEDGE_DELAY", 0.05), \
+         patch.object(CurrencyService, "_fetch_frankfurter_async", side_effect=slow_frankfurter), \
+         patch.object(CurrencyService, "_fetch_awesomeapi_async", side_effect=fast_awesomeapi):
+        start = time.perf_counter()
+        rate = await CurrencyService._fetch_rate_hedged()
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(0)
+
+    assert rate == 5.20
+    assert elapsed < 1
+    assert cancelled == ["frankfurter"]
+    # O perdedor cancelado não conta como erro, mas ganha uma amostra de latência
+    stats = CurrencyService.get_provider_stats()["frankfurter"]
+    assert stats["error_rate"] == 0
+    assert stats["latency"] >= 0.05
+
+
+# ---------------------------------------------------------
+# TESTE 11b — Principal sempre lento perde a vez para o mais rápido
+# ---------------------------------------------------------
+async def test_always_slow_primary_is_demoted():
+    async def slow_frankfurter():
+        await asyncio.sleep(1)
+        return 5.10
+
+    async def fast_awesomeapi():
+        await asyncio.sleep(0.01)
+        return 5.20
+
+    assert CurrencyService.provider_order() == ["frankfurter", "awesomeapi"]
+    with patch.object(CurrencyService, "_HEDGE_DELAY", 0.05), \
+         patch.object(CurrencyService, "_fetch_frankfurter_async", side_effect=slow_frankfurter), \
+         patch.object(CurrencyService, "_fetch_awesomeapi_async", side_effect=fast_awesomeapi):
+        assert await CurrencyService._fetch_rate_hedged() == 5.20
+
+        assert CurrencyService.provider_order() == ["awesomeapi", "frankfurter"]
+        # Com o rápido como principal, a próxima busca não espera o hedge delay
+        start = time.perf_counter()
+        assert await CurrencyService._fetch_rate_hedged() == 5.20
+        assert time.perf_counter() - start < 0.05
+
+
+# ---------------------------------------------------------
+# TESTE 12 — Hedged: falha do principal dispara o outro sem esperar o delay
+# ---------------------------------------------------------
+async def test_hedged_fetch_falls_back_immediately_on_failure():
+    with patch.object(CurrencyService, "_HEDGE_DELAY", 5), \
+         patch.object(CurrencyService, "_fetch_frankfurter_async", side_effect=Exception("500")), \
+         patch.object(CurrencyService, "_fetch_awesomeapi_async", return_value=5.30):
+        start = time.perf_counter()
+        rate = await CurrencyService._fetch_rate_hedged()
+
+    assert rate == 5.30
+    assert time.perf_counter() - start < 1
+    assert CurrencyService.get_provider_stats()["frankfurter"]["error_rate"] > 0
+
+
+# ---------------------------------------------------------
+# TESTE 13 — Estatísticas definem o provedor principal
+# ---------------------------------------------------------
+def test_provider_order_prefers_fast_and_reliable_provider():
+    assert CurrencyService.provider_order() == ["frankfurter", "awesomeapi"]
+
+    CurrencyService._record("frankfurter", 0.9, failed=False)
+    CurrencyService._record("awesomeapi", 0.1, failed=False)
+    assert CurrencyService.provider_order() == ["awesomeapi", "frankfurter"]
+
+    CurrencyService._record("awesomeapi", 0.1, failed=True)
+    assert CurrencyService.provider_order() == ["frankfurter", "awesomeapi"]
+
+
+# ---------------------------------------------------------
+# TESTE 14 — Todos os provedores falham → exceção
+# ---------------------------------------------------------
+async def test_hedged_fetch_raises_when_all_providers_fail():
+    with patch.object(CurrencyService, "_fetch_frankfurter_async", side_effect=Exception("500")), \
+         patch.object(CurrencyService, "_fetch_awesomeapi_async", side_effect=Exception("timeout")):
+        with pytest.raises(Exception):
+            await CurrencyService._fetch_rate_hedged()
@@ -19,7 +19,7 @@ def mock_timestamp():
 # --------------------------
 def test_get_current_exchange_rate_success(mock_timestamp):
 
-    with patch("app.services.currency_service.CurrencyService.get_usd_to_brl") as mock_rate, \
+    with patch("app.services.currency_service.CurrencyService.get_usd_to_brl_async") as mock_rate, \
          patch("app.services.currency_service.CurrencyService.get_last_update_timestamp") as mock_time:
 
         mock_rate.return_value = 4.95
@@ -41,7 +41,7 @@ def test_get_current_exchange_rate_success(mock_timestamp):
 # --------------------------
 def test_get_current_exchange_rate_timestamp_fallback():
 
-    with patch("app.services.currency_service.CurrencyService.get_usd_to_brl") as mock_rate, \
+    with patch("app.services.currency_service.CurrencyService.get_usd_to_brl_async") as mock_rate, \
          patch("app.services.currency_service.CurrencyService.get_last_update_timestamp") as mock_time:
 
         mock_rate.return_value = 5.02
@@ -66,7 +66,7 @@ def test_get_current_exchange_rate_timestamp_fallback():
 # --------------------------
 def test_get_current_exchange_rate_error():
 
-    with patch("app.services.currency_service.CurrencyService.get_usd_to_brl") as mock_rate:
+    with patch("app.services.currency_service.CurrencyService.get_usd_to_brl_async") as mock_rate:
         mock_rate.side_effect = Exception("API offline")
 
         response = client.get("/api/exchange-rate/")
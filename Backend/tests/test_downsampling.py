@@ -0,0 +1,37 @@
+import numpy as np
+from datetime import datetime, timedelta
+from app.services.downsampling import downsample_points, lttb_indices
+
+
+def test_lttb_keeps_endpoints_and_extremes():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50.0)
+    y[500] = 10.0   # Pico isolado
+    y[700] = -10.0  # Vale isolado
+
+    indices = lttb_indices(x, y, 50)
+
+    assert len(indices) == 50
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+    assert 500 in indices and 700 in indices
+
+
+def test_lttb_returns_everything_when_below_threshold():
+    x = np.arange(10, dtype=np.float64)
+    assert lttb_indices(x, x, 20).tolist() == list(range(10))
+
+
+def test_downsample_points_per_source():
+    start = datetime(2024, 1, 1)
+    points = [
+        {"date": (start + timedelta(days=day)).isoformat(), "source": source, "price_brl": 5000.0 + day}
+        for day in range(365) for source in ("eBay", "Amazon")
+    ]
+    points.append({"date": start.isoformat(), "source": "Mercado Livre", "price_brl": 4000.0})
+
+    result = downsample_points(points, 100)
+
+    counts = {source: sum(1 for p in result if p["source"] == source) for source in ("eBay", "Amazon", "Mercado Livre")}
+    assert counts == {"eBay": 100, "Amazon": 100, "Mercado Livre": 1}
+    assert [p["date"] for p in result] == sorted(p["date"] for p in result)
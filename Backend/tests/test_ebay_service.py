@@ -96,3 +96,101 @@ def test_search_ebay_items_token_error(mock_get):
         results = search_ebay_items("GPU")
 
         assert results == []
+
+
+# -----------------------------------------------------------
+# Testes do cliente assíncrono (search_ebay_items_async)
+# -----------------------------------------------------------
+import httpx
+from app.services import ebay_service
+from app.services.ebay_service import search_ebay_items_async
+
+
+def _mock_async_client(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.asyncio
+@patch("app.services.ebay_service.CurrencyService.get_usd_to_brl_async", return_value=5.00)
+@patch("app.services.ebay_service.ebay_token_manager.get_valid_ebay_token", return_value="fake_ebay_token")
+async def test_search_ebay_items_async_success(mock_token, mock_rate):
+    def handler(request: httpx.Request):
+        assert request.headers["Authorization"] == "Bearer fake_ebay_token"
+        assert request.url.params["q"] == "GPU"
+        return httpx.Response(200, json={
+            "itemSummaries": [
+                {
+                    "title": "GPU X",
+                    "price": {"value": "100.0", "currency": "USD"},
+                    "seller": {"feedbackPercentage": "99.5", "username": "best_seller"},
+                    "itemWebUrl": "https://example.com/item1"
+                },
+            ]
+        })
+
+    with patch("app.services.ebay_service.get_async_client", return_value=_mock_async_client(handler)):
+        results = await search_ebay_items_async("GPU")
+
+    assert len(results) == 1
+    assert results[0]["price_usd"] == 100.0
+    assert results[0]["price_brl"] == 500.0
+
+
+@pytest.mark.asyncio
+@patch("app.services.ebay_service.ebay_token_manager.get_valid_ebay_token", return_value="fake_ebay_token")
+async def test_search_ebay_items_async_http_error(mock_token):
+    def handler(request: httpx.Request):
+        raise httpx.ConnectTimeout("timeout", request=request)
+
+    with patch("app.services.ebay_service.get_async_client", return_value=_mock_async_client(handler)):
+        results = await search_ebay_items_async("GPU")
+
+    assert results == []
+
+
+@pytest.mark.asyncio
+async def test_async_client_is_shared_and_has_timeouts():
+    client_a = ebay_service.get_async_client()
+    client_b = ebay_service.get_async_client()
+
+    # Mesmo pool reaproveitado entre buscas
+    assert client_a is client_b
+    assert client_a.timeout.connect == ebay_service.settings.EBAY_CONNECT_TIMEOUT
+    assert client_a.timeout.read == ebay_service.settings.EBAY_READ_TIMEOUT
+
+    await ebay_service.close_async_client()
+    assert client_a.is_closed
+
+
+@pytest.mark.asyncio
+@patch("app.services.ebay_service.CurrencyService.get_usd_to_brl_async", return_value=5.00)
+@patch("app.services.ebay_service.ebay_token_manager.get_valid_ebay_token", return_value="fake_ebay_token")
+async def test_search_ebay_items_async_converts_other_currencies(mock_token, mock_rate):
+    def handler(request: httpx.Request):
+        return httpx.Response(200, json={
+            "itemSummaries": [
+                {"title": "GPU EUR", "price": {"value": "90.0", "currency": "EUR"},
+                 "seller": {"feedbackPercentage": "99.0", "username": "eu"}, "itemWebUrl": "https://example.com/eu"},
+                {"title": "GPU USD", "price": {"value": "120.0", "currency": "USD"},
+                 "seller": {"feedbackPercentage": "99.0", "username": "us"}, "itemWebUrl": "https://example.com/us"},
+                {"title": "GPU XYZ", "price": {"value": "1.0", "currency": "XYZ"},
+                 "seller": {"feedbackPercentage": "99.9", "username": "xx"}, "itemWebUrl": "https://example.com/xx"},
+            ]
+        })
+
+    rates = MagicMock()
+    rates.json.return_value = {"amount": 1.0, "base": "USD", "rates": {"EUR": 0.9}}
+
+    with patch("app.services.ebay_service.get_async_client", return_value=_mock_async_client(handler)), \
+         patch("app.services.rate_matrix.requests.get", return_value=rates) as mock_rates:
+        results = await search_ebay_items_async("GPU")
+
+    # Uma chamada de cotações para o lote; moeda sem cotação é descartada
+    assert mock_rates.call_count == 1
+    assert [r["title"] for r in results] == ["GPU EUR", "GPU USD"]  # 100 USD < 120 USD
+
+    eur = results[0]
+    assert eur["currency"] == "EUR"
+    assert eur["price"] == 90.0
+    assert eur["price_usd"] == 100.0
+    assert eur["price_brl"] == 500.0
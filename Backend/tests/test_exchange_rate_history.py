@@ -0,0 +1,93 @@
+import numpy as np
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.exchange_rate import ExchangeRate
+from app.models.product import PriceHistory, Product
+from app.services.exchange_rate_history import (
+    RateTimeline,
+    apply_exchange_rates,
+    backfill_exchange_rates,
+    record_rate,
+)
+from app.services.history_service import get_history_points
+
+
+def test_record_rate_keeps_one_row_per_day(db_session: Session):
+    record_rate(db_session, 5.00, datetime(2024, 5, 1, 3, 0, tzinfo=timezone.utc))
+    record_rate(db_session, 5.10, datetime(2024, 5, 1, 15, 0, tzinfo=timezone.utc))
+    record_rate(db_session, 5.20, datetime(2024, 5, 2, 3, 0, tzinfo=timezone.utc))
+
+    rows = db_session.execute(select(ExchangeRate.day, ExchangeRate.rate).order_by(ExchangeRate.day)).all()
+    assert [tuple(r) for r in rows] == [(date(2024, 5, 1), 5.10), (date(2024, 5, 2), 5.20)]
+
+    assert RateTimeline.load(db_session).rate_at(datetime(2024, 5, 1, 23, 0)) == 5.10
+
+
+def test_rates_at_uses_last_known_rate_vectorized(db_session: Session):
+    record_rate(db_session, 5.30, datetime(2024, 5, 3, tzinfo=timezone.utc))
+    record_rate(db_session, 5.00, datetime(2024, 5, 1, tzinfo=timezone.utc))
+
+    when = np.array(["2024-04-30", "2024-05-01", "2024-05-02", "2024-05-03", "2024-06-01"], dtype="datetime64[D]")
+    rates = RateTimeline.load(db_session).rates_at(when)
+
+    assert np.isnan(rates[0])  # antes da primeira cotação
+    assert rates[1:].tolist() == [5.00, 5.00, 5.30, 5.30]
+
+
+def test_backfill_inserts_timeseries_and_keeps_recorded_days(db_session: Session):
+    record_rate(db_session, 5.55, datetime(2024, 5, 2, 12, 0, tzinfo=timezone.utc))
+
+    response = MagicMock()
+    response.json.return_value = {
+        "amount": 1.0, "base": "USD", "start_date": "2024-05-01", "end_date": "2024-05-03",
+        "rates": {"2024-05-01": {"BRL": 5.10}, "2024-05-02": {"BRL": 5.12}, "2024-05-03": {"BRL": 5.14}},
+    }
+    with patch("app.services.exchange_rate_history.requests.get", return_value=response) as mock_get:
+        count = backfill_exchange_rates(db_session, date(2024, 5, 1), date(2024, 5, 3))
+
+    assert count == 3
+    assert mock_get.call_count == 1  # a série inteira numa chamada
+    rates = dict(db_session.execute(select(ExchangeRate.day, ExchangeRate.rate)).all())
+    assert rates == {date(2024, 5, 1): 5.10, date(2024, 5, 2): 5.55, date(2024, 5, 3): 5.14}
+
+
+def test_history_points_use_rate_of_their_date(db_session: Session):
+    product = Product(name="RTX 5090", search_term="rtx 5090")
+    db_session.add(product)
+    db_session.flush()
+
+    today = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0, microsecond=0, tzinfo=None)
+    for days_ago, rate in ((2, 5.00), (1, 5.20)):
+        ts = today - timedelta(days=days_ago)
+        db_session.add(PriceHistory(product_id=product.id, timestamp=ts, price=100 * rate, price_usd=100.0,
+                                    currency="USD", source="eBay"))
+        record_rate(db_session, rate, ts)
+    db_session.flush()
+
+    points = get_history_points(db_session, product.id, today - timedelta(days=7), "day")
+
+    assert [p["exchange_rate"] for p in points] == [5.00, 5.20]
+
+
+def test_load_starts_at_rate_in_effect_before_range(db_session: Session):
+    for day, rate in ((1, 5.00), (2, 5.10), (5, 5.30), (9, 5.90)):
+        record_rate(db_session, rate, datetime(2024, 5, day, tzinfo=timezone.utc))
+
+    timeline = RateTimeline.load(db_session, date(2024, 5, 3), date(2024, 5, 6))
+
+    assert timeline.rates.tolist() == [5.10, 5.30]
+    assert timeline.rate_at(datetime(2024, 5, 4)) == 5.10
+
+
+def test_apply_exchange_rates_keeps_stored_rate_outside_coverage(db_session: Session):
+    record_rate(db_session, 5.20, datetime(2024, 5, 2, tzinfo=timezone.utc))
+    points = [
+        {"date": "2024-05-01T00:00:00", "exchange_rate": 4.90},
+        {"date": "2024-05-02T10:00:00", "exchange_rate": None},
+    ]
+
+    apply_exchange_rates(db_session, [points])
+
+    assert [p["exchange_rate"] for p in points] == [4.90, 5.20]
@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from app.main import app
+from app.api.endpoints.export import export_price_history, get_export_sessions
+from app.models.exchange_rate import ExchangeRate
+from app.models.product import Product, PriceHistory
+
+
+@pytest.fixture
+def export_client(client: TestClient, db_session: Session):
+    """Export com a sessão de teste (a rota fecha a sessão ao fim do stream)."""
+    app.dependency_overrides[get_export_sessions] = lambda: lambda: db_session
+    yield client
+    del app.dependency_overrides[get_export_sessions]
+
+
+@pytest.fixture
+def products(db_session: Session):
+    gpu = Product(name="RTX 5090", search_term="RTX 5090")
+    other = Product(name="Arc A770", search_term="Arc A770")
+    db_session.add_all([gpu, other])
+    db_session.flush()
+    rows = [
+        (gpu, datetime(2025, 1, 1, 3), "eBay", 5000.0),
+        (gpu, datetime(2025, 1, 1, 3), "Amazon", 5200.0),
+        (gpu, datetime(2025, 2, 1, 3), "eBay", 4800.0),
+        (other, datetime(2025, 1, 1, 3), "eBay", 1500.0),
+    ]
+    for product, ts, source, price in rows:
+        db_session.add(PriceHistory(product_id=product.id, timestamp=ts, source=source, price=price, currency="BRL"))
+    db_session.flush()
+    return gpu, other
+
+
+def test_export_ndjson_filters_by_product_source_and_period(export_client: TestClient, products):
+    response = export_client.get(
+        "/api/export/history?product_name=RTX 5090&source=ebay&start=2025-01-01T00:00:00&end=2025-01-31T00:00:00"
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [(line["source"], line["price"]) for line in lines] == [("eBay", 5000.0)]
+    assert lines[0]["timestamp"] == "2025-01-01T03:00:00"
+
+
+def test_export_csv_streams_in_batches(export_client: TestClient, products):
+    # Lotes de 1 linha: cada linha vira um chunk da resposta
+    with patch("app.services.history_export.EXPORT_BATCH_SIZE", 1):
+        response = export_client.get("/api/export/history?format=csv")
+
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [float(row["price"]) for row in rows] == [5000.0, 5200.0, 1500.0, 4800.0]
+    assert response.headers["content-disposition"] == 'attachment; filename="price_history.csv"'
+
+
+def test_export_includes_listing_amount_of_non_usd_rows(export_client: TestClient, db_session: Session, products):
+    gpu, _ = products
+    db_session.add(PriceHistory(product_id=gpu.id, timestamp=datetime(2025, 3, 1, 3), source="eBay",
+                                price=5000.0, price_usd=1000.0, currency="EUR", price_original=920.0))
+    db_session.flush()
+
+    ndjson = [json.loads(line) for line in export_client.get("/api/export/history").text.splitlines()]
+    rows = list(csv.DictReader(io.StringIO(export_client.get("/api/export/history?format=csv").text)))
+
+    assert [(line["currency"], line["price_original"]) for line in ndjson if line["currency"] == "EUR"] == [("EUR", 920.0)]
+    assert [row["price_original"] for row in rows if row["currency"] == "EUR"] == ["920.0"]
+
+
+def test_export_fills_exchange_rate_of_the_day(export_client: TestClient, db_session: Session, products):
+    gpu, _ = products
+    fetched = datetime(2025, 3, 1)
+    db_session.add_all([
+        ExchangeRate(base="USD", quote="BRL", day=datetime(2024, 12, 31).date(), rate=5.0, fetched_at=fetched),
+        ExchangeRate(base="USD", quote="BRL", day=datetime(2025, 2, 1).date(), rate=5.5, fetched_at=fetched),
+        # Legado: a cotação gravada na linha prevalece
+        PriceHistory(product_id=gpu.id, timestamp=datetime(2025, 2, 1, 4), source="Amazon", price=5100.0,
+                     currency="BRL", exchange_rate=6.0),
+    ])
+    db_session.flush()
+
+    lines = [json.loads(line) for line in export_client.get("/api/export/history?product_name=RTX 5090").text.splitlines()]
+
+    assert [(line["timestamp"][:10], line["exchange_rate"]) for line in lines] == [
+        ("2025-01-01", 5.0), ("2025-01-01", 5.0), ("2025-02-01", 5.5), ("2025-02-01", 6.0),
+    ]
+
+
+def test_export_csv_empty_result_keeps_header(export_client: TestClient, products):
+    response = export_client.get("/api/export/history?format=csv&source=Mercado Livre")
+
+    assert response.text.strip() == "timestamp,product_id,run_id,source,price,price_usd,currency,price_original,exchange_rate,original_title,seller_name,seller_rating,link"
+
+
+def test_export_unknown_product_returns_404(export_client: TestClient, products):
+    response = export_client.get("/api/export/history?product_name=PlacaFantasma")
+
+    assert response.status_code == 404
+
+
+async def test_export_opens_stream_session_only_when_iterated(db_session: Session):
+    sessions = MagicMock(return_value=db_session)
+    response = export_price_history(
+        product_name=None, source=None, start=None, end=None, format="csv", db=db_session, sessions=sessions,
+    )
+
+    # Cliente desconectou antes da primeira linha: nenhuma sessão aberta
+    sessions.assert_not_called()
+
+    chunks = response.body_iterator
+    await chunks.__anext__()
+    await chunks.aclose()
+    sessions.assert_called_once()
@@ -0,0 +1,100 @@
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.product import Product, LatestOffers, PriceHistory
+from app.services.offers_service import (
+    OFFER_COLUMNS,
+    build_offers,
+    get_latest_offers,
+    pick_best_deal,
+    reprice_offers,
+    save_latest_offers,
+)
+
+TS = datetime(2024, 5, 1, 3, 0, 0, tzinfo=timezone.utc)
+
+
+def make_rows():
+    return [
+        {"price": 600.0, "price_usd": 120.0, "currency": "USD", "source": "eBay", "timestamp": TS},
+        {"price": 500.0, "price_usd": 100.0, "currency": "USD", "source": "eBay", "timestamp": TS},
+        {"price": 550.0, "price_usd": 110.0, "currency": "BRL", "source": "Amazon", "timestamp": TS,
+         "original_title": "GPU Amazon"},
+    ]
+
+
+def test_build_offers_groups_and_sorts_by_brl():
+    offers = build_offers(make_rows(), "GPU", usd_rate=5.0)
+
+    assert [item["price_brl"] for item in offers["ebay"]] == [500.0, 600.0]
+    assert offers["ebay"][0]["title"] == "GPU"            # sem título → nome do produto
+    assert offers["ebay"][0]["timestamp"] == TS.isoformat()
+    assert offers["amazon"][0]["title"] == "GPU Amazon"
+
+    best = pick_best_deal(offers)
+    assert best["source"] == "eBay" and best["price_brl"] == 500.0
+
+
+def test_build_offers_accepts_core_rows(db_session: Session):
+    product = Product(name="GPU", search_term="gpu")
+    db_session.add(product)
+    db_session.flush()
+    for row in make_rows():
+        db_session.add(PriceHistory(product_id=product.id, **{**row, "timestamp": TS.replace(tzinfo=None)}))
+    db_session.flush()
+
+    # Linhas Core só com as colunas das ofertas (sem objetos ORM)
+    rows = db_session.execute(
+        select(*OFFER_COLUMNS).where(PriceHistory.product_id == product.id)
+    ).mappings().all()
+    offers = build_offers(rows, "GPU", usd_rate=5.0)
+
+    assert [item["price_brl"] for item in offers["ebay"]] == [500.0, 600.0]
+    assert offers["amazon"][0]["title"] == "GPU Amazon"
+    assert offers["amazon"][0]["link"] is None
+
+
+def test_build_offers_shows_listing_amount_in_its_currency():
+    rows = [
+        {"price": 500.0, "price_usd": 100.0, "currency": "EUR", "price_original": 90.0,
+         "source": "eBay", "timestamp": TS},
+        # Linha antiga, sem o valor original: mantém o preço gravado
+        {"price": 600.0, "price_usd": 120.0, "currency": "USD", "source": "eBay", "timestamp": TS},
+    ]
+
+    offers = build_offers(rows, "GPU", usd_rate=5.0)
+
+    assert [(i["price_original"], i["currency_original"], i["price_brl"]) for i in offers["ebay"]] == [
+        (90.0, "EUR", 500.0), (600.0, "USD", 600.0),
+    ]
+
+
+def test_reprice_offers_uses_current_rate():
+    offers = build_offers(make_rows(), "GPU", usd_rate=5.0)
+
+    # Dólar subiu: o eBay (US$ 100 * 6 = R$ 600) passa a perder da Amazon (R$ 550)
+    repriced = reprice_offers(offers, usd_rate=6.0)
+
+    assert [item["price_brl"] for item in repriced["ebay"]] == [600.0, 720.0]
+    assert repriced["amazon"][0]["price_brl"] == 550.0
+    assert pick_best_deal(repriced)["source"] == "Amazon"
+    # O snapshot original não é alterado
+    assert offers["ebay"][0]["price_brl"] == 500.0
+
+
+def test_save_latest_offers_upserts_snapshot(db_session: Session):
+    product = Product(name="GPU", search_term="GPU")
+    db_session.add(product)
+    db_session.flush()
+
+    save_latest_offers(db_session, {product.id: make_rows()}, {product.id: "GPU"}, 5.0, run_id=None)
+    # Nova execução substitui o snapshot (não cria outra linha)
+    save_latest_offers(db_session, {product.id: make_rows()[:1]}, {product.id: "GPU"}, 5.0, run_id=None)
+    db_session.expire_all()
+
+    assert db_session.query(LatestOffers).count() == 1
+    offers = get_latest_offers(db_session, product.id)
+    assert len(offers["ebay"]) == 1
+    assert offers["amazon"] == []
+    assert get_latest_offers(db_session, 999) is None
@@ -0,0 +1,130 @@
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+from datetime import date, datetime
+from unittest.mock import patch
+from sqlalchemy.orm import Session
+from app.models.exchange_rate import ExchangeRate
+from app.models.product import Product, PriceHistory
+from app.services.history_export import EXPORT_FIELDS
+from app.services.parquet_archive import (
+    ARCHIVE_SCHEMA,
+    archive_month,
+    compact_closed_months,
+    month_path,
+    read_archive,
+)
+
+
+@pytest.fixture
+def history(db_session: Session):
+    product = Product(name="RTX 5090", search_term="RTX 5090")
+    db_session.add(product)
+    db_session.flush()
+    rows = [
+        (datetime(2025, 1, 10, 3), "eBay", 5000.0),
+        (datetime(2025, 1, 20, 3), "Amazon", 5200.0),
+        (datetime(2025, 2, 5, 3), "eBay", 4800.0),
+        (datetime(2025, 3, 1, 3), "eBay", 4700.0),  # Mês atual (aberto): não é arquivado
+    ]
+    for ts, source, price in rows:
+        db_session.add(PriceHistory(product_id=product.id, timestamp=ts, source=source, price=price, currency="BRL"))
+    db_session.flush()
+    return product
+
+
+def test_archive_schema_matches_export_columns():
+    assert ARCHIVE_SCHEMA.names == EXPORT_FIELDS
+
+
+def test_compaction_writes_only_closed_months(db_session: Session, history, tmp_path):
+    archived = compact_closed_months(db_session, today=date(2025, 3, 15), base=tmp_path)
+
+    assert archived == [date(2025, 1, 1), date(2025, 2, 1)]
+    assert not month_path(date(2025, 3, 1), tmp_path).exists()
+
+    metadata = pq.ParquetFile(month_path(date(2025, 1, 1), tmp_path)).metadata
+    assert metadata.num_rows == 2
+    column = metadata.row_group(0).column(ARCHIVE_SCHEMA.names.index("price"))
+    assert column.compression == "ZSTD"
+    assert (column.statistics.min, column.statistics.max) == (5000.0, 5200.0)
+
+    # Meses já arquivados não são reescritos
+    assert compact_closed_months(db_session, today=date(2025, 3, 15), base=tmp_path) == []
+
+
+def test_compaction_skips_months_without_rows(db_session: Session, history, tmp_path):
+    # Novembro tem registros; dezembro ficou sem coleta
+    db_session.add(PriceHistory(product_id=history.id, timestamp=datetime(2024, 11, 20, 3), source="eBay",
+                                price=5100.0, currency="BRL"))
+    db_session.flush()
+
+    archived = compact_closed_months(db_session, today=date(2025, 3, 15), base=tmp_path)
+
+    assert archived == [date(2024, 11, 1), date(2025, 1, 1), date(2025, 2, 1)]
+    assert not month_path(date(2024, 12, 1), tmp_path).parent.exists()
+    assert read_archive(base=tmp_path).num_rows == 4
+
+
+def test_read_archive_filters_by_partition_and_columns(db_session: Session, history, tmp_path):
+    compact_closed_months(db_session, today=date(2025, 3, 15), base=tmp_path)
+
+    table = read_archive(
+        columns=["timestamp", "source", "price"],
+        filters=[("month", "=", "2025-01"), ("source", "=", "eBay")],
+        base=tmp_path,
+    )
+
+    assert table.num_rows == 1
+    assert table.column("price").to_pylist() == [5000.0]
+    assert pc.max(read_archive(base=tmp_path).column("price")).as_py() == 5200.0
+
+
+def test_archive_keeps_listing_amount_of_non_usd_rows(db_session: Session, history, tmp_path):
+    db_session.add(PriceHistory(product_id=history.id, timestamp=datetime(2025, 2, 10, 3), source="eBay",
+                                price=5000.0, price_usd=1000.0, currency="EUR", price_original=920.0))
+    db_session.flush()
+    # Mês arquivado antes de 'price_original' existir
+    old_schema = ARCHIVE_SCHEMA.remove(ARCHIVE_SCHEMA.get_field_index("price_original"))
+    month_path(date(2024, 12, 1), tmp_path).parent.mkdir(parents=True)
+    pq.write_table(old_schema.empty_table(), month_path(date(2024, 12, 1), tmp_path))
+
+    compact_closed_months(db_session, today=date(2025, 3, 15), base=tmp_path)
+    table = read_archive(columns=["currency", "price_original"], filters=[("currency", "=", "EUR")], base=tmp_path)
+
+    assert table.to_pylist() == [{"currency": "EUR", "price_original": 920.0}]
+
+
+def test_archive_fills_exchange_rate_of_the_day(db_session: Session, history, tmp_path):
+    db_session.add(ExchangeRate(base="USD", quote="BRL", day=date(2025, 1, 15), rate=5.2, fetched_at=datetime(2025, 1, 15)))
+    db_session.flush()
+
+    compact_closed_months(db_session, today=date(2025, 3, 15), base=tmp_path)
+    table = read_archive(columns=["timestamp", "exchange_rate"], base=tmp_path).sort_by("timestamp")
+
+    # Antes da primeira cotação conhecida fica nulo
+    assert table.column("exchange_rate").to_pylist() == [None, 5.2, 5.2]
+
+
+def test_failed_write_leaves_no_temporary_file(db_session: Session, history, tmp_path):
+    target = month_path(date(2025, 1, 1), tmp_path)
+
+    # O arquivo já foi aberto quando a conversão do lote falha
+    with patch("app.services.parquet_archive._to_table", side_effect=RuntimeError("disco cheio")):
+        with pytest.raises(RuntimeError):
+            archive_month(db_session, date(2025, 1, 1), base=tmp_path)
+    assert not target.exists()
+    assert list(target.parent.iterdir()) == []
+
+
+def test_read_archive_ignores_leftover_temporary_files(db_session: Session, history, tmp_path):
+    compact_closed_months(db_session, today=date(2025, 3, 15), base=tmp_path)
+    # Sobra de uma compactação interrompida (gravada sem rename)
+    leftover = month_path(date(2025, 1, 1), tmp_path)
+    pq.write_table(read_archive(base=tmp_path).drop(["month"]), leftover.with_name(f"_{leftover.name}.tmp"))
+
+    assert read_archive(base=tmp_path).num_rows == 3
+
+
+def test_read_archive_without_files_returns_empty_table(tmp_path):
+    assert read_archive(base=tmp_path / "vazio").num_rows == 0
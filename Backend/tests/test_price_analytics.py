@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from datetime import datetime, timedelta, timezone
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from app.models.product import Product
+from app.services.analytics_service import build_analytics, rolling_mean, rolling_min
+from app.services.product_resolver import ProductResolver
+from app.services.rollup_service import update_rollups
+
+
+def test_rolling_windows_handle_incomplete_start():
+    values = np.array([5.0, 3.0, 4.0, 6.0, 2.0])
+
+    assert rolling_min(values, 3).tolist() == [5.0, 3.0, 3.0, 3.0, 2.0]
+    assert rolling_mean(values, 2).tolist() == [5.0, 4.0, 3.5, 5.0, 4.0]
+    # Série menor que a janela
+    assert rolling_min(values[:2], 7).tolist() == [5.0, 3.0]
+
+
+def test_build_analytics_per_source():
+    points = [
+        {"date": f"2025-01-{day:02d}T00:00:00", "source": "eBay", "price_brl": price}
+        for day, price in enumerate([100.0, 110.0, 90.0, 120.0, 80.0], start=1)
+    ] + [{"date": "2025-01-01T00:00:00", "source": "Amazon", "price_brl": None}]
+
+    stats = build_analytics(points, window=2, lowest_days=30)["eBay"]
+
+    assert list(build_analytics(points, 2, 30)) == ["eBay"]   # Pontos sem preço são ignorados
+    assert stats["latest_price"] == 80.0
+    assert stats["all_time_low"] == 80.0
+    assert stats["all_time_low_date"] == "2025-01-05T00:00:00"
+    assert stats["is_lowest_in_n_days"] is True
+    assert stats["median_30d"] == 100.0
+    assert stats["pct_vs_median_30d"] == pytest.approx(-20.0)
+    assert stats["percentiles"]["p50"] == 100.0
+    assert stats["volatility"] > 0
+    assert [p["rolling_min"] for p in stats["points"]] == [100.0, 100.0, 90.0, 90.0, 80.0]
+
+
+def test_rolling_window_counts_days_not_points():
+    # Sem coleta de 03 a 09: a janela de 3 dias em 10/01 só vê 08 a 10
+    points = [
+        {"date": f"2025-01-{day:02d}T00:00:00", "source": "eBay", "price_brl": price}
+        for day, price in [(1, 50.0), (2, 100.0), (10, 120.0), (11, 110.0)]
+    ]
+
+    stats = build_analytics(points, window=3, lowest_days=30)["eBay"]
+
+    assert [p["rolling_min"] for p in stats["points"]] == [50.0, 50.0, 120.0, 110.0]
+    assert [p["rolling_mean"] for p in stats["points"]] == [50.0, 75.0, 120.0, 115.0]
+
+
+def test_analytics_endpoint_reads_daily_series(client: TestClient, db_session: Session):
+    product = Product(name="RTX 5090", search_term="NVIDIA RTX 5090 32GB")
+    db_session.add(product)
+    db_session.flush()
+    ProductResolver.register(db_session, [(product.id, product.name, product.search_term)])
+
+    start = datetime.now(timezone.utc).replace(hour=3, minute=0, second=0, microsecond=0) - timedelta(days=399)
+    prices = [5000.0 + (day % 50) * 10 for day in range(400)]
+    prices[-1] = 4000.0  # Menor preço de todos no último dia
+    update_rollups(db_session, [
+        {"product_id": product.id, "timestamp": start + timedelta(days=day), "price": price,
+         "price_usd": price / 5.0, "source": "eBay", "exchange_rate": 5.0}
+        for day, price in enumerate(prices)
+    ])
+
+    response = client.get("/api/products/analytics?product_name=RTX 5090&window=30")
+
+    assert response.status_code == 200
+    data = response.json()
+    ebay = data["sources"]["eBay"]
+    assert data["product_name"] == "RTX 5090"
+    assert len(ebay["points"]) == 400
+    assert ebay["all_time_low"] == 4000.0
+    assert ebay["is_lowest_in_n_days"] is True
+    assert ebay["points"][-1]["rolling_min"] == 4000.0
+
+
+def test_analytics_unknown_product_returns_empty(client: TestClient, db_session: Session):
+    response = client.get("/api/products/analytics?product_name=PlacaFantasma")
+
+    assert response.status_code == 200
+    assert response.json()["sources"] == {}
@@ -0,0 +1,78 @@
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+from app.models.product import Product, PriceHistory, ScrapeRun
+from app.services.price_history_writer import build_price_rows, bulk_insert_price_history, create_scrape_run
+
+
+RUN_TS = datetime(2024, 5, 1, 3, 0, 0, tzinfo=timezone.utc)
+
+
+def test_build_price_rows_normalizes_currencies():
+    items = [
+        {"price": 100.0, "currency": "USD", "source": "eBay", "title": "GPU US", "seller_username": "us"},
+        {"price": 1000.0, "currency": "BRL", "source": "Amazon", "title": "GPU BR"},
+        {"price": None, "currency": "BRL", "source": "Amazon"},  # sem preço → ignorado
+    ]
+
+    rows = build_price_rows(7, items, 5.0, RUN_TS)
+
+    assert len(rows) == 2
+    assert rows[0]["price"] == 500.0
+    assert rows[0]["price_usd"] == 100.0
+    assert rows[0]["seller_name"] == "us"
+    assert rows[1]["price"] == 1000.0
+    assert rows[1]["price_usd"] == 200.0
+    assert all(row["product_id"] == 7 and row["timestamp"] == RUN_TS for row in rows)
+
+
+def test_build_price_rows_keeps_other_currencies_converted_to_usd():
+    items = [
+        {"price": 90.0, "currency": "EUR", "price_usd": 100.0, "source": "eBay"},
+        {"price": 80.0, "currency": "GBP", "price_usd": None, "source": "eBay"},  # sem cotação → ignorado
+    ]
+
+    rows = build_price_rows(7, items, 5.0, RUN_TS)
+
+    assert len(rows) == 1
+    assert rows[0]["currency"] == "EUR"
+    assert rows[0]["price_usd"] == 100.0
+    assert rows[0]["price"] == 500.0
+    # O valor do anúncio em EUR é mantido junto com a moeda
+    assert rows[0]["price_original"] == 90.0
+
+
+def test_bulk_insert_price_history_writes_all_rows(db_session: Session):
+    product = Product(name="GPU", search_term="GPU")
+    db_session.add(product)
+    db_session.flush()
+
+    items = [{"price": float(i), "currency": "BRL", "source": "Amazon"} for i in range(1, 51)]
+    rows = build_price_rows(product.id, items, 5.0, RUN_TS)
+
+    count = bulk_insert_price_history(db_session, rows)
+    db_session.commit()
+
+    assert count == 50
+    assert db_session.query(PriceHistory).filter(PriceHistory.product_id == product.id).count() == 50
+
+
+def test_bulk_insert_price_history_empty_is_noop(db_session: Session):
+    assert bulk_insert_price_history(db_session, []) == 0
+
+
+def test_create_scrape_run_links_rows(db_session: Session):
+    product = Product(name="GPU", search_term="GPU")
+    db_session.add(product)
+    db_session.flush()
+
+    rows = build_price_rows(product.id, [{"price": 10.0, "currency": "BRL", "source": "Amazon"}], 5.0, RUN_TS)
+    run = create_scrape_run(db_session, RUN_TS, RUN_TS, products_count=1, items_count=len(rows))
+    for row in rows:
+        row["run_id"] = run.id
+    bulk_insert_price_history(db_session, rows)
+    db_session.commit()
+
+    saved_run = db_session.get(ScrapeRun, run.id)
+    assert saved_run.items_count == 1
+    assert [entry.product_id for entry in saved_run.history] == [product.id]
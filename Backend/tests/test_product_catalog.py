@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy.orm import Session
+from app.models.product import Product, ProductAlias
+from app.services.product_catalog import ProductCatalog
+
+
+def test_load_populates_cache_with_single_query(db_session: Session):
+    db_session.add_all([
+        Product(name="RTX 5090", search_term="NVIDIA RTX 5090 32GB"),
+        Product(name="Arc A770", search_term="Intel Arc A770 16GB"),
+    ])
+    db_session.flush()
+
+    assert ProductCatalog.load(db_session) == 2
+
+    product_id = ProductCatalog.get_id("NVIDIA RTX 5090 32GB")
+    assert product_id is not None
+    assert ProductCatalog.get_name(product_id) == "RTX 5090"
+    # Busca é insensível a caixa e espaços nas pontas
+    assert ProductCatalog.get_id("  intel arc a770 16gb ") is not None
+
+
+def test_ensure_creates_only_missing_products(db_session: Session):
+    db_session.add(Product(name="Existente", search_term="GPU A"))
+    db_session.flush()
+
+    ids = ProductCatalog.ensure(db_session, ["GPU A", "GPU B", "GPU C"])
+
+    assert set(ids) == {"GPU A", "GPU B", "GPU C"}
+    assert db_session.query(Product).count() == 3
+    # Produto existente mantém o nome original
+    assert ProductCatalog.get_name(ids["GPU A"]) == "Existente"
+
+    # Segunda chamada é idempotente (ON CONFLICT DO NOTHING)
+    assert ProductCatalog.ensure(db_session, ["GPU A", "GPU B", "GPU C"]) == ids
+    assert db_session.query(Product).count() == 3
+
+    # Produtos novos ganham aliases normalizados para o resolvedor
+    keys = {alias.normalized_key for alias in db_session.query(ProductAlias).all()}
+    assert keys == {"gpu b", "gpu c"}
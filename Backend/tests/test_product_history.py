@@ -1,50 +1,46 @@
 import pytest
-from unittest.mock import MagicMock
 from datetime import datetime, timezone, timedelta
 from fastapi.testclient import TestClient
-from app.main import app
-from app.api.endpoints.auth import get_db
-from app.models.product import Product, PriceHistory
-
-@pytest.fixture
-def mock_db_session():
-    """Cria um mock da sessão do banco de dados."""
-    return MagicMock()
-
-@pytest.fixture
-def client(mock_db_session):
-    """Cria um cliente de teste do FastAPI injetando o mock do banco."""
-    def override_get_db():
-        yield mock_db_session
-    
-    app.dependency_overrides[get_db] = override_get_db
-    client = TestClient(app)
-    yield client
-    app.dependency_overrides = {}
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models.product import Product, PriceHistory, ScrapeRun
+from app.services.history_service import get_history_points, get_history_points_batch
+from app.services.product_resolver import ProductResolver
 
-# --- Testes Unitários ---
+# --- Helpers ---
 
-def test_get_history_values_integrity(client, mock_db_session):
-    
-    # 1. Mock do Produto
-    mock_product = Product(id=1, name="RTX 5090", search_term="rtx 5090")
-    
-    # 2. Mock do Histórico (Item eBay)
-    mock_history_item = MagicMock(spec=PriceHistory)
-    mock_history_item.timestamp = datetime(2023, 10, 1, 12, 0, 0)
-    mock_history_item.source = "eBay"
-    mock_history_item.currency = "USD"
-    mock_history_item.price = 5500.00        # BRL no banco
-    mock_history_item.price_usd = 1000.00    # USD no banco
-    mock_history_item.exchange_rate = 5.5
-    
-    # Configura a query chain
-    mock_db_session.query.return_value.filter.return_value.first.return_value = mock_product
-    # A query do histórico (segunda query)
-    mock_history_query = mock_db_session.query.return_value.filter.return_value.filter.return_value.order_by.return_value
-    mock_history_query.all.return_value = [mock_history_item]
+def add_product(db: Session, name: str = "RTX 5090") -> Product:
+    product = Product(name=name, search_term=name.lower())
+    db.add(product)
+    db.flush()
+    ProductResolver.register(db, [(product.id, product.name, product.search_term)])
+    return product
+
+def add_price(db: Session, product: Product, ts: datetime, price: float, source: str = "eBay",
+              run: ScrapeRun = None, rate: float = 5.5):
+    db.add(PriceHistory(
+        product_id=product.id, run_id=run.id if run else None, timestamp=ts,
+        price=price, price_usd=round(price / rate, 2), currency="USD", source=source, exchange_rate=rate,
+    ))
+    db.flush()
+
+def add_run(db: Session, ts: datetime) -> ScrapeRun:
+    run = ScrapeRun(started_at=ts, finished_at=ts, products_count=1, items_count=0)
+    db.add(run)
+    db.flush()
+    return run
+
+def hours_ago(hours: float) -> datetime:
+    # Alinhado ao início da hora para os buckets serem previsíveis
+    base = datetime.now(timezone.utc).replace(minute=30, second=0, microsecond=0)
+    return base - timedelta(hours=hours)
+
+# --- Testes ---
+
+def test_get_history_values_integrity(client: TestClient, db_session: Session):
+    product = add_product(db_session)
+    add_price(db_session, product, hours_ago(1), 5500.00)
 
-    # 3. Execução
     response = client.get("/api/products/history?product_name=RTX 5090")
 
     assert response.status_code == 200
@@ -57,13 +53,12 @@ def test_get_history_values_integrity(client, mock_db_session):
     # Valida se os valores vieram puros do banco, sem conversões extras erradas na API
     assert item["price_brl"] == 5500.00
     assert item["price_usd"] == 1000.00
+    assert item["exchange_rate"] == 5.5
     assert item["source"] == "eBay"
 
 
-def test_get_history_product_not_found(client, mock_db_session):
+def test_get_history_product_not_found(client: TestClient, db_session: Session):
     """Busca por produto inexistente retorna lista vazia."""
-    mock_db_session.query.return_value.filter.return_value.first.return_value = None
-
     response = client.get("/api/products/history?product_name=PlacaFantasma")
 
     assert response.status_code == 200
@@ -72,18 +67,122 @@ def test_get_history_product_not_found(client, mock_db_session):
     assert data["history"] == []
 
 
-def test_get_history_date_filtering(client, mock_db_session):
-    """Verifica se o parâmetro period_days é processado corretamente."""
-    mock_product = Product(id=1, name="Test GPU", search_term="test gpu")
-    mock_db_session.query.return_value.filter.return_value.first.return_value = mock_product
-    
-    # Retorna lista vazia
-    mock_db_session.query.return_value.filter.return_value.filter.return_value.order_by.return_value.all.return_value = []
+def test_get_history_date_filtering(client: TestClient, db_session: Session):
+    """Pontos anteriores a period_days ficam de fora."""
+    product = add_product(db_session, "Test GPU")
+    add_price(db_session, product, hours_ago(24 * 10), 4000.0)
+    add_price(db_session, product, hours_ago(1), 5000.0)
 
     response = client.get("/api/products/history?product_name=Test GPU&period_days=7")
     
     assert response.status_code == 200
-    
-    # Verifica se filter foi chamado com a data correta (aproximada)
-    # A lógica exata de timestamp é difícil de mockar, mas garantimos que o fluxo rodou
-    assert mock_db_session.query.called
\ No newline at end of file
+    assert [point["price_brl"] for point in response.json()["history"]] == [5000.0]
+
+
+def test_history_groups_by_run_with_min_avg_max(db_session: Session):
+    product = add_product(db_session)
+    run = add_run(db_session, hours_ago(2))
+    for price in (5000.0, 6000.0, 7000.0):
+        add_price(db_session, product, hours_ago(2), price, run=run)
+    add_price(db_session, product, hours_ago(2), 4500.0, source="Amazon", run=run)
+    # Legado (sem run_id): agrupado por minuto
+    add_price(db_session, product, hours_ago(30), 3000.0)
+    add_price(db_session, product, hours_ago(30), 3500.0)
+
+    points = get_history_points(db_session, product.id, hours_ago(24 * 30), "run")
+
+    assert [(p["source"], p["price_brl"]) for p in points] == [
+        ("eBay", 3000.0), ("Amazon", 4500.0), ("eBay", 5000.0),
+    ]
+    ebay_run = points[2]
+    assert ebay_run["price_brl_avg"] == pytest.approx(6000.0)
+    assert ebay_run["price_brl_max"] == 7000.0
+    assert ebay_run["date"] == hours_ago(2).replace(tzinfo=None).isoformat()
+
+
+@pytest.mark.parametrize("granularity, expected_points", [("hour", 3), ("day", 2)])
+def test_history_granularity_controls_bucket_size(client: TestClient, db_session: Session,
+                                                  granularity, expected_points):
+    product = add_product(db_session)
+    now = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    # Dois pontos na mesma hora, um em outra hora do mesmo dia e um no dia anterior
+    for ts, price in [(now, 5000.0), (now + timedelta(minutes=20), 4000.0),
+                      (now + timedelta(hours=3), 4500.0), (now - timedelta(days=1), 6000.0)]:
+        add_price(db_session, product, ts, price, run=add_run(db_session, ts))
+
+    response = client.get(f"/api/products/history?product_name=RTX 5090&granularity={granularity}")
+
+    history = response.json()["history"]
+    assert len(history) == expected_points
+    assert min(point["price_brl"] for point in history) == 4000.0
+
+
+def test_history_rejects_unknown_granularity(client: TestClient, db_session: Session):
+    response = client.get("/api/products/history?product_name=RTX 5090&granularity=week")
+
+    assert response.status_code == 422
+
+
+def test_history_max_points_bounds_response_size(client: TestClient, db_session: Session):
+    product = add_product(db_session)
+    for hour in range(24 * 6):
+        add_price(db_session, product, hours_ago(hour) + timedelta(minutes=hour % 7), 5000.0 + hour)
+
+    full = client.get("/api/products/history?product_name=RTX 5090&granularity=hour&period_days=7").json()
+    limited = client.get("/api/products/history?product_name=RTX 5090&granularity=hour&period_days=7&max_points=20").json()
+
+    assert len(full["history"]) == 24 * 6
+    assert len(limited["history"]) == 20
+    assert limited["history"][0] == full["history"][0]
+    assert limited["history"][-1] == full["history"][-1]
+
+
+def test_history_batch_returns_series_keyed_by_requested_name(client: TestClient, db_session: Session):
+    rtx = add_product(db_session, "RTX 5090")
+    radeon = add_product(db_session, "RX 9070")
+    add_price(db_session, rtx, hours_ago(2), 10000.0)
+    add_price(db_session, radeon, hours_ago(3), 4000.0, source="Amazon")
+    add_price(db_session, radeon, hours_ago(1), 3900.0, source="Amazon")
+
+    response = client.get(
+        "/api/products/history/batch?product_names=RTX 5090&product_names=RX 9070&product_names=GTX 1080"
+    )
+    assert response.status_code == 200
+    products = response.json()["products"]
+
+    assert [p["price_brl"] for p in products["RTX 5090"]["history"]] == [10000.0]
+    assert [p["price_brl"] for p in products["RX 9070"]["history"]] == [4000.0, 3900.0]
+    assert products["GTX 1080"] == {"product_name": "GTX 1080", "history": []}
+
+    # Mesmo resultado que a rota de um produto só
+    single = client.get("/api/products/history?product_name=RX 9070").json()
+    assert products["RX 9070"] == single
+
+
+def test_history_batch_reads_all_products_in_one_query(db_session: Session):
+    products = [add_product(db_session, f"GPU {i}") for i in range(3)]
+    for i, product in enumerate(products):
+        add_price(db_session, product, hours_ago(1), 1000.0 * (i + 1))
+
+    statements = []
+    engine = db_session.get_bind()
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        points = get_history_points_batch(db_session, [p.id for p in products], hours_ago(24))
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    # Uma consulta para os preços de todos os produtos e uma para as cotações
+    assert len(statements) == 2
+    assert {pid: [pt["price_brl"] for pt in pts] for pid, pts in points.items()} == {
+        products[0].id: [1000.0], products[1].id: [2000.0], products[2].id: [3000.0],
+    }
+
+
+def test_history_batch_limits_number_of_products(client: TestClient, db_session: Session):
+    query = "&".join(f"product_names=GPU {i}" for i in range(25))
+    assert client.get(f"/api/products/history/batch?{query}").status_code == 422
@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy.orm import Session
+from app.models.product import Product, ProductAlias
+from app.services.product_resolver import ProductResolver, normalize_key
+
+
+def add_products(db: Session, *products):
+    objects = [Product(name=name, search_term=term) for name, term in products]
+    db.add_all(objects)
+    db.flush()
+    return objects
+
+
+def test_normalize_key_ignores_case_accents_and_punctuation():
+    assert normalize_key("  NVIDIA  RTX-5090 (32GB) ") == "nvidia rtx 5090 32gb"
+    assert normalize_key("Placa de Vídeo Ação") == "placa de video acao"
+
+
+def test_sync_creates_aliases_for_name_and_search_term(db_session: Session):
+    add_products(db_session, ("RTX 5090", "NVIDIA RTX 5090 32GB"))
+
+    ProductResolver.sync(db_session)
+
+    keys = {alias.normalized_key for alias in db_session.query(ProductAlias).all()}
+    assert keys == {"rtx 5090", "nvidia rtx 5090 32gb"}
+    # Rodar de novo não duplica
+    ProductResolver.sync(db_session)
+    assert db_session.query(ProductAlias).count() == 2
+
+
+def test_exact_and_partial_resolution_is_deterministic(db_session: Session):
+    rtx, ti = add_products(
+        db_session,
+        ("RTX 5090", "NVIDIA RTX 5090 32GB"),
+        ("RTX 5090 Ti", "NVIDIA RTX 5090 Ti 32GB"),
+    )
+    ProductResolver.sync(db_session)
+
+    assert ProductResolver.lookup("nvidia rtx-5090 32gb") == (rtx.id, "RTX 5090")
+    # Exato não aceita texto parcial
+    assert ProductResolver.lookup("5090") is None
+    # Parcial: a menor chave que contém o texto vence
+    assert ProductResolver.lookup("5090", partial=True) == (rtx.id, "RTX 5090")
+    assert ProductResolver.lookup("5090 ti", partial=True) == (ti.id, "RTX 5090 Ti")
+
+
+def test_resolve_falls_back_to_alias_table_on_memory_miss(db_session: Session):
+    rtx, = add_products(db_session, ("RTX 5090", "NVIDIA RTX 5090 32GB"))
+    ProductResolver.sync(db_session)
+    ProductResolver.clear()  # Ex.: aliases criados por outro worker
+
+    assert ProductResolver.resolve(db_session, "nvidia rtx-5090 32GB") == (rtx.id, "RTX 5090")
+    assert ProductResolver.resolve(db_session, "placa fantasma", partial=True) is None
+    # O resultado exato do banco passa a ficar em memória
+    assert ProductResolver.lookup("nvidia rtx 5090 32gb") == (rtx.id, "RTX 5090")
+
+
+def test_resolve_does_not_cache_partial_matches(db_session: Session):
+    rtx, = add_products(db_session, ("RTX 5090", "NVIDIA RTX 5090 32GB"))
+    ProductResolver.sync(db_session)
+    ProductResolver.clear()
+
+    assert ProductResolver.resolve(db_session, "5090 32gb", partial=True) == (rtx.id, "RTX 5090")
+    # Texto parcial não vira chave: a busca exata continua sem resultado
+    assert ProductResolver.lookup("5090 32gb") is None
+    assert ProductResolver.resolve(db_session, "5090 32gb") is None
+
+
+def test_add_alias(db_session: Session):
+    rtx, = add_products(db_session, ("RTX 5090", "NVIDIA RTX 5090 32GB"))
+    ProductResolver.sync(db_session)
+
+    assert ProductResolver.add_alias(db_session, rtx.id, "GeForce 5090") is True
+    assert ProductResolver.add_alias(db_session, rtx.id, "geforce-5090") is False
+    assert ProductResolver.lookup("GEFORCE 5090") == (rtx.id, "RTX 5090")
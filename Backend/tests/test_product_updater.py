@@ -1,13 +1,31 @@
 import pytest
+from datetime import datetime, timezone
 from unittest.mock import patch, MagicMock, ANY
 from sqlalchemy.orm import Session
 from app.services.product_updater import update_all_products, PRODUCTS_TO_MONITOR
 from app.models.product import PriceHistory, Product
+from app.models.exchange_rate import ExchangeRate
+from app.services.response_cache import ResponseCache
 
 # Helper para simular retorno de funções async
 async def async_return(value):
     return value
 
+def saved_rows(mock_db, table_name="price_history"):
+    """Linhas enviadas ao INSERT em lote da tabela informada."""
+    rows = []
+    for call in mock_db.execute.call_args_list:
+        if len(call.args) > 1 and call.args[0].table.name == table_name:
+            rows.extend(call.args[1])
+    return rows
+
+@pytest.fixture(autouse=True)
+def mock_catalog():
+    """Catálogo com todos os produtos monitorados já cadastrados."""
+    ids = {term: index + 1 for index, term in enumerate(PRODUCTS_TO_MONITOR)}
+    with patch("app.services.product_updater.ProductCatalog.ensure", return_value=ids) as mock_ensure:
+        yield mock_ensure
+
 @pytest.fixture
 def mock_db_session():
     """Mock da SessionLocal usada pelo updater."""
@@ -47,42 +65,55 @@ async def test_update_all_products_success(mock_db_session):
 
     # --- EXECUÇÃO COM PATCHES ---
     
+    version_before = ResponseCache.data_version()
     with patch("app.services.product_updater.SessionLocal", return_value=mock_db_session), \
-         patch("app.services.product_updater.CurrencyService.get_usd_to_brl", return_value=5.0), \
-         patch("app.services.product_updater.ebay_service.search_ebay_items", return_value=fake_results_ebay), \
-         patch("app.services.product_updater.amazon_service.search_amazon_items", return_value=fake_results_amazon):
+         patch("app.services.product_updater.CurrencyService.get_usd_to_brl_async", return_value=5.0), \
+         patch("app.services.product_updater.ebay_service.search_ebay_items_async", return_value=fake_results_ebay), \
+         patch("app.services.product_updater.amazon_service.search_amazon_items_async", return_value=fake_results_amazon):
 
         await update_all_products()
 
     # --- VALIDAÇÕES ---
     
-    added_objects = [call[0][0] for call in mock_db_session.add.call_args_list]
-    history_entries = [obj for obj in added_objects if isinstance(obj, PriceHistory)]
+    history_entries = saved_rows(mock_db_session)
 
     assert len(history_entries) > 0, "Nenhum histórico foi salvo!"
 
+    # Nenhum objeto PriceHistory é criado um a um: tudo vai no INSERT em lote
+    added_objects = [call[0][0] for call in mock_db_session.add.call_args_list]
+    assert not any(isinstance(obj, PriceHistory) for obj in added_objects)
+
     # 1. Validação do Item eBay (USD -> BRL)
-    ebay_entry = next((x for x in history_entries if x.source == "eBay"), None)
+    ebay_entry = next((x for x in history_entries if x["source"] == "eBay"), None)
     assert ebay_entry is not None
-    assert ebay_entry.currency == "USD"
-    assert ebay_entry.exchange_rate == 5.0
+    assert ebay_entry["currency"] == "USD"
+    # A cotação não é repetida em cada linha: vai para 'exchange_rates'
+    assert "exchange_rate" not in ebay_entry
     # Lógica Nova: price deve ser convertido para BRL (100 * 5.0 = 500)
-    assert ebay_entry.price == 500.00 
+    assert ebay_entry["price"] == 500.00 
     # Lógica Nova: price_usd deve ser mantido (100)
-    assert ebay_entry.price_usd == 100.00
+    assert ebay_entry["price_usd"] == 100.00
 
     # 2. Validação do Item Amazon (BRL -> USD)
-    amazon_entry = next((x for x in history_entries if x.source == "Amazon"), None)
+    amazon_entry = next((x for x in history_entries if x["source"] == "Amazon"), None)
     assert amazon_entry is not None
-    assert amazon_entry.currency == "BRL"
-    assert amazon_entry.exchange_rate == 5.0
+    assert amazon_entry["currency"] == "BRL"
     # Lógica Nova: price já é BRL, mantém (1000)
-    assert amazon_entry.price == 1000.00
+    assert amazon_entry["price"] == 1000.00
     # Lógica Nova: price_usd deve ser convertido (1000 / 5.0 = 200)
-    assert amazon_entry.price_usd == 200.00
+    assert amazon_entry["price_usd"] == 200.00
+
+    # Cotação usada registrada uma vez, para o dia da execução (efetivada no commit)
+    rates = [call.args[0] for call in mock_db_session.merge.call_args_list if isinstance(call.args[0], ExchangeRate)]
+    assert [(r.rate, r.day) for r in rates] == [(5.0, datetime.now(timezone.utc).date())]
 
-    # Verifica se fez commit
-    assert mock_db_session.commit.called
+    # Toda a execução cai numa única transação
+    assert mock_db_session.commit.call_count == 1
+    # O commit invalida o cache de respostas das rotas
+    assert ResponseCache.data_version() == version_before + 1
+    # Produtos resolvidos pelo catálogo, sem query por termo
+    mock_db_session.query.assert_not_called()
+    assert {row["product_id"] for row in history_entries} == set(range(1, len(PRODUCTS_TO_MONITOR) + 1))
 
 
 @pytest.mark.asyncio
@@ -95,17 +126,16 @@ async def test_update_all_products_api_error_handling(mock_db_session):
         raise Exception("API Connection Failed")
 
     with patch("app.services.product_updater.SessionLocal", return_value=mock_db_session), \
-         patch("app.services.product_updater.CurrencyService.get_usd_to_brl", return_value=5.0), \
-         patch("app.services.product_updater.ebay_service.search_ebay_items", side_effect=raise_error), \
-         patch("app.services.product_updater.amazon_service.search_amazon_items", side_effect=raise_error):
+         patch("app.services.product_updater.CurrencyService.get_usd_to_brl_async", return_value=5.0), \
+         patch("app.services.product_updater.ebay_service.search_ebay_items_async", side_effect=raise_error), \
+         patch("app.services.product_updater.amazon_service.search_amazon_items_async", side_effect=raise_error):
 
         # Não deve lançar exceção (o updater captura e loga)
         await update_all_products()
 
         # Verifica que tentou fazer commit dos Produtos criados (se não existiam),
         # mas não deve ter adicionado nenhum PriceHistory
-        added_objects = [call[0][0] for call in mock_db_session.add.call_args_list]
-        history_entries = [obj for obj in added_objects if isinstance(obj, PriceHistory)]
+        history_entries = saved_rows(mock_db_session)
         
         assert len(history_entries) == 0
 
@@ -114,12 +144,184 @@ async def test_update_all_products_api_error_handling(mock_db_session):
 async def test_update_all_products_currency_failure(mock_db_session):
 
     with patch("app.services.product_updater.SessionLocal", return_value=mock_db_session), \
-         patch("app.services.product_updater.CurrencyService.get_usd_to_brl", side_effect=Exception("Currency API Down")), \
-         patch("app.services.product_updater.ebay_service.search_ebay_items", return_value=[]), \
-         patch("app.services.product_updater.amazon_service.search_amazon_items", return_value=[]):
+         patch("app.services.product_updater.CurrencyService.get_usd_to_brl_async", side_effect=Exception("Currency API Down")), \
+         patch("app.services.product_updater.ebay_service.search_ebay_items_async", return_value=[]), \
+         patch("app.services.product_updater.amazon_service.search_amazon_items_async", return_value=[]):
 
         await update_all_products()
         
         # O comportamento esperado depende do seu catch block. 
         # Se for crítico, não salva nada.
-        assert mock_db_session.commit.call_count >= 0
\ No newline at end of file
+        assert mock_db_session.commit.call_count >= 0
+
+# ============================================================
+# TESTES DO FAN-OUT CONCORRENTE (fetch_all_sources)
+# ============================================================
+@pytest.mark.asyncio
+async def test_fetch_all_sources_runs_in_parallel():
+    """Todas as buscas (produto x fonte) rodam juntas: tempo ~ busca mais lenta."""
+    import asyncio
+    import time
+    from app.services.product_updater import fetch_all_sources
+
+    async def slow_ebay(term):
+        await asyncio.sleep(0.2)
+        return [{"price": 1.0, "currency": "USD", "source": "eBay", "title": term}]
+
+    async def slow_amazon(term):
+        await asyncio.sleep(0.2)
+        return [{"price": 2.0, "currency": "BRL", "source": "Amazon", "title": term}]
+
+    terms = [f"GPU {i}" for i in range(6)]
+
+    with patch("app.services.product_updater.ebay_service.search_ebay_items_async", new=slow_ebay), \
+         patch("app.services.product_updater.amazon_service.search_amazon_items_async", new=slow_amazon), \
+         patch("app.services.product_updater.settings.UPDATER_MAX_CONCURRENCY", 20), \
+         patch("app.services.product_updater.settings.UPDATER_EBAY_CONCURRENCY", 10), \
+         patch("app.services.product_updater.settings.UPDATER_AMAZON_CONCURRENCY", 10):
+
+        start = time.perf_counter()
+        results = await fetch_all_sources(terms)
+        elapsed = time.perf_counter() - start
+
+    # Sequencial levaria 12 x 0.2s = 2.4s
+    assert elapsed < 1.0
+    assert list(results.keys()) == terms
+    # Resultados mantêm a ordem das fontes (eBay antes da Amazon)
+    assert [item["source"] for item in results["GPU 0"]] == ["eBay", "Amazon"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_all_sources_respects_source_limit():
+    """O limite por fonte nunca é excedido e a falha de uma busca é isolada."""
+    import asyncio
+    from app.services.product_updater import fetch_all_sources
+
+    running = {"now": 0, "max": 0}
+
+    async def tracked_ebay(term):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.05)
+        running["now"] -= 1
+        if term == "GPU 1":
+            raise Exception("Timeout")
+        return [{"price": 1.0, "currency": "USD", "source": "eBay"}]
+
+    async def empty_amazon(term):
+        return []
+
+    terms = [f"GPU {i}" for i in range(8)]
+
+    with patch("app.services.product_updater.ebay_service.search_ebay_items_async", new=tracked_ebay), \
+         patch("app.services.product_updater.amazon_service.search_amazon_items_async", new=empty_amazon), \
+         patch("app.services.product_updater.settings.UPDATER_EBAY_CONCURRENCY", 2):
+
+        results = await fetch_all_sources(terms)
+
+    assert running["max"] == 2
+    assert results["GPU 1"] == []
+    assert len(results["GPU 0"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_saturated_source_does_not_hold_global_slots():
+    """Buscas esperando uma fonte lenta não ocupam o limite global das outras fontes."""
+    import asyncio
+    import time
+    from app.services.product_updater import fetch_all_sources
+
+    amazon_done = []
+
+    async def slow_ebay(term):
+        await asyncio.sleep(0.1)
+        return []
+
+    async def fast_amazon(term):
+        amazon_done.append(time.perf_counter())
+        return []
+
+    terms = [f"GPU {i}" for i in range(4)]
+
+    with patch("app.services.product_updater.ebay_service.search_ebay_items_async", new=slow_ebay), \
+         patch("app.services.product_updater.amazon_service.search_amazon_items_async", new=fast_amazon), \
+         patch("app.services.product_updater.settings.UPDATER_MAX_CONCURRENCY", 2), \
+         patch("app.services.product_updater.settings.UPDATER_EBAY_CONCURRENCY", 1):
+
+        start = time.perf_counter()
+        await fetch_all_sources(terms)
+
+    # A Amazon termina sem esperar a fila do eBay (4 x 0.1s)
+    assert len(amazon_done) == 4
+    assert max(amazon_done) - start < 0.1
+
+
+# ============================================================
+# TESTES DO REFRESH DIRECIONADO (refresh_product)
+# ============================================================
+@pytest.mark.asyncio
+async def test_refresh_product_coalesces_concurrent_requests():
+    """N requisições simultâneas para o mesmo termo compartilham UMA busca."""
+    import asyncio
+    from app.services.product_updater import refresh_product
+
+    calls = []
+
+    async def fake_update(terms):
+        calls.append(terms)
+        await asyncio.sleep(0.05)
+        return True
+
+    term = PRODUCTS_TO_MONITOR[0]
+    # Grafias diferentes do mesmo produto (normalizadas como no resolver)
+    spellings = [term, term.lower(), term.upper(), term.replace(" ", "-"), f"  {term}  "]
+    with patch("app.services.product_updater.update_products", side_effect=fake_update):
+        results = await asyncio.gather(*(refresh_product(q, timeout=1) for q in spellings))
+
+    assert results == [True] * 5
+    # Apenas o termo monitorado, e uma única vez
+    assert calls == [[term]]
+
+
+@pytest.mark.asyncio
+async def test_refresh_product_reports_failed_update():
+    """Falha na gravação: o refresh retorna False em vez de fingir sucesso."""
+    from app.services.product_updater import refresh_product
+
+    with patch("app.services.product_updater.CurrencyService.get_usd_to_brl_async", return_value=5.0), \
+         patch("app.services.product_updater.fetch_all_sources", return_value={}), \
+         patch("app.services.product_updater.SessionLocal", side_effect=Exception("DB offline")), \
+         patch("app.services.product_updater.settings.ASYNC_DB_ENABLED", False):
+        assert await refresh_product(PRODUCTS_TO_MONITOR[0], timeout=1) is False
+
+
+@pytest.mark.asyncio
+async def test_refresh_product_respects_latency_budget():
+    """Estourado o orçamento, retorna False mas a busca continua em segundo plano."""
+    import asyncio
+    from app.services.product_updater import refresh_product, _inflight_refreshes
+
+    finished = asyncio.Event()
+
+    async def slow_update(terms):
+        await asyncio.sleep(0.2)
+        finished.set()
+
+    term = PRODUCTS_TO_MONITOR[1]
+    with patch("app.services.product_updater.update_products", side_effect=slow_update):
+        assert await refresh_product(term, timeout=0.01) is False
+        assert term in _inflight_refreshes
+
+        await asyncio.wait_for(finished.wait(), 1)
+        await asyncio.sleep(0)
+
+    assert term not in _inflight_refreshes
+
+
+@pytest.mark.asyncio
+async def test_refresh_product_ignores_unmonitored_terms():
+    from app.services.product_updater import refresh_product
+
+    with patch("app.services.product_updater.update_products") as mock_update:
+        assert await refresh_product("Produto Desconhecido", timeout=1) is False
+        mock_update.assert_not_called()
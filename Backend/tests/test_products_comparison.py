@@ -1,185 +1,172 @@
 import pytest
-from unittest.mock import MagicMock, AsyncMock, patch
+from unittest.mock import AsyncMock, patch
+from datetime import datetime, timedelta, timezone
 from fastapi.testclient import TestClient
-from datetime import datetime, timezone
-from app.main import app
-from app.models.product import Product, PriceHistory
-from app.api.endpoints.auth import get_db
-
-client = TestClient(app)
+from sqlalchemy.orm import Session
+from app.models.product import Product, PriceHistory, ScrapeRun, LatestOffers
+from app.services.offers_service import build_offers
+from app.services.response_cache import ResponseCache
 
 # ===============================
-# HELPERS PARA MOCKS DE QUERY
+# HELPERS PARA DADOS DE TESTE
 # ===============================
 
-def make_single_timestamp_query_mock(ts):
-    """
-    Mock da query que busca o último registro de timestamp:
-    db.query(PriceHistory.timestamp).order_by(desc()).first()
-    """
-    mock_query = MagicMock()
-    mock_filter = MagicMock()
-    mock_order = MagicMock()
-    
-    # Configura a corrente: query.filter(...).order_by(...).first()
-    mock_query.filter.return_value = mock_filter
-    mock_filter.order_by.return_value = mock_order
-    
-    # O endpoint espera uma tupla (timestamp,) ou None se não achar nada
-    mock_order.first.return_value = (ts,) if ts else None
-    
-    return mock_query
-
-def make_history_batch_query_mock(history_items):
-    """
-    Mock da query que pega o lote de histórico (comparison):
-    db.query(PriceHistory).filter(...).filter(...).order_by(...).all()
-    """
-    mock_query = MagicMock()
-    mock_filter_1 = MagicMock()
-    mock_filter_2 = MagicMock()
-    mock_order = MagicMock()
-
-    # Simula a corrente: query.filter(...).filter(...).order_by(...).all()
-    mock_query.filter.return_value = mock_filter_1
-    mock_filter_1.filter.return_value = mock_filter_2
-    mock_filter_2.order_by.return_value = mock_order
-    mock_order.all.return_value = history_items
-
-    return mock_query
+def add_product(db: Session, term: str) -> Product:
+    product = Product(name=term, search_term=term)
+    db.add(product)
+    db.flush()
+    return product
+
+def add_run(db: Session, product: Product, ts: datetime, items: list) -> ScrapeRun:
+    """Cria uma execução do updater com os preços informados."""
+    run = ScrapeRun(started_at=ts, finished_at=ts, products_count=1, items_count=len(items))
+    db.add(run)
+    db.flush()
+    for item in items:
+        db.add(PriceHistory(product_id=product.id, run_id=run.id, timestamp=ts, **item))
+    db.flush()
+    return run
+
+def ebay_item(price_usd: float, title: str = "RTX 5090") -> dict:
+    return dict(
+        price=price_usd * 5.0, price_usd=price_usd, currency="USD", source="eBay",
+        link="http://e.com", exchange_rate=5.0, original_title=title,
+        seller_name="Seller", seller_rating=5.0,
+    )
+
+def amazon_item(price_brl: float, title: str = "RTX 5090") -> dict:
+    return dict(
+        price=price_brl, price_usd=round(price_brl / 5.0, 2), currency="BRL", source="Amazon",
+        link="http://a.com", exchange_rate=5.0, original_title=title,
+        seller_name="Amazon BR",
+    )
+
+
+@pytest.fixture
+def mock_rate():
+    ts_now = datetime.now(timezone.utc)
+    with patch("app.services.currency_service.CurrencyService.get_usd_to_brl_async", return_value=5.0), \
+         patch("app.services.currency_service.CurrencyService.get_last_update_timestamp", return_value=ts_now):
+        yield
 
 
 # ============================================================
 # TESTE 1: Produto existe E possui histórico recente → NÃO deve atualizar
 # ============================================================
-@pytest.mark.asyncio
-async def test_comparison_returns_cached_results():
-    mock_db = MagicMock()
+def test_comparison_returns_cached_results(client: TestClient, db_session: Session, mock_rate):
+    product = add_product(db_session, "RTX 5090")
+    add_run(db_session, product, datetime.now(timezone.utc), [ebay_item(2000)])
 
-    # Dados Mockados (Timestamp RECENTE para evitar update)
-    ts_now = datetime.now(timezone.utc)
-    product = Product(id=1, name="RTX 5090", search_term="RTX 5090")
-    
-    # CRÍTICO: Mockar o relationship history para não disparar query real
-    product.history = []  # será preenchido com o item abaixo
-
-    history_ebay = PriceHistory(
-        id=1, product_id=1, price=10000, currency="BRL",
-        source="eBay", link="http://e.com", timestamp=ts_now,
-        exchange_rate=5.0, price_usd=2000,
-        original_title="RTX 5090", seller_name="Seller", seller_rating=5.0
-    )
-    
-    # Agora sim: product tem histórico!
-    product.history = [history_ebay]  # ← ESSA LINHA FAZ O TESTE PASSAR
+    with patch("app.api.endpoints.products.refresh_product", new=AsyncMock()) as mock_update:
+        response = client.get("/api/products/comparison?q=RTX 5090")
+        data = response.json()
+
+        assert response.status_code == 200
+        mock_update.assert_not_called()
+        assert data["overall_best_deal"]["price_brl"] == 10000.0
+
+
+# ============================================================
+# TESTE 2: Produto não existe → DEVE atualizar
+# ============================================================
+def test_comparison_triggers_update_for_missing_product(client: TestClient, mock_rate):
+    with patch("app.api.endpoints.products.refresh_product", new=AsyncMock()) as mock_update:
+        client.get("/api/products/comparison?q=RTX A6000")
 
-    # Mocks de query
-    mock_product_query = MagicMock()
-    mock_product_query.filter.return_value.first.return_value = product
+        # TESTE CRÍTICO: Se não achou produto, DEVE atualizar só o termo buscado
+        mock_update.assert_awaited()
+        assert mock_update.await_args.args[0] == "RTX A6000"
 
-    mock_timestamp_query = make_single_timestamp_query_mock(ts_now)
-    mock_batch_query = make_history_batch_query_mock([history_ebay])
 
-    def query_side_effect(*args, **kwargs):
-        queried = args[0]
-        if queried is Product:
-            return mock_product_query
-        if queried is PriceHistory:
-            return mock_batch_query
-        if str(queried).endswith('.timestamp'):
-            return mock_timestamp_query
-        return MagicMock()
+# ============================================================
+# TESTE 3: Produto existe MAS sem histórico → DEVE atualizar
+# ============================================================
+def test_comparison_triggers_update_when_no_history(client: TestClient, db_session: Session, mock_rate):
+    add_product(db_session, "RTX 9000")
 
-    mock_db.query.side_effect = query_side_effect
+    with patch("app.api.endpoints.products.refresh_product", new=AsyncMock()) as mock_update:
+        client.get("/api/products/comparison?q=RTX 9000")
 
-    app.dependency_overrides[get_db] = lambda: mock_db
+        # TESTE CRÍTICO: Produto sem histórico -> Update
+        mock_update.assert_awaited()
 
-    try:
-        with patch("app.api.endpoints.products.update_all_products", new=AsyncMock()) as mock_update, \
-             patch("app.services.currency_service.CurrencyService.get_usd_to_brl", return_value=5.0), \
-             patch("app.services.currency_service.CurrencyService.get_last_update_timestamp", return_value=ts_now):
 
-            response = client.get("/api/products/comparison?q=RTX 5090")
-            data = response.json()
+# ============================================================
+# TESTE 4: Só o último run é retornado, mesmo se as execuções estiverem próximas
+# ============================================================
+def test_comparison_uses_only_latest_run(client: TestClient, db_session: Session, mock_rate):
+    product = add_product(db_session, "RTX 5090")
+    ts = datetime.now(timezone.utc)
+    # Execução anterior terminou 1 minuto antes (cairia na antiga janela de 2 minutos)
+    add_run(db_session, product, ts - timedelta(minutes=1), [ebay_item(1000, "Antigo")])
+    add_run(db_session, product, ts, [ebay_item(2000), amazon_item(9000)])
 
-            assert response.status_code == 200
-            mock_update.assert_not_called()  # ← AGORA PASSA!
-            assert data["overall_best_deal"]["price_brl"] == 10000.0
+    response = client.get("/api/products/comparison?q=RTX 5090")
+    data = response.json()
 
-    finally:
-        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    titles = [item["title"] for items in data["results_by_source"].values() for item in items]
+    assert "Antigo" not in titles
+    assert len(data["results_by_source"]["ebay"]) == 1
+    assert len(data["results_by_source"]["amazon"]) == 1
+    # Amazon (R$ 9000) é mais barata que o eBay (US$ 2000 * 5 = R$ 10000)
+    assert data["overall_best_deal"]["source"] == "Amazon"
 
 
 # ============================================================
-# TESTE 2: Produto não existe → DEVE atualizar
+# TESTE 5: Registros legados (sem run_id) ainda usam a janela de tempo
 # ============================================================
-@pytest.mark.asyncio
-async def test_comparison_triggers_update_for_missing_product():
-    mock_db = MagicMock()
-    
-    # Produto não existe na primeira chamada
-    mock_product_query = MagicMock()
-    mock_product_query.filter.return_value.first.return_value = None
-    
-    # Como o produto é a primeira coisa consultada, se retornar None ele já dispara o update.
-    mock_db.query.return_value = mock_product_query
-
-    app.dependency_overrides[get_db] = lambda: mock_db
-
-    try:
-        with patch("app.api.endpoints.products.update_all_products", new=AsyncMock()) as mock_update, \
-             patch("app.services.currency_service.CurrencyService.get_usd_to_brl", return_value=5.0), \
-             patch("app.services.currency_service.CurrencyService.get_last_update_timestamp", return_value=None):
-
-            # Faz a requisição
-            client.get("/api/products/comparison?q=RTX A6000")
-            
-            # TESTE CRÍTICO: Se não achou produto, DEVE chamar o update
-            mock_update.assert_awaited()
-
-    finally:
-        app.dependency_overrides = {}
+def test_comparison_legacy_rows_without_run(client: TestClient, db_session: Session, mock_rate):
+    product = add_product(db_session, "RTX 5090")
+    ts = datetime.now(timezone.utc)
+    db_session.add(PriceHistory(product_id=product.id, timestamp=ts - timedelta(hours=12), **ebay_item(1500, "Velho")))
+    db_session.add(PriceHistory(product_id=product.id, timestamp=ts, **ebay_item(2000)))
+    db_session.flush()
+
+    with patch("app.api.endpoints.products.refresh_product", new=AsyncMock()) as mock_update:
+        data = client.get("/api/products/comparison?q=RTX 5090").json()
+
+    mock_update.assert_not_called()
+    assert [item["title"] for item in data["results_by_source"]["ebay"]] == ["RTX 5090"]
 
 
 # ============================================================
-# TESTE 3: Produto existe MAS sem histórico → DEVE atualizar
+# TESTE 6: Snapshot 'latest_offers' é lido diretamente (sem price_history)
 # ============================================================
-@pytest.mark.asyncio
-async def test_comparison_triggers_update_when_no_history():
-    mock_db = MagicMock()
-    ts_now = datetime.now(timezone.utc)
+def test_comparison_reads_latest_offers_snapshot(client: TestClient, db_session: Session, mock_rate):
+    product = add_product(db_session, "RTX 5090")
+    rows = [ebay_item(2000), amazon_item(9000)]
+    for row in rows:
+        row["timestamp"] = datetime.now(timezone.utc)
+    # Snapshot montado com a cotação da execução (4.0); a rota reprecifica com a atual (5.0)
+    db_session.add(LatestOffers(product_id=product.id, offers=build_offers(rows, "RTX 5090", 4.0)))
+    db_session.flush()
+
+    with patch("app.api.endpoints.products.refresh_product", new=AsyncMock()) as mock_update:
+        data = client.get("/api/products/comparison?q=RTX 5090").json()
+
+    mock_update.assert_not_called()
+    assert data["results_by_source"]["ebay"][0]["price_brl"] == 10000.0
+    assert data["overall_best_deal"]["source"] == "Amazon"
 
-    # 1. Produto existe
-    product = Product(id=3, name="RTX 9000", search_term="RTX 9000")
-    mock_product_query = MagicMock()
-    mock_product_query.filter.return_value.first.return_value = product
-    
-    # 2. Mas histórico (timestamp query) retorna None (sem dados)
-    mock_timestamp_query = make_single_timestamp_query_mock(None)
-
-    def query_side_effect(*args):
-        model_or_column = args[0]
-        if model_or_column is Product: 
-            return mock_product_query
-        
-        # Detecta query da coluna timestamp
-        if hasattr(model_or_column, 'key') and model_or_column.key == 'timestamp': 
-            return mock_timestamp_query
-            
-        return MagicMock()
-
-    mock_db.query.side_effect = query_side_effect
-    app.dependency_overrides[get_db] = lambda: mock_db
-
-    try:
-        with patch("app.api.endpoints.products.update_all_products", new=AsyncMock()) as mock_update, \
-             patch("app.services.currency_service.CurrencyService.get_usd_to_brl", return_value=5.0), \
-             patch("app.services.currency_service.CurrencyService.get_last_update_timestamp", return_value=ts_now):
-
-            client.get("/api/products/comparison?q=RTX 9000")
-            
-            # TESTE CRÍTICO: Produto sem histórico -> Update
-            mock_update.assert_awaited()
-
-    finally:
-        app.dependency_overrides = {}
\ No newline at end of file
+
+# ============================================================
+# TESTE 7: Resposta em cache até o updater gravar uma nova execução
+# ============================================================
+def test_comparison_served_from_response_cache_until_new_run(client: TestClient, db_session: Session, mock_rate):
+    product = add_product(db_session, "RTX 5090")
+    add_run(db_session, product, datetime.now(timezone.utc), [ebay_item(2000)])
+
+    first = client.get("/api/products/comparison?q=RTX 5090").json()
+
+    # Nova execução gravada SEM avisar o cache: a resposta anterior continua valendo
+    add_run(db_session, product, datetime.now(timezone.utc), [ebay_item(1000)])
+    with patch("app.api.endpoints.products.run_db") as mock_run_db:
+        cached = client.get("/api/products/comparison?q=RTX 5090").json()
+    mock_run_db.assert_not_called()
+    assert cached == first
+
+    # O updater incrementa a versão ao fazer commit → a próxima leitura vai ao banco
+    ResponseCache.bump_version()
+    fresh = client.get("/api/products/comparison?q=RTX 5090").json()
+    assert fresh["overall_best_deal"]["price_brl"] == 5000.0
@@ -0,0 +1,81 @@
+import threading
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services.rate_matrix import RateMatrix
+
+
+def _frankfurter_response(rates):
+    response = MagicMock()
+    response.json.return_value = {"amount": 1.0, "base": "USD", "rates": rates}
+    return response
+
+
+def test_convert_mixed_currency_batch():
+    RateMatrix.load({"USD": 1.0, "EUR": 0.5, "GBP": 0.25, "BRL": 5.0})
+
+    amounts = [10.0, 10.0, 10.0, 10.0, 10.0]
+    currencies = ["USD", "EUR", "GBP", "BRL", "XYZ"]
+
+    to_usd = RateMatrix.convert(amounts, currencies, "USD")
+    to_brl = RateMatrix.convert(amounts, currencies, "BRL")
+
+    assert to_usd[:4].tolist() == pytest.approx([10.0, 20.0, 40.0, 2.0])
+    assert to_brl[:4].tolist() == pytest.approx([50.0, 100.0, 200.0, 10.0])
+    assert np.isnan(to_usd[4]) and np.isnan(to_brl[4])  # moeda sem cotação
+
+
+def test_matrix_is_consistent_across_pairs():
+    RateMatrix.load({"USD": 1.0, "EUR": 0.9, "CAD": 1.35})
+
+    # EUR -> CAD direto == EUR -> USD -> CAD
+    direct = RateMatrix.convert([100.0], ["EUR"], "CAD")[0]
+    via_usd = RateMatrix.convert(RateMatrix.convert([100.0], ["EUR"], "USD"), ["USD"], "CAD")[0]
+    assert direct == pytest.approx(via_usd)
+    assert RateMatrix._state[2].shape == (3, 3)
+
+
+def test_convert_never_mixes_old_and_new_rates():
+    small = {"USD": 1.0, "EUR": 0.5}
+    large = {"USD": 1.0, "AUD": 1.5, "BRL": 5.0, "EUR": 0.25, "GBP": 0.8}
+    RateMatrix.load(small)
+    stop = threading.Event()
+
+    def reload():
+        while not stop.is_set():
+            RateMatrix.load(large)
+            RateMatrix.load(small)
+
+    loader = threading.Thread(target=reload)
+    loader.start()
+    try:
+        # Cada conversão usa uma matriz inteira: a antiga ou a nova
+        results = {float(RateMatrix.convert([10.0], ["EUR"], "USD")[0]) for _ in range(5000)}
+    finally:
+        stop.set()
+        loader.join()
+    assert results <= {20.0, 40.0}
+
+
+def test_ensure_fetches_all_currencies_in_one_call():
+    response = _frankfurter_response({"EUR": 0.9, "GBP": 0.8, "CAD": 1.35})
+    with patch("app.services.rate_matrix.requests.get", return_value=response) as mock_get:
+        assert RateMatrix.ensure({"EUR", "GBP", "CAD", "USD"})
+        # Já em cache: nenhuma nova chamada
+        assert RateMatrix.ensure({"EUR", "GBP"})
+
+    assert mock_get.call_count == 1
+    assert mock_get.call_args.kwargs["params"] == {"from": "USD", "to": "CAD,EUR,GBP"}
+
+
+def test_ensure_usd_only_needs_no_call():
+    with patch("app.services.rate_matrix.requests.get") as mock_get:
+        assert RateMatrix.ensure({"USD"})
+    mock_get.assert_not_called()
+
+
+def test_ensure_failure_leaves_currency_unconvertible():
+    with patch("app.services.rate_matrix.requests.get", side_effect=Exception("offline")):
+        assert RateMatrix.ensure({"EUR"}) is False
+
+    assert np.isnan(RateMatrix.convert([10.0], ["EUR"], "USD")[0])
@@ -0,0 +1,42 @@
+import pytest
+from unittest.mock import patch
+from app.services.response_cache import ResponseCache
+
+
+def test_get_returns_cached_body():
+    version = ResponseCache.data_version()
+    ResponseCache.set(("history", "RTX 5090", 30), b'{"ok": true}', version)
+
+    assert ResponseCache.get(("history", "RTX 5090", 30)) == b'{"ok": true}'
+    assert ResponseCache.get(("history", "RTX 5090", 7)) is None
+
+
+def test_bump_version_invalidates_entries():
+    ResponseCache.set("key", b"old", ResponseCache.data_version())
+
+    ResponseCache.bump_version()
+
+    assert ResponseCache.get("key") is None
+
+
+def test_set_ignores_body_computed_with_stale_version():
+    # Resposta calculada antes de um commit do updater não deve entrar no cache
+    version = ResponseCache.data_version()
+    ResponseCache.bump_version()
+
+    ResponseCache.set("key", b"stale", version)
+
+    assert ResponseCache.get("key") is None
+
+
+def test_lru_evicts_least_recently_used():
+    version = ResponseCache.data_version()
+    with patch("app.services.response_cache.settings.RESPONSE_CACHE_MAX_ENTRIES", 2):
+        ResponseCache.set("a", b"1", version)
+        ResponseCache.set("b", b"2", version)
+        ResponseCache.get("a")              # 'a' passa a ser o mais recente
+        ResponseCache.set("c", b"3", version)
+
+    assert ResponseCache.get("a") == b"1"
+    assert ResponseCache.get("b") is None
+    assert ResponseCache.get("c") == b"3"
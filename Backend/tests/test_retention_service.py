@@ -0,0 +1,103 @@
+import pytest
+from datetime import date, datetime
+from unittest.mock import patch
+from sqlalchemy.orm import Session
+from app.db import partitioning
+from app.models.product import Product, PriceHistory, PriceHistoryDaily
+from app.services.history_service import get_history_points
+from app.services.retention_service import apply_retention, retention_cutoff
+from app.services.rollup_service import backfill_rollups
+
+TODAY = date(2025, 3, 15)
+
+
+def add_price(db: Session, product: Product, ts: datetime, price: float, source: str = "eBay"):
+    db.add(PriceHistory(
+        product_id=product.id, timestamp=ts, price=price, price_usd=price / 5.0,
+        currency="USD", source=source, exchange_rate=5.0,
+    ))
+    db.flush()
+
+
+def test_retention_cutoff_is_month_aligned():
+    with patch("app.services.retention_service.settings.PRICE_HISTORY_RETENTION_MONTHS", 12):
+        assert retention_cutoff(TODAY) == datetime(2024, 3, 1)
+    with patch("app.services.retention_service.settings.PRICE_HISTORY_RETENTION_MONTHS", 0):
+        assert retention_cutoff(TODAY) is None
+
+
+def test_apply_retention_rolls_up_then_deletes_old_rows(db_session: Session, product: Product):
+    # Dois preços no mesmo dia antigo, um em outro dia antigo e um recente
+    add_price(db_session, product, datetime(2024, 1, 10, 3, 0), 5000.0)
+    add_price(db_session, product, datetime(2024, 1, 10, 15, 0), 6000.0)
+    add_price(db_session, product, datetime(2024, 2, 20, 3, 0), 5500.0)
+    add_price(db_session, product, datetime(2025, 3, 1, 3, 0), 4000.0)
+
+    with patch("app.services.retention_service.settings.PRICE_HISTORY_RETENTION_MONTHS", 12):
+        result = apply_retention(db_session, TODAY)
+
+    assert result == {"rolled_up_days": 2, "dropped_partitions": 0, "deleted_rows": 3}
+    assert [h.price for h in db_session.query(PriceHistory).all()] == [4000.0]
+
+    daily = db_session.query(PriceHistoryDaily).order_by(PriceHistoryDaily.day).all()
+    assert [(d.day, d.min_price, d.max_price, d.price_count) for d in daily] == [
+        (date(2024, 1, 10), 5000.0, 6000.0, 2),
+        (date(2024, 2, 20), 5500.0, 5500.0, 1),
+    ]
+    assert daily[0].sum_price_usd == pytest.approx(2200.0)
+
+
+def test_retention_is_off_by_default():
+    from app.core.config import Settings
+    assert Settings.model_fields["PRICE_HISTORY_RETENTION_MONTHS"].default == 0
+
+
+def test_apply_retention_keeps_rows_without_daily_rollup(db_session: Session, product: Product):
+    add_price(db_session, product, datetime(2024, 1, 10, 3, 0), 5000.0)
+
+    # Backfill que não grava nada: os dias antigos ficariam sem agregado
+    with patch("app.services.retention_service.settings.PRICE_HISTORY_RETENTION_MONTHS", 12), \
+         patch("app.services.retention_service.backfill_rollups", return_value=0):
+        result = apply_retention(db_session, TODAY)
+
+    assert result == {"rolled_up_days": 0, "dropped_partitions": 0, "deleted_rows": 0}
+    assert db_session.query(PriceHistory).count() == 1
+
+
+def test_history_reads_rollups_before_cutoff(db_session: Session, product: Product):
+    add_price(db_session, product, datetime(2024, 1, 10, 3, 0), 5000.0)
+    add_price(db_session, product, datetime(2024, 1, 10, 15, 0), 6000.0)
+    add_price(db_session, product, datetime(2025, 3, 1, 3, 0), 4000.0)
+    # Agregados diários (no dia a dia, mantidos pelo updater)
+    backfill_rollups(db_session, PriceHistoryDaily)
+
+    with patch("app.services.retention_service.settings.PRICE_HISTORY_RETENTION_MONTHS", 12), \
+         patch("app.services.retention_service.datetime") as mock_datetime:
+        mock_datetime.side_effect = datetime
+        mock_datetime.now.return_value = datetime(2025, 3, 15)
+        apply_retention(db_session, TODAY)
+        points = get_history_points(db_session, product.id, datetime(2023, 12, 1))
+
+    assert [(p["date"], p["price_brl"]) for p in points] == [
+        ("2024-01-10T00:00:00", 5000.0),
+        ("2025-03-01T00:00:00", 4000.0),
+    ]
+    assert points[0]["price_brl_avg"] == 5500.0
+    assert points[0]["price_brl_max"] == 6000.0
+
+
+def test_partition_helpers():
+    assert partitioning.add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert partitioning.add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert partitioning.partition_name(date(2024, 5, 1)) == "price_history_p202405"
+    assert partitioning.partition_month("price_history_p202405") == date(2024, 5, 1)
+
+
+def test_partitioned_ddl_matches_model():
+    ddl = partitioning.partitioned_table_ddl()
+
+    for column in PriceHistory.__table__.columns:
+        assert f'"{column.name}"' in ddl
+    assert 'PRIMARY KEY ("id", "timestamp")' in ddl
+    assert 'REFERENCES products ("id")' in ddl
+    assert ddl.endswith('PARTITION BY RANGE ("timestamp")')
@@ -0,0 +1,111 @@
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy.orm import Session
+from app.models.product import Product, PriceHistory, PriceHistoryDaily, PriceHistoryHourly
+from app.services.history_service import get_history_points
+from app.services.exchange_rate_history import record_rate
+from app.services.rollup_service import backfill_empty_rollups, backfill_rollups, update_rollups
+
+
+def price_row(product_id: int, ts: datetime, price: float, source: str = "eBay", rate: float = 5.0) -> dict:
+    return {
+        "product_id": product_id, "timestamp": ts, "price": price,
+        "price_usd": price / rate, "source": source, "exchange_rate": rate,
+    }
+
+
+def test_update_rollups_merges_runs_incrementally(db_session: Session, product: Product):
+    morning = datetime(2025, 3, 1, 3, 0, tzinfo=timezone.utc)
+    afternoon = datetime(2025, 3, 1, 15, 0, tzinfo=timezone.utc)
+
+    update_rollups(db_session, [price_row(product.id, morning, 5000.0), price_row(product.id, morning, 6000.0)])
+    update_rollups(db_session, [price_row(product.id, afternoon, 4000.0, rate=6.0)])
+    db_session.expire_all()
+
+    daily = db_session.query(PriceHistoryDaily).one()
+    assert daily.day == date(2025, 3, 1)
+    assert (daily.min_price, daily.max_price, daily.sum_price, daily.price_count) == (4000.0, 6000.0, 15000.0, 3)
+    assert (daily.first_price, daily.last_price) == (5000.0, 4000.0)
+    assert daily.last_at == datetime(2025, 3, 1, 15, 0)
+    # Cotação média ponderada pela quantidade de preços: (5*2 + 6*1) / 3
+    assert daily.exchange_rate == pytest.approx(16 / 3)
+
+    hourly = db_session.query(PriceHistoryHourly).order_by(PriceHistoryHourly.hour).all()
+    assert [(h.hour, h.price_count) for h in hourly] == [
+        (datetime(2025, 3, 1, 3, 0), 2),
+        (datetime(2025, 3, 1, 15, 0), 1),
+    ]
+
+
+def test_rollups_take_rate_of_their_day_from_exchange_rates(db_session: Session, product: Product):
+    record_rate(db_session, 5.10, datetime(2025, 3, 1, 3, 0, tzinfo=timezone.utc))
+    record_rate(db_session, 5.30, datetime(2025, 3, 3, 3, 0, tzinfo=timezone.utc))
+    rows = [
+        {**price_row(product.id, datetime(2025, 3, day, 12, 0, tzinfo=timezone.utc), 5000.0), "exchange_rate": None}
+        for day in (2, 3)
+    ]
+
+    update_rollups(db_session, rows)
+    db_session.expire_all()
+
+    daily = db_session.query(PriceHistoryDaily).order_by(PriceHistoryDaily.day).all()
+    assert [d.exchange_rate for d in daily] == [5.10, 5.30]
+    hourly = db_session.query(PriceHistoryHourly).order_by(PriceHistoryHourly.hour).all()
+    assert [h.exchange_rate for h in hourly] == [5.10, 5.30]
+
+
+def test_update_rollups_keeps_first_price_on_out_of_order_run(db_session: Session, product: Product):
+    late = datetime(2025, 3, 1, 15, 0)
+    early = datetime(2025, 3, 1, 3, 0)
+
+    update_rollups(db_session, [price_row(product.id, late, 4000.0)])
+    update_rollups(db_session, [price_row(product.id, early, 5000.0)])
+    db_session.expire_all()
+
+    daily = db_session.query(PriceHistoryDaily).one()
+    assert (daily.first_price, daily.last_price) == (5000.0, 4000.0)
+
+
+def test_backfill_does_not_touch_existing_buckets(db_session: Session, product: Product):
+    ts = datetime(2025, 3, 1, 3, 0)
+    update_rollups(db_session, [price_row(product.id, ts, 5000.0)])
+    for day, price in [(ts, 5000.0), (ts - timedelta(days=1), 7000.0)]:
+        db_session.add(PriceHistory(product_id=product.id, timestamp=day, price=price, source="eBay"))
+    db_session.flush()
+
+    assert backfill_rollups(db_session, PriceHistoryDaily) == 2
+    db_session.expire_all()
+
+    daily = db_session.query(PriceHistoryDaily).order_by(PriceHistoryDaily.day).all()
+    assert [(d.day, d.min_price, d.first_price) for d in daily] == [
+        (date(2025, 2, 28), 7000.0, None),   # Reconstruído dos dados brutos
+        (date(2025, 3, 1), 5000.0, 5000.0),  # Mantido pelo updater, inalterado
+    ]
+
+
+def test_startup_backfills_only_when_rollups_are_empty(db_session: Session, product: Product):
+    ts = datetime(2025, 3, 1, 3, 0)
+    db_session.add(PriceHistory(product_id=product.id, timestamp=ts, price=5000.0, price_usd=1000.0,
+                                currency="USD", source="eBay", exchange_rate=5.0))
+    db_session.flush()
+
+    assert backfill_empty_rollups(db_session) == {"price_history_hourly": 1, "price_history_daily": 1}
+    assert db_session.query(PriceHistoryDaily).one().min_price == 5000.0
+    # Agregados já populados: nada a reconstruir
+    assert backfill_empty_rollups(db_session) == {}
+
+
+def test_long_period_history_reads_one_row_per_day(db_session: Session, product: Product):
+    start = datetime.now(timezone.utc).replace(hour=3, minute=0, second=0, microsecond=0) - timedelta(days=200)
+    rows = [
+        price_row(product.id, start + timedelta(days=day, hours=hour), 5000.0 + day)
+        for day in range(200) for hour in (0, 12)
+    ]
+    update_rollups(db_session, rows)
+
+    points = get_history_points(db_session, product.id, datetime.now(timezone.utc) - timedelta(days=365))
+
+    # Nenhum registro bruto existe: tudo vem de 'price_history_daily'
+    assert len(points) == 200
+    assert points[0]["price_brl"] == 5000.0
+    assert points[0]["date"] == datetime.combine(start.date(), datetime.min.time()).isoformat()
@@ -27,11 +27,13 @@ def test_start_scheduler_configures_job_correctly():
         with patch.object(scheduler_module, "update_prices_job"):
             scheduler_module.start_scheduler()
 
-            # 1. add_job foi chamado
-            mock_scheduler.add_job.assert_called_once()
+            # 1. add_job foi chamado (atualização de preços + retenção do histórico)
+            assert mock_scheduler.add_job.call_count == 2
 
-            # 2. Pega argumentos da chamada
-            args, kwargs = mock_scheduler.add_job.call_args
+            # 2. Pega argumentos da chamada do job de preços
+            args, kwargs = next(
+                c for c in mock_scheduler.add_job.call_args_list if c.kwargs["id"] == "price_update_job"
+            )
 
             # Função correta
             assert args[0] is scheduler_module.update_prices_job
@@ -69,10 +71,34 @@ def test_start_scheduler_is_idempotent():
             scheduler_module.start_scheduler()
             scheduler_module.start_scheduler()
 
-            assert mock_scheduler.add_job.call_count == 2
+            # Dois jobs por chamada, sempre com replace_existing (sem duplicar no scheduler real)
+            assert mock_scheduler.add_job.call_count == 4
+            assert all(c.kwargs["replace_existing"] for c in mock_scheduler.add_job.call_args_list)
             assert mock_scheduler.start.call_count == 2  # tenta iniciar de novo (normal)
 
 
+def test_start_scheduler_configures_retention_job():
+    mock_scheduler = MagicMock()
+
+    with patch.object(scheduler_module, "scheduler", mock_scheduler):
+        scheduler_module.start_scheduler()
+
+    args, kwargs = next(
+        c for c in mock_scheduler.add_job.call_args_list if c.kwargs["id"] == "price_history_retention_job"
+    )
+    assert args[0] is scheduler_module.retention_job
+    hour_field = next(f for f in kwargs["trigger"].fields if f.name == "hour")
+    assert str(hour_field) == "4"
+
+
+def test_retention_job_logs_errors():
+    with patch.object(scheduler_module, "run_retention", side_effect=Exception("sem conexão")), \
+         patch.object(scheduler_module.logger, "error") as mock_error:
+        asyncio.run(scheduler_module.retention_job())
+
+    mock_error.assert_called_once_with("--- Erro na Manutenção do Histórico: sem conexão ---")
+
+
 def test_update_prices_job_success_and_error_cases():
     """Testa log, chamada da função e tratamento de erro."""
     with patch.object(scheduler_module, "update_all_products") as mock_updater:
@@ -0,0 +1,45 @@
+from sqlalchemy import create_engine, inspect, text
+from app.db.base_class import Base
+from app.db.schema_upgrade import upgrade_schema
+from app.models.product import PriceHistory
+
+
+def test_upgrade_adds_missing_columns_to_existing_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        # 'price_history' como era antes de 'run_id' e 'price_original'
+        conn.execute(text(
+            "CREATE TABLE price_history (id INTEGER PRIMARY KEY, product_id INTEGER, "
+            "price FLOAT NOT NULL, timestamp DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO price_history (product_id, price, timestamp) VALUES (1, 5000, '2024-05-01')"))
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        # 'price_history_daily' como era antes do primeiro/último preço
+        conn.execute(text("DROP TABLE price_history_daily"))
+        conn.execute(text(
+            "CREATE TABLE price_history_daily (product_id INTEGER, source VARCHAR, day DATE, "
+            "min_price FLOAT NOT NULL, max_price FLOAT NOT NULL, sum_price FLOAT NOT NULL, "
+            "price_count INTEGER NOT NULL, min_price_usd FLOAT, max_price_usd FLOAT, sum_price_usd FLOAT, "
+            "price_usd_count INTEGER NOT NULL, exchange_rate FLOAT, PRIMARY KEY (product_id, source, day))"
+        ))
+
+    assert upgrade_schema(engine) == [
+        "price_history.run_id",
+        "price_history.price_original",
+        "price_history_daily.first_price",
+        "price_history_daily.first_at",
+        "price_history_daily.last_price",
+        "price_history_daily.last_at",
+    ]
+
+    inspector = inspect(engine)
+    assert "run_id" in {c["name"] for c in inspector.get_columns(PriceHistory.__tablename__)}
+    assert "ix_price_history_product_run" in {ix["name"] for ix in inspector.get_indexes(PriceHistory.__tablename__)}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT price, run_id FROM price_history")).all() == [(5000.0, None)]
+
+    # Já atualizado: nada a fazer
+    assert upgrade_schema(engine) == []
+    engine.dispose()
@@ -0,0 +1,178 @@
+import asyncio
+import sqlite3
+import threading
+import time
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+import app.services.ebay_token_manager as token_manager
+from app.services.currency_service import CurrencyService
+from app.services.rate_matrix import RateMatrix
+from app.services.response_cache import SHARED_VERSION_KEY, ResponseCache
+from app.services.shared_cache import SharedCache
+
+
+@pytest.fixture
+def shared_cache(tmp_path):
+    path = str(tmp_path / "shared_cache.sqlite3")
+    SharedCache.configure(path)
+    CurrencyService._cached_rate = None
+    CurrencyService._last_update = 0
+    CurrencyService._refresh_task = None
+    yield path
+    SharedCache.configure(None)
+    CurrencyService._cached_rate = None
+    CurrencyService._last_update = 0
+    CurrencyService._refresh_task = None
+
+
+def _restart_worker():
+    """Simula outro processo (ou um reinício): memória vazia, mesmo arquivo."""
+    CurrencyService._cached_rate = None
+    CurrencyService._last_update = 0
+    CurrencyService._refresh_task = None
+    RateMatrix.clear()
+
+
+def test_set_and_get_roundtrip_keeps_newest_value(shared_cache):
+    SharedCache.set("k", {"rate": 5.0}, updated_at=200)
+    SharedCache.set("k", {"rate": 4.0}, updated_at=100)  # mais antigo: ignorado
+
+    assert SharedCache.get("k") == ({"rate": 5.0}, 200)
+    assert SharedCache.get("missing") is None
+
+    # Outro processo lê o mesmo arquivo
+    conn = sqlite3.connect(shared_cache)
+    assert conn.execute("SELECT updated_at FROM shared_cache WHERE key = 'k'").fetchone() == (200,)
+    conn.close()
+
+
+def test_disabled_cache_is_a_noop():
+    SharedCache.configure(None)
+    SharedCache.set("k", 1)
+    assert SharedCache.get("k") is None
+
+
+def test_rate_fetched_by_one_worker_is_reused_by_another(shared_cache):
+    with patch.object(CurrencyService, "_fetch_rate", return_value=5.25) as mock_fetch:
+        assert CurrencyService.get_usd_to_brl() == 5.25
+        _restart_worker()
+        assert CurrencyService.get_usd_to_brl() == 5.25
+
+    assert mock_fetch.call_count == 1
+
+
+async def test_async_lookup_after_restart_needs_no_upstream_call(shared_cache):
+    SharedCache.set("usd_brl", {"rate": 5.40}, updated_at=time.time() - 60)
+
+    with patch.object(CurrencyService, "_fetch_rate_hedged") as mock_fetch:
+        assert await CurrencyService.get_usd_to_brl_async() == 5.40
+
+    mock_fetch.assert_not_called()
+
+
+async def test_async_lookup_keeps_shared_cache_io_off_the_event_loop(shared_cache):
+    loop_thread = threading.current_thread()
+    io_threads = []
+
+    def tracked(method):
+        def wrapper(*args, **kwargs):
+            io_threads.append(threading.current_thread())
+            return method(*args, **kwargs)
+        return wrapper
+
+    with patch.object(SharedCache, "get", side_effect=tracked(SharedCache.get)), \
+         patch.object(SharedCache, "set", side_effect=tracked(SharedCache.set)), \
+         patch.object(CurrencyService, "_fetch_rate_hedged", return_value=5.30):
+        assert await CurrencyService.get_usd_to_brl_async() == 5.30
+
+    assert SharedCache.get("usd_brl")[0] == {"rate": 5.30}
+    assert len(io_threads) == 2  # leitura e gravação, ambas numa thread
+    assert loop_thread not in io_threads
+
+
+async def test_data_written_by_another_worker_invalidates_responses(shared_cache):
+    ResponseCache.set("key", b"old", ResponseCache.data_version())
+
+    # Outro worker gravou preços e publicou o instante da gravação
+    SharedCache.set(SHARED_VERSION_KEY, {"written_at": time.time()}, time.time())
+    # As rotas só leem memória: nada muda até a task de fundo consultar o SQLite
+    with patch.object(SharedCache, "get", side_effect=AssertionError("SQLite no event loop")):
+        assert ResponseCache.get("key") == b"old"
+        ResponseCache.data_version()
+
+    loop_thread = threading.current_thread()
+    poll_threads = []
+    poll = ResponseCache.poll_shared_version
+
+    def tracked_poll():
+        poll_threads.append(threading.current_thread())
+        return poll()
+
+    with patch.object(ResponseCache, "poll_shared_version", side_effect=tracked_poll), \
+         patch.object(ResponseCache, "_SYNC_INTERVAL", 0.01):
+        watch = asyncio.create_task(ResponseCache.watch_shared_version())
+        await asyncio.sleep(0.05)
+        watch.cancel()
+
+    assert poll_threads and loop_thread not in poll_threads
+    assert ResponseCache.get("key") is None
+
+    # A própria gravação, publicada, não invalida de novo o que for cacheado depois
+    ResponseCache.bump_version()
+    assert ResponseCache.publish_version()
+    ResponseCache.set("key", b"new", ResponseCache.data_version())
+    assert ResponseCache.poll_shared_version() is False
+    assert ResponseCache.get("key") == b"new"
+
+
+def test_rate_matrix_is_shared_between_workers(shared_cache):
+    response = MagicMock()
+    response.json.return_value = {"amount": 1.0, "base": "USD", "rates": {"EUR": 0.5}}
+
+    with patch("app.services.rate_matrix.requests.get", return_value=response) as mock_get:
+        assert RateMatrix.ensure({"EUR"})
+        _restart_worker()
+        assert RateMatrix.ensure({"EUR"})
+
+    assert mock_get.call_count == 1
+    assert RateMatrix.convert([10.0], ["EUR"], "USD")[0] == 20.0
+
+
+def test_ebay_token_is_shared_between_workers(shared_cache):
+    response = MagicMock()
+    response.json.return_value = {"access_token": "NEW_TOKEN", "expires_in": 7200}
+
+    with patch("app.services.ebay_token_manager.requests.post", return_value=response) as mock_post:
+        assert token_manager.get_valid_ebay_token() == "NEW_TOKEN"
+        assert token_manager.get_valid_ebay_token() == "NEW_TOKEN"
+
+    assert mock_post.call_count == 1
+    token, _ = SharedCache.get("ebay_token")
+    assert datetime.fromisoformat(token["expires_at"]) > datetime.now(timezone.utc) + timedelta(hours=1)
+
+
+def test_cache_creates_missing_directory(tmp_path):
+    SharedCache.configure(str(tmp_path / "data" / "nested" / "shared_cache.sqlite3"))
+    try:
+        assert SharedCache.set("k", {"v": 1}, updated_at=10)
+        assert SharedCache.get("k") == ({"v": 1}, 10)
+    finally:
+        SharedCache.configure(None)
+
+
+def test_ebay_token_falls_back_to_file_when_shared_cache_fails(tmp_path):
+    # Caminho inutilizável: o "arquivo" do cache é um diretório
+    SharedCache.configure(str(tmp_path))
+    response = MagicMock()
+    response.json.return_value = {"access_token": "NEW_TOKEN", "expires_in": 7200}
+
+    try:
+        with patch.object(token_manager, "TOKEN_FILE_PATH", str(tmp_path / "ebay_token.json")), \
+             patch("app.services.ebay_token_manager.requests.post", return_value=response) as mock_post:
+            for _ in range(3):
+                assert token_manager.get_valid_ebay_token() == "NEW_TOKEN"
+    finally:
+        SharedCache.configure(None)
+
+    assert mock_post.call_count == 1